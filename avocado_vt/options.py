@@ -545,7 +545,17 @@ class VirtTestOptionsProcess(object):
                     % (vt_type_setting, vt_type, " ".join(SUPPORTED_TEST_TYPES))
                 )
 
-        self.cartesian_parser = cartesian_config.Parser(debug=False)
+        cache_dir = None
+        if not get_opt(self.config, "vt.no_parse_cache"):
+            cache_dir = data_dir.get_cache_dir("cartesian")
+        parser_jobs = get_opt(self.config, "vt.parser_jobs")
+        if parser_jobs is None:
+            parser_jobs = 1
+        self.cartesian_parser = cartesian_config.Parser(
+            debug=False,
+            cache_dir=cache_dir,
+            jobs=parser_jobs,
+        )
 
         if vt_config:
             cfg = os.path.abspath(vt_config)
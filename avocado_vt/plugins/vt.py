@@ -125,6 +125,32 @@ def add_basic_vt_options(parser):
         parser, dest="vt.only_filter", arg="--vt-only-filter", default="", help=help_msg
     )
 
+    help_msg = (
+        "Do not use the on-disk cache of parsed cartesian configs, "
+        "always parse the config files from scratch"
+    )
+    add_option(
+        parser,
+        dest="vt.no_parse_cache",
+        arg="--vt-no-parse-cache",
+        action="store_true",
+        default=False,
+        help=help_msg,
+    )
+
+    help_msg = (
+        "Number of processes used to expand the cartesian config "
+        "variants, 0 means one per CPU. Default: %(default)s"
+    )
+    add_option(
+        parser,
+        dest="vt.parser_jobs",
+        arg="--vt-parser-jobs",
+        type=int,
+        default=1,
+        help=help_msg,
+    )
+
     help_msg = (
         "Allows to selectively skip certain default filters. This uses "
         "directly 'tests-shared.cfg' and instead of "
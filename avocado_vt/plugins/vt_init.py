@@ -90,6 +90,30 @@ if hasattr(plugin_interfaces, "Init"):
                 section, key="only_filter", default="", help_msg=help_msg
             )
 
+            help_msg = (
+                "Do not use the on-disk cache of parsed cartesian configs, "
+                "always parse the config files from scratch"
+            )
+            settings.register_option(
+                section,
+                key="no_parse_cache",
+                key_type=bool,
+                default=False,
+                help_msg=help_msg,
+            )
+
+            help_msg = (
+                "Number of processes used to expand the cartesian config "
+                "variants, 0 means one per CPU"
+            )
+            settings.register_option(
+                section,
+                key="parser_jobs",
+                key_type=int,
+                default=1,
+                help_msg=help_msg,
+            )
+
             help_msg = "List of 'key=value' pairs passed to cartesian parser."
             settings.register_option(
                 section,
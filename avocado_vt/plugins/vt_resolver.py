@@ -1,3 +1,6 @@
+import logging
+import resource
+import time
 import warnings
 
 from avocado.core.plugin_interfaces import Discoverer, Resolver
@@ -11,6 +14,8 @@ try:
 except ImportError:
     from avocado.core.nrunner.runnable import Runnable
 
+LOG = logging.getLogger("avocado.vt.resolver")
+
 
 class VTResolverUtils(DiscoveryMixIn):
     def __init__(self, config):
@@ -29,6 +34,37 @@ class VTResolverUtils(DiscoveryMixIn):
 
         return Runnable("avocado-vt", uri, **vt_params)
 
+    def _get_runnables(self, reference, cartesian_parser):
+        """
+        Convert the parameter dicts of a reference into runnables.
+
+        The dicts are converted one by one as the parser produces them. The
+        resolution time, the time it took to get the first dict and the
+        peak RSS are logged, at debug level, on avocado.vt.resolver.
+
+        :param reference: The reference being resolved, only used for logging
+        :param cartesian_parser: Parser with the reference already applied
+        :return: List of runnables
+        """
+        start = time.monotonic()
+        first = None
+        runnables = []
+        for params in cartesian_parser.get_dicts():
+            if first is None:
+                first = time.monotonic() - start
+            runnables.append(self._parameters_to_runnable(params))
+        if runnables:
+            LOG.debug(
+                "Resolved %s runnables for reference %r in %.2fs (first one "
+                "after %.2fs), peak RSS %s KiB",
+                len(runnables),
+                reference,
+                time.monotonic() - start,
+                first,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            )
+        return runnables
+
     def _get_reference_resolution(self, reference):
         cartesian_parser = self._get_parser()
         self._save_parser_cartesian_config(cartesian_parser)
@@ -36,9 +72,7 @@ class VTResolverUtils(DiscoveryMixIn):
         if reference != "":
             cartesian_parser.only_filter(reference)
 
-        runnables = [
-            self._parameters_to_runnable(d) for d in cartesian_parser.get_dicts()
-        ]
+        runnables = self._get_runnables(reference, cartesian_parser)
         if runnables:
             if (
                 self.config.get(
@@ -54,9 +88,13 @@ class VTResolverUtils(DiscoveryMixIn):
                     != "lxc"
                 ):
                     warnings.warn(
-                        "The VT NextRunner can be run only "
-                        "with max-parallel-tasks set to 1 with a process "
-                        "spawner, did you forget to use an LXC spawner?"
+                        "With max-parallel-tasks other than 1 and a process "
+                        "spawner the VT NextRunner only runs qemu tests, "
+                        "each one with its own tmp dir, env file and, unless "
+                        "image_snapshot is set, image snapshots. It needs "
+                        "vt.common.tmp_dir to be set and skips the install "
+                        "and image preparing tests. Use an LXC spawner for "
+                        "other test types."
                     )
             return ReferenceResolution(
                 reference, ReferenceResolutionResult.SUCCESS, runnables
@@ -1,5 +1,7 @@
 import multiprocessing
 import os
+import shutil
+import tempfile
 import time
 import traceback
 
@@ -8,6 +10,8 @@ from avocado.core.test_id import TestID
 from avocado.utils import astring
 
 from avocado_vt import test
+from virttest import data_dir, storage, utils_params
+from virttest.compat import get_settings_value
 
 # Compatibility with avocado 92.0 LTS version, this can be removed when
 # the 92.0 support will be dropped.
@@ -29,12 +33,100 @@ except ImportError:
     LTS = False
 
 
+def is_parallel_run(config):
+    """
+    Whether the job may run several tasks at the same time.
+
+    :param config: avocado config of the runnable
+    """
+    return (
+        config.get(
+            "run.max_parallel_tasks",
+            config.get("nrunner.max_parallel_tasks", 1),
+        )
+        != 1
+    )
+
+
+def prepares_images(vt_params):
+    """
+    Whether the test writes images meant to be used by later tests.
+
+    That is the case of the install tests and of the tests creating images
+    they don't remove. Their results would be lost in the snapshots of
+    :func:`isolate_params`.
+
+    :param vt_params: params of the test
+    """
+    if {"unattended_install", "svirt_install"} & set(vt_params.get("type", "").split()):
+        return True
+    params = utils_params.Params(vt_params)
+    for image_name in params.objects("images"):
+        image_params = params.object_params(image_name)
+        create = (
+            image_params.get("create_image"),
+            image_params.get("force_create_image"),
+        )
+        if "yes" in create and image_params.get("remove_image") != "yes":
+            return True
+    return False
+
+
+def isolate_params(vt_params, tmp_dir):
+    """
+    Update the params of a test running alongside others to keep it apart.
+
+    Unless set in the params, the guests only write to temporary snapshots
+    of the images and the ports are reserved. The scratch images, created
+    and removed by the test, go to tmp_dir.
+
+    :param vt_params: params of the test
+    :param tmp_dir: private tmp dir of the test
+    """
+    if not any(
+        key == "image_snapshot" or key.startswith("image_snapshot_")
+        for key in vt_params
+    ):
+        vt_params["image_snapshot"] = "yes"
+    vt_params.setdefault("reserve_ports", "yes")
+    params = utils_params.Params(vt_params)
+    for image_name in params.objects("images"):
+        image_params = params.object_params(image_name)
+        create = (
+            image_params.get("create_image"),
+            image_params.get("force_create_image"),
+        )
+        if (
+            "yes" in create
+            and image_params.get("remove_image") == "yes"
+            and "images_base_dir" not in image_params
+        ):
+            vt_params["images_base_dir_%s" % image_name] = tmp_dir
+            image_filename = storage.get_image_filename(image_params, tmp_dir)
+            os.makedirs(os.path.dirname(image_filename), exist_ok=True)
+
+
 class VirtTest(test.VirtTest):
-    def __init__(self, queue, runnable):
+    def __init__(self, queue, runnable, isolated=False):
+        """
+        :param queue: queue used to send the messages to the runner
+        :param runnable: the runnable of the test
+        :param isolated: whether the test runs alongside others, it then
+                         gets its own tmp dir and env file, removed once it
+                         finishes, see also :func:`isolate_params`
+        """
         self.queue = queue
         base_logdir = getattr(runnable, "output_dir", None)
         vt_params = runnable.kwargs
         vt_params["job_env_cleanup"] = "no"
+        self.isolated = isolated
+        if isolated:
+            self.task_tmp_dir = tempfile.mkdtemp(
+                prefix="task-%s-" % os.getpid(), dir=data_dir.get_tmp_dir()
+            )
+            data_dir.set_task_tmp_dir(self.task_tmp_dir)
+            vt_params["env"] = "env-%s" % os.getpid()
+            isolate_params(vt_params, self.task_tmp_dir)
         kwargs = {
             "name": TestID(1, runnable.uri),
             "config": runnable.config,
@@ -95,6 +187,15 @@ class VirtTest(test.VirtTest):
                 )
             self.queue.put(messages.StderrMessage.get(traceback_log))
         finally:
+            if self.isolated:
+                env_filename = os.path.join(
+                    data_dir.get_tmp_dir(), self.params.get("env")
+                )
+                try:
+                    test.cleanup_env(env_filename, self.env_version)
+                except Exception:
+                    self.queue.put(messages.StderrMessage.get(traceback.format_exc()))
+                shutil.rmtree(self.task_tmp_dir, ignore_errors=True)
             self.queue.put(messages.WhiteboardMessage.get(self.whiteboard))
             if "avocado_test_" in self.logdir:
                 self._save_log_dir()
@@ -133,6 +234,7 @@ class VTTestRunner(BaseRunner):
         "core.show",
         "job.output.loglevel",
         "job.run.store_logging_stream",
+        "run.max_parallel_tasks",
     ]
 
     DEFAULT_TIMEOUT = 86400
@@ -142,16 +244,26 @@ class VTTestRunner(BaseRunner):
             self.runnable = runnable
 
         yield messages.StartedMessage.get()
-        if (
-            self.runnable.config.get(
-                "run.max_parallel_tasks",
-                self.runnable.config.get("nrunner.max_parallel_tasks", 1),
+        parallel = is_parallel_run(self.runnable.config)
+        reason = None
+        if parallel and self.runnable.kwargs.get("vm_type") != "qemu":
+            # libvirt domains and the like are host wide, they can't be
+            # isolated per task
+            reason = "parallel run is only allowed for qemu vt tests"
+        elif parallel and not get_settings_value("vt.common", "tmp_dir", default=""):
+            # Otherwise each task gets its own address pool and port
+            # reservations
+            reason = (
+                "parallel run needs vt.common.tmp_dir to share the address "
+                "pool and the port reservations of the tasks"
             )
-            != 1
-        ):
-            yield messages.FinishedMessage.get(
-                "cancel", fail_reason="parallel run is not" " allowed for vt tests"
+        elif parallel and prepares_images(self.runnable.kwargs):
+            reason = (
+                "install and image preparing tests are not run in parallel, "
+                "their images would only be written to temporary snapshots"
             )
+        if reason:
+            yield messages.FinishedMessage.get("cancel", fail_reason=reason)
         else:
             try:
                 if "fork" in multiprocessing.get_all_start_methods():
@@ -159,7 +271,7 @@ class VTTestRunner(BaseRunner):
                 else:
                     context = multiprocessing
                 queue = context.SimpleQueue()
-                vt_test = VirtTest(queue, self.runnable)
+                vt_test = VirtTest(queue, self.runnable, isolated=parallel)
                 process = context.Process(target=vt_test.runTest)
                 process.start()
                 while True:
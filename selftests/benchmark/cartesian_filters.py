@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark of the cartesian config expansion against the number of filters.
+
+Expands a config (selftests/unit/unittest_data/testcfg.huge/test1.cfg by
+default) with a growing number of extra 'only' and 'no' filter pairs that
+don't drop any variant, and reports the time taken by get_dicts() for each
+number of pairs.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.insert(0, basedir)
+
+from virttest import cartesian_config
+
+
+def expand(cfg, filters):
+    """Expand cfg with the extra filter pairs, return the dicts and time"""
+    parser = cartesian_config.Parser(cfg)
+    parser.only_filter("qcow2")
+    for i in range(filters):
+        parser.only_filter("Fedora.17.32..missing%d, smallpages..qcow2" % i)
+        parser.no_filter("missing%d, virtio_scsi.smp2..Linux..missing%d" % (i, i))
+    start = time.perf_counter()
+    count = sum(1 for _ in parser.get_dicts())
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--cfg",
+        default=os.path.join(
+            basedir, "selftests", "unit", "unittest_data", "testcfg.huge", "test1.cfg"
+        ),
+        help="Config file to expand. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--filters",
+        type=int,
+        nargs="+",
+        default=[0, 1, 4, 16, 64],
+        help="Numbers of extra filter pairs. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Expansions of each case, the fastest is kept. Default: %(default)s",
+    )
+    args = parser.parse_args()
+
+    print("%6s %8s %10s" % ("pairs", "dicts", "expansion"))
+    for filters in args.filters:
+        results = [expand(args.cfg, filters) for _ in range(args.repeat)]
+        count = results[0][0]
+        elapsed = min(elapsed for _, elapsed in results)
+        print("%6d %8d %9.3fs" % (filters, count, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the cartesian config lexer.
+
+Tokenizes every line of the cfg files shipped in virttest/shared/cfg, once
+with the lexer in fast mode (the one used for plain assignments) and once
+in strict mode, and reports the tokens per second of each run.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.insert(0, basedir)
+
+from virttest import cartesian_config
+
+
+def read_lines(cfg_dir):
+    lines = []
+    for dirpath, _, filenames in os.walk(cfg_dir):
+        for filename in sorted(filenames):
+            if filename.endswith(".cfg"):
+                reader = cartesian_config.FileReader(os.path.join(dirpath, filename))
+                lines += [line for line, _, _ in reader._lines]
+    return lines
+
+
+def lex(lines, fast, rounds):
+    lexer = cartesian_config.Lexer(cartesian_config.StrReader(""))
+    if fast:
+        lexer.set_fast()
+    tokens = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line in lines:
+            lexer.line = line
+            for token in lexer.match(line, 0):
+                tokens += 1
+                # the parser reads the value of assignments as a string
+                if isinstance(token, cartesian_config.LOperators):
+                    lexer.rest_as_string = True
+    return tokens, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--cfg-dir",
+        default=os.path.join(basedir, "virttest", "shared", "cfg"),
+        help="Directory with the cfg files to lex. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="How many times each line is lexed. Default: %(default)s",
+    )
+    args = parser.parse_args()
+
+    lines = read_lines(args.cfg_dir)
+    print("%s lines from %s" % (len(lines), args.cfg_dir))
+    for mode, fast in (("fast", True), ("strict", False)):
+        tokens, elapsed = lex(lines, fast, args.rounds)
+        print(
+            "%-6s %9d tokens in %.3fs: %.0f tokens/s"
+            % (mode, tokens, elapsed, tokens / elapsed)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Benchmark of the ppm_utils pixel functions on full HD screendumps.
+
+Generates two 1920x1080 frames differing by a few lines, then crops,
+compares and fuzzy compares them, with numpy (when it is installed) and
+with the pure python implementation, reporting the time spent by each.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.insert(0, basedir)
+
+from virttest import ppm_utils
+
+
+def frames(width, height):
+    line = bytes(random.randrange(256) for _ in range(width * 3))
+    data1 = line * height
+    data2 = bytearray(data1)
+    for y in range(0, height, 100):
+        data2[y * width * 3 : (y + 1) * width * 3] = bytes(width * 3)
+    return data1, bytes(data2)
+
+
+def run(width, height, data1, data2):
+    results = []
+    for name, func, args in (
+        ("crop", ppm_utils.image_crop, (data1, 100, 100, width // 2, height // 2)),
+        ("comparison", ppm_utils.image_comparison, (data1, data2)),
+        ("fuzzy_compare", ppm_utils.image_fuzzy_compare, (data1, data2)),
+    ):
+        start = time.perf_counter()
+        func(width, height, *args)
+        results.append((name, time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=1920, help="Default: %(default)s")
+    parser.add_argument("--height", type=int, default=1080, help="Default: %(default)s")
+    args = parser.parse_args()
+
+    data1, data2 = frames(args.width, args.height)
+    implementations = [("python", None)]
+    if ppm_utils.numpy is not None:
+        implementations.append(("numpy", ppm_utils.numpy))
+    else:
+        print("numpy is not installed, only the python implementation is run")
+    for implementation, module in implementations:
+        with mock.patch.object(ppm_utils, "numpy", module):
+            for name, elapsed in run(args.width, args.height, data1, data2):
+                print("%-6s %-13s %.3fs" % (implementation, name, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Benchmark of the DevContainer device lookups on a VM with many devices.
+
+Builds the representation of a 'pc' VM with pci bridges, drives and disks
+(500 devices by default), looks every disk up by aid, qemu id and drive, and
+finally unplugs the disks, reporting the time spent in each phase.  qemu is
+not needed, its help outputs are read from the unittest data.
+"""
+
+import argparse
+import os
+import sys
+import time
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.insert(0, basedir)
+
+from avocado.utils.process import CmdResult
+
+from virttest.qemu_devices import qcontainer, qdevices
+from virttest.utils_params import Params
+
+UNITTEST_DATA_DIR = os.path.join(basedir, "selftests", "unit", "unittest_data")
+
+
+def read_data(name):
+    with open(os.path.join(UNITTEST_DATA_DIR, "qemu-1.5.0__%s" % name)) as data:
+        return data.read()
+
+
+QEMU_OUTPUTS = (
+    ("-machine help", read_data("machine_help")),
+    ("-help", read_data("help")),
+    ("-device", read_data("devices_help")),
+    ("query-commands", read_data("qmp_help")),
+    ("-monitor stdio", read_data("hmp_help")),
+    ("-version", "QEMU emulator version 1.5.0"),
+)
+
+
+def qemu_run(cmd, *args, **kwargs):
+    for option, stdout in QEMU_OUTPUTS:
+        if option in cmd:
+            return CmdResult(cmd, stdout=stdout)
+    return CmdResult(cmd, stdout="")
+
+
+def build(qdev, disks):
+    qdev.insert(qdev.machine_by_params(Params({"machine_type": "pc"})))
+    bridges = (disks + 29) // 30
+    for i in range(bridges):
+        qdev.insert(
+            qdev.pcic_by_params(
+                "pci_bridge%d" % i, {"pci_bus": "pci.0", "type": "pci-bridge"}
+            )
+        )
+    for i in range(disks):
+        qdev.insert(qdevices.QDrive("disk%d" % i))
+        qdev.insert(
+            qdevices.QDevice(
+                "virtio-blk-pci",
+                {"id": "disk%d" % i, "drive": "drive_disk%d" % i},
+                parent_bus={"aobject": "pci_bridge%d" % (i // 30)},
+            )
+        )
+
+
+def lookup(qdev, disks):
+    for i in range(disks):
+        dev = qdev.get_by_qid("disk%d" % i)[0]
+        assert qdev[dev.get_aid()] is dev
+        assert dev in qdev
+        assert qdev.get_qdev_by_drive("drive_disk%d" % i) == "disk%d" % i
+        assert qdev.get_by_params({"id": "disk%d" % i}) == [dev]
+
+
+def unplug(qdev, disks):
+    for i in range(disks):
+        qdev.remove(qdev.get_by_qid("disk%d" % i)[0])
+        qdev.remove(qdev.get_by_qid("drive_disk%d" % i)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--devices",
+        type=int,
+        default=500,
+        help="Approximate number of devices of the VM. Default: %(default)s",
+    )
+    args = parser.parse_args()
+    disks = args.devices // 2
+
+    with mock.patch.object(qcontainer.process, "run", qemu_run):
+        qdev = qcontainer.DevContainer("/usr/bin/qemu-kvm", "vm1", probe_cache="no")
+        for phase, func in (("build", build), ("lookup", lookup), ("unplug", unplug)):
+            start = time.perf_counter()
+            func(qdev, disks)
+            elapsed = time.perf_counter() - start
+            print("%-6s %.3fs (%d devices)" % (phase, elapsed, len(qdev)))
+
+
+if __name__ == "__main__":
+    main()
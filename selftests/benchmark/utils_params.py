@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Benchmark of Params.object_params() on params of the size of a real test.
+
+Builds params with many keys (1500 by default) of which some are suffixed
+with the names of the images, nics, cdroms and serials of the VM, then gets
+the params of every object repeatedly and reads a few of them, the way
+env_process and qcontainer do.  The interleaved case also modifies the
+params before getting the params of every object and modifies these.  The
+time spent is compared with the former implementation, which copied all
+the params and scanned every key.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.insert(0, basedir)
+
+from virttest.utils_params import Params
+
+OBJECTS = {
+    "images": ["image1", "stg0", "stg1", "stg2"],
+    "nics": ["nic1", "nic2"],
+    "cdroms": ["cd1", "winutils"],
+    "serials": ["serial0", "vs1"],
+}
+
+
+def copy_object_params(params, obj_name):
+    """The former Params.object_params()"""
+    suffix = "_" + obj_name
+    params.lock.acquire()
+    new_dict = params.copy()
+    params.lock.release()
+    for key in list(new_dict.keys()):
+        if key.endswith(suffix):
+            new_key = key.split(suffix)[0]
+            new_dict[new_key] = new_dict[key]
+    return new_dict
+
+
+def build(keys):
+    params = Params()
+    for kind, names in OBJECTS.items():
+        params[kind] = " ".join(names)
+    objects = [name for names in OBJECTS.values() for name in names]
+    i = 0
+    while len(params) < keys:
+        key = "some_param_%d" % i
+        params[key] = "value%d" % i
+        if i % 10 == 0:
+            params["%s_%s" % (key, objects[i % len(objects)])] = "other%d" % i
+        i += 1
+    return params
+
+
+def run(params, object_params, rounds):
+    for _ in range(rounds):
+        for kind in OBJECTS:
+            for name in params.objects(kind):
+                obj_params = object_params(params, name)
+                obj_params.get("some_param_0")
+                obj_params.get("some_param_10")
+                obj_params.get("missing_param")
+
+
+def run_interleaved(params, object_params, rounds):
+    """Like run(), but the params and the object params are also modified"""
+    for _ in range(rounds):
+        for kind in OBJECTS:
+            for name in params.objects(kind):
+                params["current_%s" % kind] = name
+                obj_params = object_params(params, name)
+                obj_params.get("some_param_0")
+                obj_params["some_param_10"] = name
+                obj_params.get("missing_param")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--keys",
+        type=int,
+        default=1500,
+        help="Number of params. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=100,
+        help="Times the params of every object are got. Default: %(default)s",
+    )
+    args = parser.parse_args()
+
+    params = build(args.keys)
+    calls = args.rounds * sum(len(names) for names in OBJECTS.values())
+    for case, run_case in (("read", run), ("interleaved", run_interleaved)):
+        for name, func in (
+            ("copy", copy_object_params),
+            ("view", Params.object_params),
+        ):
+            start = time.perf_counter()
+            run_case(params, func, args.rounds)
+            elapsed = time.perf_counter() - start
+            print(
+                "%-11s %-4s %.3fs (%d calls, %.1fus per call)"
+                % (case, name, elapsed, calls, elapsed / calls * 1e6)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 #!/usr/bin/python
 
 import gzip
+import multiprocessing
 import os
+import shutil
+import signal
 import sys
+import tempfile
 import unittest
+from unittest import mock
 
 # simple magic for using scripts within a source tree
 basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -1250,6 +1255,30 @@ class CartesianConfigTest(Test):
             "Failed to parse filter.",
         )
 
+    def testFilterMatch(self):
+        xxx, yyy, aaa, ddd = [
+            cartesian_config.Label(name) for name in ("xxx", "yyy", "aaa", "ddd")
+        ]
+        # only xxx.yyy..aaa, ddd
+        f = cartesian_config.Filter([[[xxx, yyy], [aaa]], [[ddd]]])
+        for ctx, result in (
+            ([xxx, yyy, aaa], True),
+            ([xxx, aaa, yyy], False),
+            ([xxx, yyy], False),
+            ([aaa, ddd], True),
+        ):
+            self.assertEqual(f.match(ctx, set(ctx)), result)
+        for ctx, descendant_labels, result in (
+            ([xxx], [yyy, aaa], True),
+            ([xxx, yyy], [aaa], True),
+            ([xxx], [yyy], False),
+            ([yyy], [xxx, aaa], False),
+            ([], [ddd], True),
+        ):
+            self.assertEqual(
+                f.might_match(ctx, set(ctx), set(descendant_labels)), result
+            )
+
     def testJoinSubstitution(self):
         self._checkStringDump(
             """
@@ -1376,6 +1405,142 @@ class CartesianConfigTest(Test):
             "testcfg.huge/test1.cfg", "testcfg.huge/test1.cfg.repr.gz"
         )
 
+    def testParseCache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        configpath = os.path.join(testdatadir, "testcfg.huge/test1.cfg")
+        p = cartesian_config.Parser(cache_dir=cache_dir)
+        p.parse_file(configpath)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        reference = list(p.get_dicts())
+
+        with mock.patch.object(
+            cartesian_config.Parser, "_parse", side_effect=AssertionError
+        ):
+            p = cartesian_config.Parser(cache_dir=cache_dir)
+            p.parse_file(configpath)
+        self.assertEqual(p.filename, configpath)
+        self._checkDictionaries(p, reference)
+
+        # Defaults change the resulting tree, they must not share the entry
+        p = cartesian_config.Parser(cache_dir=cache_dir, defaults=True)
+        p.parse_file(configpath)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def testParseCacheInvalidation(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache_dir = os.path.join(tmpdir, "cache")
+        mainpath = os.path.join(tmpdir, "main.cfg")
+        includepath = os.path.join(tmpdir, "include.cfg")
+        with open(mainpath, "w") as main_cfg:
+            main_cfg.write("include include.cfg\n")
+        with open(includepath, "w") as include_cfg:
+            include_cfg.write("variants:\n    - a:\n        var = 1\n")
+
+        def get_var():
+            p = cartesian_config.Parser(cache_dir=cache_dir)
+            p.parse_file(mainpath)
+            return [d["var"] for d in p.get_dicts()]
+
+        self.assertEqual(get_var(), ["1"])
+        # Same size, only the content hash tells the difference
+        with open(includepath, "w") as include_cfg:
+            include_cfg.write("variants:\n    - a:\n        var = 2\n")
+        os.utime(includepath, ns=(0, 0))
+        self.assertEqual(get_var(), ["2"])
+        # Touched but unchanged file keeps using the cache
+        os.utime(includepath, ns=(1, 1))
+        with mock.patch.object(
+            cartesian_config.Parser, "_parse", side_effect=AssertionError
+        ):
+            self.assertEqual(get_var(), ["2"])
+
+    def testUnterminatedString(self):
+        self.assertRaises(
+            cartesian_config.LexerError,
+            self._checkStringDump,
+            """
+                variants:
+                  - "system1:
+                """,
+            [],
+        )
+
+    def testSharedLeafContent(self):
+        p = cartesian_config.Parser()
+        p.parse_string("""
+            c = abc
+            own = ${shortname}
+            variants:
+                - a:
+                - b:
+            """)
+        dicts = list(p.get_dicts())
+        self.assertEqual([d["own"] for d in dicts], ["a", "b"])
+        self.assertEqual([d["c"] for d in dicts], ["abc", "abc"])
+        # The file maps are updated in place, they must not be shared
+        self.assertIsNot(dicts[0]["_name_map_file"], dicts[1]["_name_map_file"])
+        self.assertEqual(dicts[0]["_name_map_file"], {"<string>": "a"})
+
+    def testParallelGetDicts(self):
+        configpath = os.path.join(testdatadir, "testcfg.huge/test1.cfg")
+        p = cartesian_config.Parser(configpath)
+        p.only_filter("qcow2")
+        reference = list(p.get_dicts())
+        p = cartesian_config.Parser(configpath, jobs=4)
+        p.only_filter("qcow2")
+        self._checkDictionaries(p, reference)
+        # Stopping early must not leave the workers behind
+        p = cartesian_config.Parser(configpath, jobs=4)
+        p.only_filter("qcow2")
+        dicts = p.get_dicts()
+        self.assertEqual(next(dicts)["name"], reference[0]["name"])
+        self.assertNotEqual(multiprocessing.active_children(), [])
+        dicts.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def _getParallelParser(self, jobs):
+        p = cartesian_config.Parser(jobs=jobs)
+        p.parse_string("""
+            variants:
+                - x1:
+                - x2:
+                - x3:
+                - x4:
+                - x5:
+            variants:
+                - a:
+                - b:
+                - c:
+                - d:
+            """)
+        return p
+
+    def testParallelGetDictsChunks(self):
+        reference = [d["name"] for d in self._getParallelParser(1).get_dicts()]
+        self.assertEqual(len(reference), 20)
+        # Small chunks of several workers arrive out of order and the
+        # workers wait for the consumer once out of chunk credits
+        with mock.patch.multiple(
+            cartesian_config, parallel_chunk_size=2, parallel_chunk_credits=1
+        ):
+            p = self._getParallelParser(3)
+            self.assertEqual([d["name"] for d in p.get_dicts()], reference)
+
+    def testParallelGetDictsWorkerDied(self):
+        with mock.patch.multiple(
+            cartesian_config, parallel_chunk_size=1, parallel_chunk_credits=1
+        ):
+            dicts = self._getParallelParser(3).get_dicts()
+            next(dicts)
+        # The workers wait for the consumer, none can be done yet
+        for worker in multiprocessing.active_children():
+            os.kill(worker.pid, signal.SIGKILL)
+        with self.assertRaisesRegex(cartesian_config.ParserError, "died"):
+            list(dicts)
+        self.assertEqual(multiprocessing.active_children(), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 import re
 import sys
+import threading
 
 if sys.version_info[:2] == (2, 6):
     import unittest2 as unittest
@@ -8,6 +9,7 @@ else:
 
 from avocado import Test
 
+from virttest import env_process, utils_params
 from virttest.env_process import QEMU_VERSION_RE
 
 
@@ -36,3 +38,50 @@ class QEMUVersion(Test):
         for version, expected in list(versions_expected.items()):
             match = re.match(QEMU_VERSION_RE, version)
             self.assertEqual(match.groups(), expected)
+
+
+class ProcessImages(Test):
+    def setUp(self):
+        super().setUp()
+        self.vt_params = utils_params.Params(
+            {
+                "images": " ".join("image%d" % i for i in range(6)),
+                "image_size": "1G",
+                "image_size_image2": "2G",
+                "image_process_workers": "3",
+            }
+        )
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def process_image(self, test, params, image_name, vm_process_status):
+        with self.lock:
+            self.processed.append(
+                (image_name, params["image_size"], threading.current_thread().name)
+            )
+        if image_name in ("image3", "image4"):
+            raise ValueError(image_name)
+
+    def test_process_images_parallel(self):
+        self.vt_params["images"] = "image0 image1 image2"
+        env_process.process_images(self.process_image, self, self.vt_params, "dead")
+        self.assertEqual(
+            sorted((image, size) for image, size, _ in self.processed),
+            [("image0", "1G"), ("image1", "1G"), ("image2", "2G")],
+        )
+        for _, _, thread_name in self.processed:
+            self.assertTrue(thread_name.startswith("ImageProcess"))
+
+    def test_process_images_errors(self):
+        with self.assertRaisesRegex(ValueError, "image3"):
+            env_process.process_images(self.process_image, self, self.vt_params)
+        self.assertIn("image3", [image for image, _, _ in self.processed])
+        # Serially, the processing stops on the first failure
+        self.vt_params["image_process_workers"] = "1"
+        del self.processed[:]
+        with self.assertRaisesRegex(ValueError, "image3"):
+            env_process.process_images(self.process_image, self, self.vt_params)
+        self.assertEqual(
+            [image for image, _, _ in self.processed],
+            ["image0", "image1", "image2", "image3"],
+        )
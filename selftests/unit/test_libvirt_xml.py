@@ -780,6 +780,11 @@ class testLibrarian(LibvirtXMLTestBase):
         self.assertTrue(issubclass(Serial, devices_base.UntypedDeviceBase))
         self.assertTrue(issubclass(Serial, devices_base.TypedDeviceBase))
 
+    def test_cached_class(self):
+        self.assertIs(librarian.get("serial"), librarian.get("Serial"))
+        librarian.DEVICE_TYPES.remove("serial")
+        self.assertRaises(xcepts.LibvirtXMLError, librarian.get, "serial")
+
 
 class testStubXML(LibvirtXMLTestBase):
     @six.add_metaclass(devices_base.StubDeviceMeta)
@@ -1040,6 +1045,41 @@ class testVMXMLDevices(LibvirtXMLTestBase):
         # Check result
         self.assertEqual(vmxml.devices[-1].passwd, "foobar")
 
+    def test_lazy_devices(self):
+        logging.disable(logging.WARNING)
+        vmxml = vm_xml.VMXML.new_from_dumpxml("foobar", virsh_instance=self.dummy_virsh)
+        devices = vmxml.devices
+        channels = devices.by_device_tag("channel")
+        # Devices are only created when accessed, the selected ones are
+        # shared with the list
+        selected = [id(device) for device in list.__iter__(channels)]
+        for device in list.__iter__(devices):
+            self.assertEqual(
+                isinstance(device, vm_xml._DeviceElement), id(device) not in selected
+            )
+        # and are copies of the devices when listed
+        vmxml.xmltreefile.find("devices/channel").set("type", "changed")
+        self.assertEqual(channels[0].type_name, "foo1")
+        self.assertIs(channels[0], channels[0])
+        self.assertEqual([channel.type_name for channel in channels], ["foo1", "bar1"])
+        self.assertEqual(vmxml.devices.by_device_tag("channel")[0].type_name, "changed")
+        self.assertIn(channels[1], devices)
+        self.assertEqual(devices[devices.index(channels[1])], channels[1])
+        self.assertEqual(len(devices[-2:]), 2)
+        for device in [] + vmxml.get_devices():
+            self.assertNotIsInstance(device, vm_xml._DeviceElement)
+
+    def test_modify_selected_device(self):
+        logging.disable(logging.WARNING)
+        vmxml = vm_xml.VMXML.new_from_dumpxml("foobar", virsh_instance=self.dummy_virsh)
+        devices = vmxml.devices
+        devices.by_device_tag("channel")[0].type_name = "changed"
+        vmxml.devices = devices
+        self.assertEqual(
+            [channel.type_name for channel in vmxml.devices.by_device_tag("channel")],
+            ["changed", "bar1"],
+        )
+
 
 class testCAPXML(LibvirtXMLTestBase):
     def test_capxmlbase(self):
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+
+from virttest import ppm_utils
+
+WIDTH = 4
+HEIGHT = 3
+# Every pixel is (x, y, 10 * y + x)
+DATA1 = bytes(
+    value for y in range(HEIGHT) for x in range(WIDTH) for value in (x, y, 10 * y + x)
+)
+# The pixels of the diagonal differ
+DATA2 = bytearray(DATA1)
+for _diag in range(HEIGHT):
+    DATA2[(_diag * WIDTH + _diag) * 3] = 255
+DATA2 = bytes(DATA2)
+
+
+class PPMUtilsTest(Test):
+    def check_images(self):
+        self.assertEqual(
+            ppm_utils.image_crop(WIDTH, HEIGHT, DATA1, 1, 1, 2, 5),
+            (2, 2, bytes([1, 1, 11, 2, 1, 12, 1, 2, 21, 2, 2, 22])),
+        )
+        self.assertEqual(
+            ppm_utils.image_crop(WIDTH, HEIGHT, DATA1, 0, 0, WIDTH, HEIGHT),
+            (WIDTH, HEIGHT, DATA1),
+        )
+        self.assertEqual(
+            ppm_utils.image_fuzzy_compare(WIDTH, HEIGHT, DATA1, DATA1), 1.0
+        )
+        self.assertEqual(
+            ppm_utils.image_fuzzy_compare(WIDTH, HEIGHT, DATA1, DATA2), 0.75
+        )
+        width, height, data = ppm_utils.image_comparison(WIDTH, HEIGHT, DATA1, DATA2)
+        self.assertEqual((width, height, len(data)), (WIDTH, HEIGHT, len(DATA1)))
+        # (0, 0, 0) and (255, 0, 0): 128 + (0 + 85) // 4, reddish
+        self.assertEqual(data[:3], bytes([149, 0, 0]))
+        # (1, 0, 1) twice: 128 + (0 + 0) // 4, greenish
+        self.assertEqual(data[3:6], bytes([0, 128, 0]))
+        # (3, 2, 23) twice: 128 + (9 + 9) // 4, greenish
+        self.assertEqual(data[-3:], bytes([0, 132, 0]))
+
+    @unittest.skipUnless(ppm_utils.numpy, "numpy is not installed")
+    def test_images(self):
+        self.check_images()
+
+    def test_images_python(self):
+        with mock.patch.object(ppm_utils, "numpy", None):
+            self.check_images()
+
+    @staticmethod
+    def run_both(func, *args):
+        """:return: The results of func with and without numpy"""
+        result = func(*args)
+        with mock.patch.object(ppm_utils, "numpy", None):
+            return result, func(*args)
+
+    @unittest.skipUnless(ppm_utils.numpy, "numpy is not installed")
+    def test_numpy_matches_python(self):
+        rand = random.Random(0)
+        width, height = 64, 48
+        data1 = bytes(rand.randrange(256) for _ in range(width * height * 3))
+        data2 = bytearray(data1)
+        for _ in range(100):
+            data2[rand.randrange(len(data2))] = rand.randrange(256)
+        data2 = bytes(data2)
+        for args in (
+            (ppm_utils.image_crop, width, height, data1, 10, 5, 20, 60),
+            (ppm_utils.image_comparison, width, height, data1, data2),
+            (ppm_utils.image_fuzzy_compare, width, height, data1, data2),
+            (ppm_utils.image_fuzzy_compare, width, height, data1, data1),
+        ):
+            result, expected = self.run_both(*args)
+            self.assertEqual(result, expected, args[0].__name__)
+
+    @unittest.skipUnless(
+        ppm_utils.numpy and ppm_utils.Image, "numpy or PIL is not installed"
+    )
+    def test_numpy_matches_python_pil(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        rand = random.Random(0)
+        filenames = []
+        for i in range(2):
+            data = bytes(rand.randrange(256) for _ in range(32 * 24 * 3))
+            filenames.append(os.path.join(tmpdir, "image%d.ppm" % i))
+            ppm_utils.image_write_to_ppm_file(filenames[-1], 32, 24, data)
+        result, expected = self.run_both(ppm_utils.image_average_hash, filenames[0])
+        self.assertEqual(result, expected)
+        result, expected = self.run_both(ppm_utils.image_histogram_compare, *filenames)
+        self.assertAlmostEqual(result, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
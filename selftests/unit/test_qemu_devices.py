@@ -9,8 +9,11 @@ __author__ = """Lukas Doktor (ldoktor@redhat.com)"""
 
 import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
+from unittest import mock as unittest_mock
 
 # simple magic for using scripts within a source tree
 basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -35,6 +38,11 @@ UNITTEST_DATA_DIR = os.path.join(
 QEMU_HMP = open(os.path.join(UNITTEST_DATA_DIR, "qemu-1.5.0__hmp_help")).read()
 # qemu-1.5.0 QMP monitor commands output
 QEMU_QMP = open(os.path.join(UNITTEST_DATA_DIR, "qemu-1.5.0__qmp_help")).read()
+QEMU_QMP_SCHEMA = (
+    '{"return": [{"name": "device_add", "meta-type": "command", "arg-type": "0"}, '
+    '{"name": "0", "meta-type": "object", "members": [{"name": "driver"}, '
+    '{"name": "id"}]}], "id": "RAND92"}\n'
+)
 # qemu-1.5.0 -help
 QEMU_HELP = open(os.path.join(UNITTEST_DATA_DIR, "qemu-1.5.0__help")).read()
 # qemu-1.5.0 -devices ?
@@ -700,7 +708,7 @@ class Container(Test):
         elif "-device" in cmd:
             stdout = QEMU_DEVICES
         elif "query-commands" in cmd:
-            stdout = QEMU_QMP
+            stdout = QEMU_QMP + QEMU_QMP_SCHEMA
         elif "-monitor stdio" in cmd:
             stdout = QEMU_HMP
         else:
@@ -1252,6 +1260,141 @@ fdc
             qdev2.str_long(),
         )
 
+    def test_device_indexes(self):
+        """Test the lookups follow the inserted and removed devices"""
+        qdev = self.create_qdev("vm1")
+        qdev.insert(qdev.machine_by_params(ParamsDict({"machine_type": "pc"})))
+        bridge_params = {"pci_bus": "pci.0", "type": "pci-bridge"}
+        qdev.insert(qdev.pcic_by_params("pci_bridge", bridge_params))
+        for i in range(3):
+            qdev.insert(qdevices.QDrive("disk%d" % i))
+            qdev.insert(
+                qdevices.QDevice(
+                    "virtio-blk-pci",
+                    {"id": "disk%d" % i, "drive": "drive_disk%d" % i},
+                    parent_bus={"aobject": "pci_bridge"},
+                )
+            )
+        disk1 = qdev.get_by_qid("disk1")[0]
+        self.assertIs(qdev["disk1"], disk1)
+        self.assertIn(disk1, qdev)
+        self.assertEqual(qdev.get_by_params({"id": "disk1"}), [disk1])
+        self.assertEqual(qdev.get_qdev_by_drive("drive_disk1"), "disk1")
+        self.assertEqual(len(qdev.get_by_properties({"type": "drive"})), 3)
+        self.assertEqual(len(qdev.get_buses({"aobject": "pci_bridge"})), 1)
+
+        qdev.remove(disk1)
+        self.assertNotIn("disk1", qdev)
+        self.assertEqual(qdev.get_by_qid("disk1"), [])
+        self.assertIsNone(qdev.get_qdev_by_drive("drive_disk1"))
+        # The aid and qid are free again
+        qdev.insert(
+            qdevices.QDevice(
+                "virtio-blk-pci",
+                {"id": "disk1", "drive": "drive_disk1"},
+                parent_bus={"aobject": "pci_bridge"},
+            )
+        )
+        self.assertEqual(qdev.get_qdev_by_drive("drive_disk1"), "disk1")
+        self.assertIsNot(qdev["disk1"], disk1)
+
+        # Devices modified after their insertion are found by the new values
+        disk2 = qdev["disk2"]
+        disk2.set_param("drive", "drive_other")
+        self.assertIsNone(qdev.get_qdev_by_drive("drive_disk2"))
+        self.assertEqual(qdev.get_qdev_by_drive("drive_other"), "disk2")
+        disk2.set_param("id", "disk_other")
+        self.assertEqual(qdev.get_by_qid("disk2"), [])
+        self.assertEqual(qdev.get_by_qid("disk_other"), [disk2])
+        self.assertEqual(qdev.get_by_params({"id": "disk_other"}), [disk2])
+        self.assertEqual(qdev.get_qdev_by_drive("drive_other"), "disk_other")
+        self.assertRaises(
+            qcontainer.DeviceError,
+            qdev.insert,
+            qdevices.QDevice(
+                "virtio-blk-pci",
+                {"id": "disk_other"},
+                parent_bus={"aobject": "pci_bridge"},
+            ),
+        )
+        disk2.set_aid("disk_aid")
+        self.assertNotIn("disk2", qdev)
+        self.assertIs(qdev["disk_aid"], disk2)
+        del disk2["drive"]
+        self.assertIsNone(qdev.get_qdev_by_drive("drive_other"))
+        # Removed devices are not indexed anymore
+        disk1.set_param("id", "disk_removed")
+        self.assertEqual(qdev.get_by_qid("disk_removed"), [])
+        disks = qdev.get_by_properties({"type": "virtio-blk-pci"})
+        self.assertEqual(disks, [dev for dev in qdev if dev in disks])
+
+        qdev.remove("pci_bridge")
+        self.assertEqual(qdev.get_buses({"aobject": "pci_bridge"}), [])
+        self.assertEqual(qdev.get_by_params({"id": "disk0"}), [])
+
+    def test_probe_cache(self):
+        """Test the qemu binary is only probed once while unmodified"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        qemu_cmd = os.path.join(tmpdir, "qemu-kvm")
+        with open(qemu_cmd, "w") as qemu_file:
+            qemu_file.write("#!/bin/sh\n")
+        self.god.stub_with(
+            qcontainer.utils_qemu.data_dir, "get_cache_dir", lambda _: tmpdir
+        )
+        self.god.stub_with(qcontainer.utils_qemu, "_probe_cache", {})
+        module_dir = os.path.join(tmpdir, "modules")
+        os.mkdir(module_dir)
+        self.god.stub_with(
+            qcontainer.utils_qemu, "QEMU_MODULE_DIRS_PATTERNS", (module_dir,)
+        )
+        calls = []
+
+        def _counting_run(cmd, *args, **kwargs):
+            calls.append(cmd)
+            return self._qemu_run(cmd, *args, **kwargs)
+
+        self.god.stub_with(qcontainer.process, "run", _counting_run)
+        qdev1 = qcontainer.DevContainer(qemu_cmd, "vm1")
+        self.assertTrue(calls)
+        # The QMP commands and their arguments are probed by the same qemu
+        qmp_calls = [cmd for cmd in calls if "-qmp" in cmd]
+        self.assertEqual(len(qmp_calls), 1)
+        self.assertIn("query-qmp-schema", qmp_calls[0])
+        del calls[:]
+        # Loaded from the file by another process
+        qcontainer.utils_qemu._probe_cache.clear()
+        qdev2 = qcontainer.DevContainer(qemu_cmd, "vm2")
+        self.assertEqual(calls, [])
+        self.assertEqual(qdev1.get_help_text(), qdev2.get_help_text())
+        self.assertTrue(qdev2.has_qmp_cmd("device_add"))
+        self.assertTrue(qdev2.has_qmp_cmd_arg("device_add", "driver"))
+        self.assertFalse(qdev2.has_qmp_cmd_arg("device_add", "bus"))
+        # The binary is updated
+        with open(qemu_cmd, "a") as qemu_file:
+            qemu_file.write("exit 0\n")
+        qcontainer.DevContainer(qemu_cmd, "vm3")
+        self.assertTrue(calls)
+        del calls[:]
+        # A qemu module is installed
+        stat = os.stat(module_dir)
+        os.utime(module_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        qcontainer.DevContainer(qemu_cmd, "vm3")
+        self.assertTrue(calls)
+        del calls[:]
+        qcontainer.DevContainer(qemu_cmd, "vm3")
+        self.assertEqual(calls, [])
+        # The access to /dev/kvm changes
+        kvm_access = os.access("/dev/kvm", os.R_OK | os.W_OK)
+        with unittest_mock.patch.object(
+            qcontainer.utils_qemu.os, "access", return_value=not kvm_access
+        ):
+            qcontainer.DevContainer(qemu_cmd, "vm3")
+        self.assertTrue(calls)
+        del calls[:]
+        qcontainer.DevContainer(qemu_cmd, "vm4", probe_cache="no")
+        self.assertTrue(calls)
+
     @skip("Current PCIe parent-bus matching rejects this legacy topology")
     @unittest.skip("Current PCIe parent-bus matching rejects this legacy topology")
     def test_pci(self):
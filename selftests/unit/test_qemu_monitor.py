@@ -1,8 +1,14 @@
 #!/usr/bin/python
 
+import json
 import os
+import shutil
+import socket
 import sys
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
 # simple magic for using scripts within a source tree
 basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -365,5 +371,144 @@ sd0: [not inserted]
                 )
 
 
+class FakeQMPServer(threading.Thread):
+    """Minimal QMP server answering on a unix socket"""
+
+    def __init__(self, path):
+        super(FakeQMPServer, self).__init__(daemon=True)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+
+    def reply(self, conn, obj):
+        conn.sendall(json.dumps(obj).encode() + b"\r\n")
+
+    def run(self):
+        conn, _ = self.server.accept()
+        self.reply(conn, {"QMP": {"version": {}, "capabilities": []}})
+        for line in conn.makefile("rb"):
+            if not line.strip():
+                continue
+            cmd = json.loads(line)
+            ret = {}
+            if cmd["execute"] == "query-commands":
+                ret = [{"name": "query-status"}, {"name": "system_reset"}]
+            elif cmd["execute"] == "query-status":
+                ret = {"running": True, "status": "running"}
+            elif cmd["execute"] == "query-big":
+                self.reply(conn, {"event": "BIG", "data": {}})
+                ret = [{"index": i, "name": "x" * 64} for i in range(20000)]
+            elif cmd["execute"] == "system_reset":
+                timer = threading.Timer(
+                    0.2, self.reply, (conn, {"event": "RESET", "data": {}})
+                )
+                timer.start()
+            elif cmd["execute"] == "qom-get":
+                ret = cmd["arguments"]["property"]
+            elif cmd["execute"] == "fail":
+                error = {"class": "GenericError", "desc": "failed"}
+                self.reply(conn, {"error": error, "id": cmd.get("id")})
+                continue
+            self.reply(conn, {"return": ret, "id": cmd.get("id")})
+        conn.close()
+
+
+class QMPEventStoreTests(Test):
+    def testIndexAndRetention(self):
+        store = qemu_monitor.QMPEventStore(max_events=3)
+        for i, name in enumerate(["RESET", "STOP", "RESET", "RESUME"]):
+            store.add({"event": name, "data": {"i": i}})
+        self.assertEqual(len(store), 3)
+        self.assertEqual([e["data"]["i"] for e in store.get_all()], [1, 2, 3])
+        self.assertEqual(store.find("RESET")["data"]["i"], 2)
+        self.assertIsNone(store.find("RESET", lambda e: e["data"]["i"] == 0))
+        store.clear("RESET")
+        self.assertIsNone(store.find("RESET"))
+        self.assertEqual([e["event"] for e in store.get_all()], ["STOP", "RESUME"])
+
+    def testSubscribe(self):
+        store = qemu_monitor.QMPEventStore()
+        received = []
+        store.subscribe("RESET", received.append)
+        self.assertEqual(store.add({"event": "STOP"}), [])
+        for callback in store.add({"event": "RESET"}):
+            callback("RESET")
+        self.assertEqual(received, ["RESET"])
+        store.unsubscribe("RESET", received.append)
+        self.assertEqual(store.add({"event": "RESET"}), [])
+
+
+class QMPReaderThreadTests(Test):
+    reader_thread = "yes"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, "qmp")
+        FakeQMPServer(path).start()
+        patcher = mock.patch.object(qemu_monitor.Monitor, "_log_lines")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.monitor = qemu_monitor.QMPMonitor(
+            qemu_monitor.VM("vm1"),
+            "qmpmonitor1",
+            {"monitor_filename": path, "monitor_reader_thread": self.reader_thread},
+        )
+
+    def testCmd(self):
+        self.assertIn("query-status", self.monitor._supported_cmds)
+        self.assertTrue(self.monitor.verify_status("running"))
+
+    def testCmdWithId(self):
+        r = self.monitor.cmd_qmp("query-status", q_id="x")
+        self.assertEqual(
+            r, {"return": {"running": True, "status": "running"}, "id": "x"}
+        )
+        r = self.monitor.cmd_obj({"execute": "qom-get", "arguments": {"property": "p"}})
+        self.assertEqual(r, {"return": "p", "id": None})
+        self.assertTrue(self.monitor.verify_status("running"))
+        if self.monitor._reader:
+            self.assertEqual(self.monitor._responses, {})
+
+    def testLargeResponseAndEvents(self):
+        ret = self.monitor.cmd("query-big", debug=False)
+        self.assertEqual(len(ret), 20000)
+        self.assertEqual(ret[-1]["index"], 19999)
+        self.assertEqual(self.monitor.get_event("BIG")["event"], "BIG")
+        self.monitor.clear_event("BIG")
+        self.assertEqual(self.monitor.get_events(), [])
+
+    def testWaitForEvent(self):
+        received = []
+        self.monitor.subscribe_event("RESET", received.append)
+        self.monitor.system_reset()
+        self.assertEqual([e["event"] for e in received], ["RESET"])
+        self.assertIsNone(self.monitor.wait_for_event("STOP", timeout=0.1))
+
+    def testCmdBatch(self):
+        cmds = [("qom-get", {"path": "/", "property": "p%d" % i}) for i in range(50)]
+        rets = self.monitor.cmd_batch(["query-status"] + cmds, debug=False)
+        self.assertEqual(len(rets), 51)
+        self.assertEqual(rets[0]["status"], "running")
+        self.assertEqual(rets[1:], ["p%d" % i for i in range(50)])
+        self.assertRaises(
+            qemu_monitor.QMPCmdError,
+            self.monitor.cmd_batch,
+            ["fail", "query-status"],
+            debug=False,
+        )
+        # The responses of the failed batch are all consumed
+        self.assertTrue(self.monitor.verify_status("running"))
+
+    def tearDown(self):
+        self.monitor.close()
+        if self.monitor._reader:
+            self.assertFalse(self.monitor._reader.is_alive())
+        shutil.rmtree(self.tmpdir)
+
+
+class QMPPollingTests(QMPReaderThreadTests):
+    reader_thread = "no"
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+
+from virttest import qemu_vm, utils_params
+
+
+class MakeCreateCommandTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.vm_params = utils_params.Params({"qemu_binary": "/bin/true", "nics": ""})
+        self.vm = qemu_vm.VM("vm1", self.vm_params, "/tmp", {})
+        self.builds = []
+        patcher = mock.patch.object(
+            self.vm, "_make_create_command", side_effect=self._build
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _build(self, name, params, root_dir):
+        """Fake build, it updates params like the real one"""
+        self.builds.append(params)
+        params["monitor_filename_qmp1"] = "/tmp/monitor-%d" % len(self.builds)
+        devices = mock.Mock()
+        devices.get_state.return_value = -1
+        return devices, {}
+
+    def test_build_updates_params(self):
+        devices, _ = self.vm.make_create_command(params=self.vm_params)
+        self.assertEqual(len(self.builds), 1)
+        # The build works on a copy and its updates are applied afterwards
+        self.assertIsNot(self.builds[0], self.vm_params)
+        self.assertEqual(self.vm_params["monitor_filename_qmp1"], "/tmp/monitor-1")
+        self.assertEqual(self.vm_params["driver_type_vm1"], "qemu")
+        self.assertEqual(
+            devices.params_updates,
+            {"monitor_filename_qmp1": "/tmp/monitor-1", "driver_type_vm1": "qemu"},
+        )
+
+    def test_cache_hit(self):
+        devices, _ = self.vm.make_create_command(params=self.vm_params)
+        self.vm.devices = devices
+        params = utils_params.Params({"qemu_binary": "/bin/true", "nics": ""})
+        self.assertIs(self.vm.make_create_command(params=params)[0], devices)
+        self.assertEqual(len(self.builds), 1)
+        # The updates of the build are applied to the params anyway
+        self.assertEqual(params["monitor_filename_qmp1"], "/tmp/monitor-1")
+        self.assertEqual(params["driver_type_vm1"], "qemu")
+
+    def test_cache_miss_after_params_change(self):
+        devices, _ = self.vm.make_create_command(params=self.vm_params)
+        self.vm.devices = devices
+        params = self.vm_params.copy()
+        params["mem"] = "4096"
+        self.assertIsNot(self.vm.make_create_command(params=params)[0], devices)
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(params["monitor_filename_qmp1"], "/tmp/monitor-2")
+
+    def test_cache_invalidated_by_hotplug(self):
+        devices, _ = self.vm.make_create_command(params=self.vm_params)
+        self.vm.devices = devices
+        devices.get_state.return_value = 1
+        self.assertIsNot(
+            self.vm.make_create_command(params=self.vm_params.copy())[0], devices
+        )
+        self.assertEqual(len(self.builds), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
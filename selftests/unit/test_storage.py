@@ -0,0 +1,194 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+
+from virttest import qemu_storage, storage, utils_params, utils_qemu
+
+
+class ImageBackupTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.image_params = utils_params.Params(
+            {
+                "image_name": os.path.join(self.tmpdir, "image"),
+                "image_format": "qcow2",
+                "backup_dir": os.path.join(self.tmpdir, "backup"),
+            }
+        )
+        self.image = storage.QemuImg(self.image_params, self.tmpdir, "image1")
+        self.backup = os.path.join(self.tmpdir, "backup", "image.qcow2.backup")
+        with open(self.image.image_filename, "wb") as image:
+            image.write(b"x" * 4096)
+            image.seek(32 * 1024 * 1024)
+            image.write(b"y" * 4096)
+        os.chmod(self.image.image_filename, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super().tearDown()
+
+    def check_copy(self, src, dst):
+        with open(src, "rb") as fsrc, open(dst, "rb") as fdst:
+            self.assertEqual(fsrc.read(), fdst.read())
+        self.assertEqual(os.stat(src).st_mode, os.stat(dst).st_mode)
+
+    def test_copy(self):
+        for method in ("auto", "copy"):
+            self.image_params["image_backup_method"] = method
+            self.image.backup_image(self.image_params, self.tmpdir, "backup")
+            self.check_copy(self.image.image_filename, self.backup)
+            os.unlink(self.backup)
+
+    def test_copy_fallback(self):
+        dst = os.path.join(self.tmpdir, "copy")
+        with mock.patch.object(storage.fcntl, "ioctl", side_effect=OSError(95, "")):
+            self.assertRaises(
+                OSError,
+                storage.copy_image_file,
+                self.image.image_filename,
+                dst,
+                "reflink",
+            )
+            self.assertFalse(os.path.exists(dst))
+            storage.copy_image_file(self.image.image_filename, dst)
+        self.check_copy(self.image.image_filename, dst)
+
+    def test_copy_method_unsupported(self):
+        dst = os.path.join(self.tmpdir, "copy")
+        self.assertRaises(
+            ValueError,
+            storage.copy_image_file,
+            self.image.image_filename,
+            dst,
+            "rsync",
+        )
+        with mock.patch.object(storage, "os", wraps=os) as storage_os:
+            del storage_os.copy_file_range
+            self.assertRaises(
+                OSError,
+                storage.copy_image_file,
+                self.image.image_filename,
+                dst,
+                "copy",
+            )
+        self.assertFalse(os.path.exists(dst))
+
+    def test_overlay(self):
+        self.image_params["image_backup_method"] = "overlay"
+        image_filename = self.image.image_filename
+        with mock.patch.object(
+            storage.utils_misc, "get_qemu_img_binary", return_value="qemu-img"
+        ), mock.patch.object(storage.process, "system") as system, mock.patch.object(
+            storage.QemuImg, "get_overlay_base", return_value=None
+        ) as get_overlay_base:
+            system.side_effect = lambda cmd: open(cmd.split()[-1], "w").close()
+            self.image.backup_image(self.image_params, self.tmpdir, "backup")
+            system.assert_called_once_with(
+                "qemu-img create -f qcow2 -b %s -F qcow2 %s.part"
+                % (self.backup, image_filename)
+            )
+            self.assertEqual(os.path.getsize(self.backup), 32 * 1024 * 1024 + 4096)
+            self.assertEqual(os.path.getsize(image_filename), 0)
+
+            # Restoring replaces the overlay
+            with open(image_filename, "w") as image:
+                image.write("changed")
+            self.image.backup_image(self.image_params, self.tmpdir, "restore")
+            self.assertEqual(os.path.getsize(image_filename), 0)
+
+            # Removing the backup merges it back
+            get_overlay_base.return_value = self.backup
+            system.reset_mock()
+            self.image.rm_backup_image()
+            system.assert_called_once_with("qemu-img commit %s" % image_filename)
+            self.assertFalse(os.path.exists(self.backup))
+            self.assertEqual(os.path.getsize(image_filename), 32 * 1024 * 1024 + 4096)
+
+    def test_overlay_unsupported(self):
+        self.image_params["image_backup_method"] = "overlay"
+        self.image_params["image_format"] = "raw"
+        image = storage.QemuImg(self.image_params, self.tmpdir, "image1")
+        self.assertEqual(image.get_backup_method(self.image_params), "auto")
+
+
+class QemuImgProbeCacheTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        for name, output in (
+            ("qemu-kvm", "QEMU emulator version 9.0.0"),
+            ("qemu-img", "  info [-U] [-f fmt] filename"),
+        ):
+            with open(os.path.join(self.tmpdir, name), "w") as binary:
+                binary.write("#!/bin/sh\necho '%s'\n" % output)
+            os.chmod(os.path.join(self.tmpdir, name), 0o755)
+        self.image_params = utils_params.Params(
+            {
+                "image_name": os.path.join(self.tmpdir, "image"),
+                "image_format": "qcow2",
+                "qemu_binary": os.path.join(self.tmpdir, "qemu-kvm"),
+                "qemu_img_binary": os.path.join(self.tmpdir, "qemu-img"),
+            }
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super().tearDown()
+
+    def test_probe_cache(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        run = qemu_storage.process.run
+        with mock.patch.object(
+            utils_qemu.data_dir, "get_cache_dir", return_value=cache_dir
+        ), mock.patch.object(utils_qemu, "_probe_cache", {}), mock.patch.object(
+            qemu_storage.process, "run", side_effect=run
+        ) as run_mock:
+            image = qemu_storage.QemuImg(self.image_params, self.tmpdir, "image1")
+            self.assertEqual(image.qemu_ver, "9.0.0")
+            self.assertTrue(image._get_cmd_cap_force_share("info"))
+            self.assertEqual(run_mock.call_count, 2)
+            # Another process
+            utils_qemu._probe_cache.clear()
+            image = qemu_storage.QemuImg(self.image_params, self.tmpdir, "image1")
+            self.assertEqual(image.qemu_ver, "9.0.0")
+            self.assertTrue(image._get_cmd_cap_force_share("info"))
+            self.assertFalse(image._get_cmd_cap_force_share("check"))
+            self.assertEqual(run_mock.call_count, 3)
+            self.image_params["qemu_probe_cache"] = "no"
+            image = qemu_storage.QemuImg(self.image_params, self.tmpdir, "image1")
+            self.assertTrue(image._get_cmd_cap_force_share("info"))
+            self.assertEqual(run_mock.call_count, 5)
+
+    def test_probe_cache_failure(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        run = qemu_storage.process.run
+        with mock.patch.object(
+            utils_qemu.data_dir, "get_cache_dir", return_value=cache_dir
+        ), mock.patch.object(utils_qemu, "_probe_cache", {}), mock.patch.object(
+            qemu_storage.process, "run", side_effect=run
+        ) as run_mock:
+            with open(self.image_params["qemu_img_binary"], "a") as binary:
+                binary.write("exit 1\n")
+            image = qemu_storage.QemuImg(self.image_params, self.tmpdir, "image1")
+            self.assertEqual(run_mock.call_count, 1)
+            # The help texts of failed commands are not cached
+            self.assertTrue(image._get_cmd_cap_force_share("info"))
+            self.assertTrue(image._get_cmd_cap_force_share("info"))
+            self.assertEqual(run_mock.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
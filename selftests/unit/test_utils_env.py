@@ -13,7 +13,7 @@ if os.path.isdir(os.path.join(basedir, "virttest")):
 
 from avocado import Test
 
-from virttest import utils_env, utils_misc, utils_params
+from virttest import ip_sniffing, utils_env, utils_misc, utils_params
 
 
 class FakeVm(object):
@@ -88,6 +88,48 @@ class TestEnv(Test):
         sync2 = env4.get_syncserver(222)
         assert sync2.instance == sync1.instance
 
+    def test_save_entries(self):
+        """
+        1) Register 2 VMs sharing the address cache of the env and save it.
+        2) Load the env, verify that no VM is unpickled before it is got and
+           that the address cache is still shared once they are.
+        3) Save the env again, verify that the VM not got is saved as it was
+           loaded and that no temporary file is left.
+        """
+        env = utils_env.Env(filename=self.envfilename)
+        env["address_cache"] = ip_sniffing.AddrCache()
+        env["address_cache"]["mac"] = "ip"
+        params = utils_params.Params({"main_vm": "vm1"})
+        for name in ("vm1", "vm2"):
+            vm = FakeVm(name, params)
+            vm.address_cache = env["address_cache"]
+            env.register_vm(name, vm)
+        env.save()
+
+        env2 = utils_env.Env(filename=self.envfilename)
+        self.assertIs(dict.get(env2.data, "vm__vm1"), utils_env._NOT_LOADED)
+        vm1 = env2.get_vm("vm1")
+        self.assertEqual(vm1.instance, env.get_vm("vm1").instance)
+        self.assertIs(vm1.address_cache, env2["address_cache"])
+        self.assertIs(dict.get(env2.data, "vm__vm2"), utils_env._NOT_LOADED)
+        pickled = env2.data.get_pickled("vm__vm2")
+
+        vm1.address_cache["mac2"] = "ip2"
+        env2.save()
+        self.assertFalse(
+            [
+                name
+                for name in os.listdir(os.path.dirname(self.envfilename))
+                if name.startswith(os.path.basename(self.envfilename) + ".")
+            ]
+        )
+        env3 = utils_env.Env(filename=self.envfilename)
+        self.assertEqual(env3.data.get_pickled("vm__vm2"), pickled)
+        self.assertEqual(env3["address_cache"]["mac2"], "ip2")
+        self.assertEqual(len(env3.get_all_vms()), 2)
+        self.assertIs(env3.get_vm("vm2").address_cache, env3["address_cache"])
+        os.unlink(self.envfilename)
+
     def test_register_vm(self):
         """
         1) Create an env object.
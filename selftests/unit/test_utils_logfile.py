@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+
+from virttest import utils_logfile
+
+
+class LogLineTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.tmpdir, "serial.log")
+        patchers = (
+            mock.patch.object(utils_logfile, "_log_file_dir", self.tmpdir),
+            mock.patch.object(utils_logfile, "_open_log_files", {}),
+            mock.patch.object(utils_logfile, "_flush_interval", 0.0),
+            mock.patch.object(utils_logfile, "_flush_size", 64 * 1024),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        utils_logfile.close_log_file()
+        shutil.rmtree(self.tmpdir)
+        super().tearDown()
+
+    def read_lines(self):
+        with open(self.log_file) as log_file:
+            return [line.split(": ", 1)[1] for line in log_file.read().splitlines()]
+
+    def test_unbuffered(self):
+        utils_logfile.log_line("serial.log", "first")
+        self.assertEqual(self.read_lines(), ["first"])
+
+    def test_buffered(self):
+        # Only flushed explicitly, by size or when closed
+        utils_logfile._flush_interval = 3600.0
+        utils_logfile._flush_size = 80
+        utils_logfile.log_line("serial.log", "first")
+        self.assertEqual(self.read_lines(), [])
+        self.assertEqual(
+            utils_logfile.get_match_count(self.log_file, "first"),
+            1,
+        )
+        utils_logfile.log_line("serial.log", "second")
+        self.assertEqual(self.read_lines(), ["first"])
+        utils_logfile.log_line("serial.log", "third")
+        utils_logfile.log_line("serial.log", "fourth")
+        self.assertEqual(self.read_lines(), ["first", "second", "third", "fourth"])
+        utils_logfile.log_line("serial.log", "fifth")
+        utils_logfile.close_log_file("serial.log")
+        self.assertEqual(self.read_lines()[-1], "fifth")
+
+    @unittest.skipUnless(
+        "fork" in multiprocessing.get_all_start_methods(), "fork is not available"
+    )
+    def test_child_process_exit(self):
+        # The buffered lines are written even though the child leaves with
+        # os._exit(), as the test processes do
+        utils_logfile._flush_interval = 3600.0
+        process = multiprocessing.get_context("fork").Process(
+            target=utils_logfile.log_line, args=("serial.log", "child")
+        )
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.read_lines(), ["child"])
+
+    def test_concurrent(self):
+        utils_logfile._flush_interval = 3600.0
+
+        def log_lines(name):
+            for i in range(100):
+                utils_logfile.log_line("serial.log", "%s %d" % (name, i))
+                if i % 25 == 0:
+                    utils_logfile.close_log_file("serial.log")
+
+        threads = [
+            threading.Thread(target=log_lines, args=("thread%d" % i,)) for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        utils_logfile.flush_log_file()
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 400)
+        for i in range(4):
+            name = "thread%d" % i
+            self.assertEqual(
+                [line for line in lines if line.startswith(name + " ")],
+                ["%s %d" % (name, j) for j in range(100)],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import os
+import socket
 import sys
 import tempfile
 import unittest
@@ -93,6 +94,45 @@ class TestUtilsMisc(Test):
         tarball_name = utils_misc.get_archive_tarball_name("/tmp", None, "bz2")
         self.assertEqual(tarball_name, "tmp.tar.bz2")
 
+    @staticmethod
+    def _first_ports(start_port, end_port, count, *args):
+        return list(range(start_port, end_port))[:count]
+
+    def test_find_free_ports_without_reserve(self):
+        with unittest_mock.patch(
+            "virttest.utils_misc._find_free_ports", return_value=[5003]
+        ) as find_free_ports:
+            self.assertEqual(utils_misc.find_free_port(5000, 5010, sequent=True), 5003)
+            find_free_ports.assert_called_once_with(
+                5000, 5010, 1, "localhost", True, socket.AF_INET, socket.SOCK_STREAM
+            )
+
+    @unittest_mock.patch("virttest.utils_misc.pid_exists", return_value=True)
+    def test_find_free_ports_reserves_ports(self, pid_exists):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(process.run, "rm -rf %s" % tmp_dir)
+        with unittest_mock.patch(
+            "virttest.utils_misc._find_free_ports", side_effect=self._first_ports
+        ), unittest_mock.patch(
+            "virttest.utils_misc.PORT_RESERVATIONS_FILENAME",
+            os.path.join(tmp_dir, "port_reservations"),
+        ):
+            with unittest_mock.patch("os.getpid", return_value=1):
+                self.assertEqual(
+                    utils_misc.find_free_ports(5000, 5010, 2, reserve=True),
+                    [5000, 5001],
+                )
+                # The same process can get its ports again
+                self.assertEqual(
+                    utils_misc.find_free_port(5000, 5010, reserve=True), 5000
+                )
+            # Other processes don't, unless they don't reserve ports
+            self.assertEqual(utils_misc.find_free_port(5000, 5010, reserve=True), 5002)
+            self.assertEqual(utils_misc.find_free_port(5000, 5010), 5000)
+            # Reservations of processes that are gone are dropped
+            pid_exists.return_value = False
+            self.assertEqual(utils_misc.find_free_port(5000, 5010, reserve=True), 5000)
+
     def test_git_repo_param_helper(self):
         config = """git_repo_foo_uri = git://git.foo.org/foo.git
 git_repo_foo_branch = next
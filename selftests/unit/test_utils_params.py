@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import os
+import pickle
 import sys
 import unittest
 from collections import OrderedDict
@@ -85,6 +86,64 @@ class TestParams(Test):
                 self.vt_params.object_params(key), CORRECT_RESULT_MAPPING[key]
             )
 
+    def testObjectParamsCopyOnWrite(self):
+        stg_params = self.vt_params.object_params("stg")
+        self.assertIsInstance(stg_params, utils_params.Params)
+        self.assertIs(stg_params.data, stg_params.data)
+        self.assertEqual(len(stg_params), len(CORRECT_RESULT_MAPPING["stg"]))
+        self.assertEqual(
+            list(stg_params)[: len(BASE_DICT)], list(self.vt_params.keys())
+        )
+        self.assertRaises(utils_params.ParamNotFound, stg_params.__getitem__, "x")
+        # changes of the params are not visible in the object params
+        self.vt_params["image_size_stg"] = "1G"
+        del self.vt_params["image_boot"]
+        self.assertEqual(stg_params.get("image_size"), "10G")
+        self.assertEqual(stg_params["image_boot"], "no")
+        self.assertEqual(self.vt_params.object_params("stg")["image_size"], "1G")
+        # and the other way around
+        copied = stg_params.copy()
+        stg_params["image_format"] = "raw"
+        image1_params = self.vt_params.object_params("image1")
+        self.assertEqual(image1_params["image_format"], "qcow2")
+        self.assertEqual(copied["image_format"], "qcow2")
+        self.assertEqual(stg_params.object_params("x")["image_format"], "raw")
+        self.assertEqual(
+            pickle.loads(pickle.dumps(image1_params)),
+            self.vt_params.object_params("image1"),
+        )
+
+    def testObjectParamsInterleavedChanges(self):
+        """The params of the objects follow the changes made in between"""
+        expected = dict(BASE_DICT)
+
+        def check(obj_name):
+            suffix = "_" + obj_name
+            obj_expected = dict(expected)
+            for key in expected:
+                if key.endswith(suffix):
+                    obj_expected[key.split(suffix)[0]] = expected[key]
+            self.assertEqual(self.vt_params.object_params(obj_name), obj_expected)
+
+        changes = [
+            ("image_size_stg", "1G"),
+            ("drive_format_image1", "virtio"),
+            ("image_size_stg", "2G"),
+            ("image_size_stg", None),
+            ("image_format_stg", None),
+            ("image_format_stg", "raw"),
+            ("image_cache_extra_stg", "none"),
+        ]
+        for key, value in changes:
+            if value is None:
+                del self.vt_params[key]
+                del expected[key]
+            else:
+                self.vt_params[key] = value
+                expected[key] = value
+            for obj_name in ("stg", "image1", "extra_stg"):
+                check(obj_name)
+
     def testGetItemMissing(self):
         try:
             self.vt_params["bogus"]
@@ -3,11 +3,15 @@
 import gc
 import logging
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
 
 from aexpect.exceptions import ShellProcessTerminatedError, ShellStatusError
 from avocado import Test, skipUnless
+from avocado.utils import process
 
 # simple magic for using scripts within a source tree
 basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -380,5 +384,78 @@ class VirshPersistentClassHasHelpCommandTest(VirshHasHelpCommandTest):
             super(VirshPersistentClassHasHelpCommandTest, self).tearDown()
 
 
+FAKE_VIRSH = """#!%s
+import sys
+while True:
+    sys.stdout.write("virsh # ")
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        break
+    words = line.split()
+    if words and words[0] == "echo":
+        print(" ".join(words[1:]))
+    elif words and words[0] in ("list", "domstate"):
+        print("running\\n")
+    elif words:
+        sys.stderr.write("error: unknown command: '%%s'\\n" %% words[0])
+""" % sys.executable
+
+
+class VirshBatchTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.virsh_exec = os.path.join(self.tmpdir, "virsh")
+        with open(self.virsh_exec, "w") as virsh_exec:
+            virsh_exec.write(FAKE_VIRSH)
+        os.chmod(self.virsh_exec, 0o755)
+        from virttest import virsh
+
+        self.virsh = virsh
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super().tearDown()
+
+    def test_cmd_batch(self):
+        cmds = ["domstate vm%d" % i for i in range(100)] + ["bogus", "list"]
+        vp = self.virsh.VirshPersistent(virsh_exec=self.virsh_exec, ignore_status=True)
+        try:
+            results = vp.cmd_batch(cmds)
+            self.assertEqual([result.command for result in results], cmds)
+            for result in results[:100] + results[-1:]:
+                self.assertEqual(result.exit_status, 0)
+                self.assertEqual(result.stdout_text.strip(), "running")
+            self.assertEqual(results[100].exit_status, 1)
+            self.assertIn("unknown command: 'bogus'", results[100].stdout_text)
+            self.assertRaises(process.CmdError, vp.cmd_batch, cmds, ignore_status=False)
+        finally:
+            vp.close_session()
+
+    def test_pool(self):
+        pool = self.virsh.VirshPersistentPool(size=2, virsh_exec=self.virsh_exec)
+        results = []
+        session_ids = set()
+
+        def run_batch():
+            with pool.get() as vp:
+                session_ids.add(vp.session_id)
+                results.extend(vp.cmd_batch(["domstate vm"] * 10))
+
+        threads = [threading.Thread(target=run_batch) for _ in range(6)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.close()
+        self.assertEqual(len(results), 60)
+        self.assertLessEqual(len(session_ids), 2)
+        for session_id in session_ids:
+            self.assertFalse(virsh_session_is_alive(session_id))
+
+
 if __name__ == "__main__":
     unittest.main()
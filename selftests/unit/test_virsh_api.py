@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+from avocado.utils import process
+
+from virttest import virsh, virsh_api
+
+
+class FakeLibvirtError(Exception):
+    def get_error_message(self):
+        return self.args[0]
+
+
+class FakeDomain(object):
+    def __init__(self, name, dom_id, state):
+        self._name = name
+        self._id = dom_id
+        self._state = state
+
+    def name(self):
+        return self._name
+
+    def ID(self):
+        return self._id
+
+    def state(self):
+        return [self._state, 1]
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.domains = [
+            FakeDomain("vm2", -1, 5),
+            FakeDomain("avocado-vt-vm1", 3, 1),
+        ]
+
+    def lookupByName(self, name):
+        for dom in self.domains:
+            if dom.name() == name:
+                return dom
+        raise FakeLibvirtError("Domain not found: no domain with name '%s'" % name)
+
+    def listAllDomains(self, flags):
+        return self.domains
+
+    def isAlive(self):
+        return 1
+
+
+class FakeVirshAPITest(Test):
+    def setUp(self):
+        super().setUp()
+        self.conn = FakeConnection()
+        self.libvirt = mock.Mock(
+            libvirtError=FakeLibvirtError,
+            VIR_CONNECT_LIST_DOMAINS_ACTIVE=1,
+            VIR_CONNECT_LIST_DOMAINS_INACTIVE=2,
+        )
+        self.libvirt.open.return_value = self.conn
+        patchers = (
+            mock.patch.object(virsh_api, "libvirt", self.libvirt),
+            mock.patch.object(virsh_api, "_connections", {}),
+            mock.patch.object(virsh_api, "_enabled", True),
+            mock.patch.object(virsh, "command"),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_domstate(self):
+        result = virsh.domstate("avocado-vt-vm1", uri="qemu:///system")
+        self.assertEqual(result.exit_status, 0)
+        self.assertEqual(result.stdout_text, "running\n\n")
+        self.assertTrue(virsh.is_alive("avocado-vt-vm1", uri="qemu:///system"))
+        self.assertTrue(virsh.is_dead("vm2", uri="qemu:///system"))
+        self.assertTrue(virsh.is_dead("vm3", uri="qemu:///system"))
+        self.libvirt.open.assert_called_once_with("qemu:///system")
+        virsh.command.assert_not_called()
+
+    def test_error(self):
+        result = virsh.domstate("vm3")
+        self.assertEqual(result.exit_status, 1)
+        self.assertEqual(
+            result.stderr_text,
+            "error: failed to get domain 'vm3'\n"
+            "error: Domain not found: no domain with name 'vm3'\n",
+        )
+        self.assertRaises(process.CmdError, virsh.domstate, "vm3", ignore_status=False)
+
+    def test_fallback(self):
+        virsh.domstate("avocado-vt-vm1", extra="--reason")
+        virsh.command.assert_called_once_with("domstate avocado-vt-vm1 --reason")
+        virsh.command.reset_mock()
+        virsh.domstate("avocado-vt-vm1", libvirt_api=False)
+        virsh.command.assert_called_once()
+        virsh.command.reset_mock()
+        virsh.domstate("avocado-vt-vm1", session_id="1")
+        virsh.command.assert_called_once()
+        for dargs in (
+            {"virsh_exec": "ssh remote virsh"},
+            {"timeout": 10},
+            {"quiet": True},
+        ):
+            virsh.command.reset_mock()
+            virsh.domstate("avocado-vt-vm1", **dargs)
+            virsh.command.assert_called_once()
+        self.libvirt.open.assert_not_called()
+        # The default virsh executable, passed by the Virsh instances
+        virsh.domstate("avocado-vt-vm1", virsh_exec=virsh.VIRSH_EXEC)
+        self.libvirt.open.assert_called_once()
+
+    def test_dom_list(self):
+        result = virsh.dom_list("--all")
+        self.assertEqual(
+            result.stdout_text,
+            " Id   Name             State\n"
+            "--------------------------------\n"
+            " 3    avocado-vt-vm1   running\n"
+            " -    vm2              shut off\n\n",
+        )
+        result = virsh.dom_list("--name --all")
+        self.assertEqual(result.stdout_text, "avocado-vt-vm1\nvm2\n\n")
+
+
+@unittest.skipUnless(virsh_api.libvirt is not None, "libvirt-python is not installed")
+class VirshAPITest(Test):
+    def setUp(self):
+        super().setUp()
+        self.dargs = {"uri": "test:///default", "libvirt_api": True}
+
+    def test_domain(self):
+        self.assertEqual(
+            virsh.domstate("test", **self.dargs).stdout_text.strip(), "running"
+        )
+        self.assertIn(
+            "Name:           test", virsh.dominfo("test", **self.dargs).stdout
+        )
+        self.assertIn("<name>test</name>", virsh.dumpxml("test", **self.dargs).stdout)
+        self.assertIn(" test ", virsh.dom_list("--all", **self.dargs).stdout)
+        virsh.destroy("test", ignore_status=False, **self.dargs)
+        self.assertTrue(virsh.is_dead("test", **self.dargs))
+        self.assertEqual(virsh.domid("test", **self.dargs).stdout_text.strip(), "-")
+        virsh.start("test", ignore_status=False, **self.dargs)
+        self.assertTrue(virsh.is_alive("test", **self.dargs))
+        self.assertEqual(
+            virsh.domjobinfo("test", **self.dargs).stdout_text.split(),
+            ["Job", "type:", "None"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
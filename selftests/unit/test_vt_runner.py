@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from avocado import Test
+
+from avocado_vt.plugins import vt_runner
+from virttest import data_dir
+
+PARALLEL_CONFIG = {"run.max_parallel_tasks": 2}
+
+
+class IsolateParamsTest(Test):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_defaults(self):
+        vt_params = {"images": "image1", "image_name": "images/image1"}
+        vt_runner.isolate_params(vt_params, self.tmp_dir)
+        self.assertEqual(vt_params["image_snapshot"], "yes")
+        self.assertEqual(vt_params["reserve_ports"], "yes")
+        self.assertNotIn("images_base_dir_image1", vt_params)
+
+    def test_params_kept(self):
+        vt_params = {
+            "images": "image1",
+            "image_name": "images/image1",
+            "image_snapshot_image1": "no",
+            "reserve_ports": "no",
+        }
+        vt_runner.isolate_params(vt_params, self.tmp_dir)
+        self.assertNotIn("image_snapshot", vt_params)
+        self.assertEqual(vt_params["reserve_ports"], "no")
+
+    def test_scratch_image(self):
+        vt_params = {
+            "images": "image1 stg",
+            "image_name": "images/image1",
+            "image_name_stg": "images/stg",
+            "create_image_stg": "yes",
+            "remove_image_stg": "yes",
+        }
+        vt_runner.isolate_params(vt_params, self.tmp_dir)
+        self.assertEqual(vt_params["images_base_dir_stg"], self.tmp_dir)
+        self.assertNotIn("images_base_dir_image1", vt_params)
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp_dir, "images")))
+
+
+class PreparesImagesTest(Test):
+    def test_install(self):
+        self.assertTrue(vt_runner.prepares_images({"type": "unattended_install"}))
+
+    def test_kept_image(self):
+        vt_params = {"images": "image1", "force_create_image": "yes"}
+        self.assertTrue(vt_runner.prepares_images(vt_params))
+        vt_params["remove_image_image1"] = "yes"
+        self.assertFalse(vt_runner.prepares_images(vt_params))
+
+    def test_boot(self):
+        vt_params = {"type": "boot", "images": "image1", "image_name": "image1"}
+        self.assertFalse(vt_runner.prepares_images(vt_params))
+
+
+class VirtTestTest(Test):
+    def _get_test(self, isolated):
+        runnable = mock.Mock(
+            uri="fake_test",
+            config={},
+            output_dir=None,
+            kwargs={"shortname": "fake", "vm_type": "qemu", "images": "image1"},
+        )
+        return vt_runner.VirtTest(None, runnable, isolated=isolated)
+
+    def test_isolated(self):
+        self.addCleanup(data_dir.set_task_tmp_dir, None)
+        shared_tmp_dir = data_dir.get_tmp_dir()
+        vt_test = self._get_test(True)
+        self.addCleanup(shutil.rmtree, vt_test.task_tmp_dir)
+        self.assertEqual(os.path.dirname(vt_test.task_tmp_dir), shared_tmp_dir)
+        self.assertEqual(data_dir.get_tmp_dir(), vt_test.task_tmp_dir)
+        self.assertEqual(vt_test.params["env"], "env-%s" % os.getpid())
+        self.assertEqual(vt_test.params["image_snapshot"], "yes")
+
+    def test_not_isolated(self):
+        vt_test = self._get_test(False)
+        self.assertFalse(hasattr(vt_test, "task_tmp_dir"))
+        self.assertNotIn("image_snapshot", vt_test.params)
+        self.assertNotEqual(vt_test.params.get("env"), "env-%s" % os.getpid())
+
+
+class SetTaskTmpDirTest(Test):
+    def test_set_task_tmp_dir(self):
+        shared_tmp_dir = data_dir.get_tmp_dir()
+        self.addCleanup(data_dir.set_task_tmp_dir, None)
+        data_dir.set_task_tmp_dir("/tmp/task")
+        self.assertEqual(data_dir.get_tmp_dir(), "/tmp/task")
+        data_dir.set_task_tmp_dir(None)
+        self.assertEqual(data_dir.get_tmp_dir(), shared_tmp_dir)
+
+
+class VTTestRunnerTest(Test):
+    def _run(self, kwargs, tmp_dir):
+        runner = vt_runner.VTTestRunner()
+        runnable = mock.Mock(config=PARALLEL_CONFIG, kwargs=kwargs)
+        with mock.patch.object(
+            vt_runner, "get_settings_value", return_value=tmp_dir
+        ), mock.patch.object(vt_runner, "VirtTest", side_effect=AssertionError):
+            return list(runner.run(runnable))
+
+    def test_parallel_needs_tmp_dir(self):
+        messages = self._run({"vm_type": "qemu"}, "")
+        self.assertEqual(messages[-1]["result"], "cancel")
+        self.assertIn("vt.common.tmp_dir", messages[-1]["fail_reason"])
+
+    def test_parallel_install(self):
+        kwargs = {"vm_type": "qemu", "type": "unattended_install"}
+        messages = self._run(kwargs, "/var/tmp/vt")
+        self.assertEqual(messages[-1]["result"], "cancel")
+        self.assertIn("image preparing", messages[-1]["fail_reason"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ import os
 import sys
 import tempfile
 import unittest
+from unittest import mock
 from xml.etree import ElementTree
 
 # simple magic for using scripts within a source tree
@@ -309,6 +310,52 @@ class test_XMLTreeFile(xml_test_data):
         self.assertTrue(testxml.find("foo/bar/baz") is not None)
 
 
+class test_XMLTreeFile_in_memory(xml_test_data):
+    def setUp(self):
+        super(test_XMLTreeFile_in_memory, self).setUp()
+        patcher = mock.patch.object(
+            xml_utils.tempfile, "mkstemp", wraps=xml_utils.tempfile.mkstemp
+        )
+        self.mkstemp = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_files(self):
+        xml = xml_utils.XMLTreeFile(self.XMLSTR, in_memory=True)
+        copy = xml.backup_copy()
+        xml.find("host/cpu/arch").text = "ppc64"
+        xml.backup()
+        xml.restore()
+        self.assertTrue(xml.in_memory)
+        self.assertTrue(copy.in_memory)
+        self.mkstemp.assert_not_called()
+        self.assertEqual(xml.find("host/cpu/arch").text, "ppc64")
+        self.assertEqual(copy.find("host/cpu/arch").text, "x86_64")
+        self.assertEqual(str(copy), str(xml_utils.XMLTreeFile(self.XMLSTR)))
+
+    def test_materialize(self):
+        xml = xml_utils.XMLTreeFile(self.XMLSTR, in_memory=True)
+        xml.find("host/cpu/arch").text = "ppc64"
+        # The files are created from the source and the current tree
+        self.assertTrue(self.is_same_contents(xml.sourcefilename))
+        self.assertFalse(xml.in_memory)
+        self.assertEqual(self.mkstemp.call_count, 2)
+        testxml = xml_utils.XMLTreeFile(xml.name)
+        self.assertEqual(testxml.find("host/cpu/arch").text, "ppc64")
+        xml.restore()
+        self.assertTrue(self.is_same_contents(xml.name))
+
+    def test_restore_from_file(self):
+        xml = xml_utils.XMLTreeFile(self.XMLFILE, in_memory=True)
+        xml.find("host/cpu/arch").text = "ppc64"
+        xml.restore()
+        self.assertEqual(xml.find("host/cpu/arch").text, "x86_64")
+        xml.find("host/cpu/arch").text = "ppc64"
+        xml.backup()
+        self.assertFalse(self.is_same_contents(self.XMLFILE))
+        self.mkstemp.assert_not_called()
+        self.assertEqual(xml.sourcefilename, self.XMLFILE)
+
+
 class test_templatized_xml(xml_test_data):
     def setUp(self):
         self.MAPPING = {"foo": "bar", "bar": "baz", "baz": "foo"}
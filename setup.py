@@ -76,4 +76,8 @@ if __name__ == "__main__":
             "aexpect",
             "avocado-framework>=82.1",
         ],
+        extras_require={
+            # Faster screendump comparisons, see virttest.ppm_utils
+            "numpy": ["numpy"],
+        },
     )
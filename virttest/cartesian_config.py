@@ -133,17 +133,32 @@ The base of the definitions come verbatim as follows:
 """
 
 import collections
+import hashlib
 import logging
+import multiprocessing
 import optparse
 import os
+import pickle
+import queue as Queue
 import re
 import sys
+import tempfile
+import traceback
 
 _reserved_keys = set(
     ("name", "shortname", "dep", "_short_name_map_file", "_name_map_file")
 )
 options = None
 num_failed_cases = 5
+# Bump whenever the layout of the parsed tree (Node, Label, filters,
+# operators) changes, so stale on-disk parse caches get ignored.
+parse_cache_version = 4
+# State of the get_dicts() pool workers, see Parser._get_dicts_parallel()
+_parallel_state = None
+# Number of dicts sent at once by the get_dicts() pool workers
+parallel_chunk_size = 100
+# Number of chunks of a child node sent ahead of the consumer
+parallel_chunk_credits = 4
 
 
 LOG = logging.getLogger("avocado." + __name__)
@@ -567,6 +582,8 @@ def _drop_suffixes(d):
 
     # dictionary `d_flat' is going to be the mutated copy of `d`
     d_flat = d.copy()
+    # values of all the keys sharing a general var name, filled on demand
+    gen_values = None
     for key in d:
         if key in _reserved_keys:
             continue
@@ -583,13 +600,13 @@ def _drop_suffixes(d):
                 d_flat.pop(key)
                 continue
 
-            can_drop_all_suffixes_for_this_key = True
-            for k in d:
-                gen_name = k[0] if isinstance(k, tuple) else k
-                if gen_var_name == gen_name:
-                    if d[key] != d[k]:
-                        can_drop_all_suffixes_for_this_key = False
-                        break
+            if gen_values is None:
+                gen_values = collections.defaultdict(list)
+                for k, value in d.items():
+                    gen_values[k[0] if isinstance(k, tuple) else k].append(value)
+            can_drop_all_suffixes_for_this_key = all(
+                d[key] == value for value in gen_values[gen_var_name]
+            )
 
         if skipdups and can_drop_all_suffixes_for_this_key:
             new_key = key[0]
@@ -617,9 +634,15 @@ def _substitution(value, d):
     if "$" in value:
         start = 0
         st = ""
-        d_flat = _drop_suffixes(d)
+        match = match_substitute.search(value, start)
+        if not match:
+            return value
+        # Flattening copies the whole dict, only needed with suffixed keys
+        if any(isinstance(key, tuple) for key in d):
+            d_flat = _drop_suffixes(d)
+        else:
+            d_flat = d
         try:
-            match = match_substitute.search(value, start)
             while match:
                 val = d_flat[match.group(1)]
                 st += value[start : match.start()] + str(val)
@@ -1076,6 +1099,9 @@ tokens_oper_re = [r"\=", r"\+\=", r"\<\=", r"\~\=", r"\?\=", r"\?\+\=", r"\?\<\=
 
 
 _ops_exp = re.compile(r"|".join(tokens_oper_re))
+# \w matches what str.isalnum() does plus "_", the same as spec_iden
+_identifier_run = re.compile(r"[\w-]+")
+_white_run = re.compile(r"\s+")
 
 
 class Lexer(object):
@@ -1152,8 +1178,8 @@ class Lexer(object):
                     pos += 1
 
         if self.fast and pos == 0:  # due to refexp
-            cind = line[pos:].find(":")
-            m = _ops_exp.search(line[pos:])
+            cind = line.find(":")
+            m = _ops_exp.search(line)
 
         oper = ""
         token = None
@@ -1167,10 +1193,15 @@ class Lexer(object):
             yield tokens_oper[m.group()[:-1]]()
             yield LString(line[m.end() :].lstrip())
         else:
-            li = enum(line[pos:], pos)
-            for pos, char in li:
+            end = len(line)
+            while pos < end:
+                char = line[pos]
                 if char.isalnum() or char in spec_iden:  # alfanum+_-
-                    chars += char
+                    # Take the whole run of identifier chars at once
+                    run_end = _identifier_run.match(line, pos).end()
+                    chars += line[pos:run_end]
+                    pos = run_end
+                    continue
                 elif char in spec_oper:  # <+?=~
                     if chars:
                         yield LIdentifier(chars)
@@ -1182,11 +1213,15 @@ class Lexer(object):
                         yield LIdentifier(chars)
                         chars = ""
                     if char.isspace():  # Whitespace
-                        for pos, char in li:
-                            if not char.isspace():
-                                if not self.ignore_white:
-                                    yield LWhite()
-                                break
+                        white_end = _white_run.match(line, pos).end()
+                        if white_end < end:
+                            pos = white_end
+                            char = line[pos]
+                            if not self.ignore_white:
+                                yield LWhite()
+                        else:
+                            pos = end - 1
+                            char = line[pos]
                     if char.isalnum() or char in spec_iden:
                         chars += char
                     elif char == "=":
@@ -1203,11 +1238,16 @@ class Lexer(object):
                     elif char in tokens_map:
                         token = tokens_map[char]()
                     elif char == '"':
-                        chars = ""
-                        pos, char = next(li)
-                        while char != '"':
-                            chars += char
-                            pos, char = next(li)
+                        string_end = line.find('"', pos + 1)
+                        if string_end < 0:
+                            raise LexerError(
+                                "Unterminated string on pos %s" % pos,
+                                self.line,
+                                self.filename,
+                                self.linenum,
+                            )
+                        chars = line[pos + 1 : string_end]
+                        pos = string_end
                         yield LString(chars)
                     elif char == "#":
                         break
@@ -1230,6 +1270,7 @@ class Lexer(object):
                         self.rest_as_string = False
                         yield LString(line[pos + 1 :].lstrip())
                         break
+                pos += 1
         if chars:
             yield LIdentifier(chars)
             chars = ""
@@ -1480,11 +1521,25 @@ def parse_filter(lexer, tokens):
 class Parser(object):
     # pylint: disable=W0102
 
-    def __init__(self, filename=None, defaults=False, expand_defaults=[], debug=False):
+    def __init__(
+        self,
+        filename=None,
+        defaults=False,
+        expand_defaults=[],
+        debug=False,
+        cache_dir=None,
+        jobs=1,
+    ):
         self.node = Node()
         self.debug = debug
+        # Number of processes expanding the variants, 0 means one per CPU
+        self.jobs = jobs or os.cpu_count() or 1
         self.defaults = defaults
         self.expand_defaults = [LIdentifier(x) for x in expand_defaults]
+        # Directory holding the pickled parse trees, None disables caching
+        self.cache_dir = cache_dir
+        # Every file read while parsing, used to validate cached trees
+        self.parsed_files = []
 
         self.filename = filename
         if self.filename:
@@ -1501,6 +1556,11 @@ class Parser(object):
         # It can be safely done only on top top level get_dicts()
         # Parent generator will reset this flag
         self.parent_generator = True
+        # Applied content of leaf nodes, see _get_leaf_dict()
+        self.leaf_dicts = {}
+        # The first node with several children reached by the parent
+        # generator gets its children expanded by a process pool
+        self.parallel_pending = False
 
     def _debug(self, s, *args):
         if self.debug:
@@ -1513,11 +1573,118 @@ class Parser(object):
         """
         Parse a file.
 
+        When the parser has a cache_dir and nothing was parsed yet, the
+        resulting tree is stored there and reused by later parsers as long
+        as none of the files pulled in by the config changed.
+
         :param filename: Path of the configuration file.
         """
+        use_cache = (
+            self.cache_dir is not None
+            and not self.node.content
+            and not self.node.children
+        )
+        if use_cache:
+            node = self._load_cache(filename)
+            if node is not None:
+                self.node = node
+                self.filename = filename
+                return
+        self.parsed_files.append(filename)
         self.node.filename = filename
         self.node = self._parse(Lexer(FileReader(filename)), self.node)
         self.filename = filename
+        if use_cache:
+            self._store_cache(filename)
+
+    def _cache_path(self, filename):
+        """
+        Path of the cache file for the given top level config file.
+
+        The parse tree depends on the parser settings as well, so they are
+        part of the key.
+        """
+        key = repr(
+            (
+                parse_cache_version,
+                sys.version_info[:2],
+                os.path.abspath(filename),
+                bool(self.defaults),
+                [str(x) for x in self.expand_defaults],
+            )
+        )
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "%s.pickle" % digest)
+
+    @staticmethod
+    def _file_digest(filename):
+        with open(filename, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _load_cache(self, filename):
+        """
+        Load the parse tree of filename from the cache.
+
+        Files whose size and mtime did not change are trusted, the content
+        hash is only computed for the ones that look modified.
+
+        :return: The cached root Node or None when there is no valid entry.
+        """
+        path = self._cache_path(filename)
+        touched = False
+        try:
+            with open(path, "rb") as cache_file:
+                manifest = pickle.load(cache_file)
+                for name, size, mtime, digest in manifest:
+                    stat = os.stat(name)
+                    if stat.st_size == size and stat.st_mtime_ns == mtime:
+                        continue
+                    if stat.st_size != size or self._file_digest(name) != digest:
+                        self._debug("Parse cache of %s outdated by %s", filename, name)
+                        return None
+                    touched = True
+                node = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception as details:
+            self._debug("Ignoring parse cache %s: %s", path, details)
+            return None
+        self._debug("Loaded %s from parse cache %s", filename, path)
+        self.parsed_files = [name for name, _, _, _ in manifest]
+        if touched:
+            # Only timestamps changed, refresh them to keep the fast path
+            self._store_cache(filename, node)
+        return node
+
+    def _store_cache(self, filename, node=None):
+        """
+        Store a parse tree together with the manifest of all the files it
+        was built from.
+
+        :param filename: Path of the top level configuration file.
+        :param node: Root of the tree to store, defaults to self.node.
+        """
+        node = node or self.node
+        path = self._cache_path(filename)
+        try:
+            manifest = []
+            for name in dict.fromkeys(os.path.abspath(x) for x in self.parsed_files):
+                stat = os.stat(name)
+                manifest.append(
+                    (name, stat.st_size, stat.st_mtime_ns, self._file_digest(name))
+                )
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as cache_file:
+                    pickle.dump(manifest, cache_file, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(node, cache_file, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as details:
+            self._warn("Unable to store parse cache of %s: %s", filename, details)
 
     def parse_string(self, s):
         """
@@ -1959,6 +2126,7 @@ class Parser(object):
                             lexer.line, lexer.filename, lexer.linenum
                         )
                     pre_dict = apply_predict(lexer, node, pre_dict)
+                    self.parsed_files.append(filename)
                     lch = Lexer(FileReader(filename))
                     node = self._parse(lch, node, -1)
                     lexer.set_prev_indent(prev_indent)
@@ -2030,6 +2198,7 @@ class Parser(object):
             parent = True
             # No one else is
             self.parent_generator = False
+            self.parallel_pending = self.jobs > 1
 
         # Node is a current block. It has content, its contents: node.content
         # Content without joins
@@ -2242,9 +2411,13 @@ class Parser(object):
         new_content = []
         new_external_filters = []
         new_internal_filters = []
-        if not process_content(
-            node.content, new_internal_filters
-        ) or not process_content(content, new_external_filters):
+        if process_content(node.content, new_internal_filters):
+            # Operators coming from the node itself, they go first
+            own_content_len = len(new_content)
+            passed = process_content(content, new_external_filters)
+        else:
+            passed = False
+        if not passed:
             add_failed_case()
             self._debug("Failed_cases %s", node.failed_cases)
             return
@@ -2262,6 +2435,12 @@ class Parser(object):
                     yield d
                 if n.default and count:
                     break
+        elif self.parallel_pending and len(node.children) > 1:
+            self.parallel_pending = False
+            for d in self._get_dicts_parallel(
+                node.children, ctx, new_content, shortname, dep
+            ):
+                yield d
         else:
             for n in node.children:
                 for d in self.get_dicts(n, ctx, new_content, shortname, dep):
@@ -2275,11 +2454,173 @@ class Parser(object):
                 "dep": dep,
                 "shortname": ".".join([str(sn.name) for sn in shortname]),
             }
-            for _, _, op in new_content:
+            own_dict = self._get_leaf_dict(new_content[:own_content_len])
+            if own_dict is None:
+                own_content_len = 0
+            else:
+                d.update(own_dict)
+                for key in ("_name_map_file", "_short_name_map_file"):
+                    if key in d:
+                        d[key] = d[key].copy()
+            for _, _, op in new_content[own_content_len:]:
                 op.apply_to_dict(d)
             postfix_parse(d)
             yield d
 
+    def _get_leaf_dict(self, own_content):
+        """
+        Get the result of applying the content of a leaf node.
+
+        A leaf is usually reached through many paths (every variant nests
+        the previously parsed tree) and its own content comes first, so it
+        is applied once and the result is shared by all the dicts that
+        unpacked the same content.
+
+        :param own_content: Content of the leaf node that passed the filters.
+        :return: Dict with the result or None when the content depends on
+                 the reserved keys of each dict and can't be shared.
+        """
+        key = tuple(id(t) for t in own_content)
+        try:
+            return self.leaf_dicts[key][1]
+        except KeyError:
+            pass
+        own_dict = {}
+        for _, _, op in own_content:
+            value = getattr(op, "value", None)
+            if isinstance(value, str) and "$" in value:
+                if any("${%s}" % k in value for k in _reserved_keys):
+                    own_dict = None
+                    break
+            op.apply_to_dict(own_dict)
+        # Keep the content referenced so the ids in the key stay unique
+        self.leaf_dicts[key] = (own_content, own_dict)
+        return own_dict
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Keyed by object ids, which are not kept by pickling
+        state["leaf_dicts"] = {}
+        return state
+
+    def _get_dicts_parallel(self, children, ctx, content, shortname, dep):
+        """
+        Generate the dictionaries of each child node in a separate process.
+
+        The workers are started from a fresh process (forkserver or spawn,
+        the parent may run threads) and get the parser, the child nodes
+        and the context of the parent node pickled once. Each worker
+        expands a child and sends its dicts back in chunks while they
+        are generated. The chunks are yielded in the order of the
+        children, so the output is the same as the one of the sequential
+        walk. A worker waits for the consumer once it is
+        parallel_chunk_credits chunks ahead on its child, which bounds
+        the memory used by the chunks received before their turn.
+
+        :param children: Child nodes to expand.
+        :return: A dict generator.
+        :raise ParserError: When a worker fails or dies.
+        """
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("forkserver")
+        else:
+            mp_context = multiprocessing.get_context("spawn")
+        jobs = min(self.jobs, len(children))
+        self._debug("expanding %s variants with %s jobs", len(children), jobs)
+        queue = mp_context.Queue()
+        credits = [mp_context.Semaphore(parallel_chunk_credits) for _ in children]
+        # The pool replaces the workers that die, count the started ones
+        started = mp_context.Value("i", 0)
+        state = (
+            self,
+            children,
+            (ctx, content, shortname, dep),
+            parallel_chunk_size,
+            credits,
+        )
+        pool = mp_context.Pool(jobs, _init_dicts_worker, (state, queue, started))
+        try:
+            result = pool.map_async(
+                _get_dicts_worker, range(len(children)), chunksize=1
+            )
+            # Chunks of the children received before their turn
+            pending = collections.defaultdict(collections.deque)
+            for index in range(len(children)):
+                chunks = pending.pop(index, collections.deque())
+                while True:
+                    if chunks:
+                        chunk = chunks.popleft()
+                    else:
+                        try:
+                            child, chunk = queue.get(timeout=1)
+                        except Queue.Empty:
+                            if started.value > jobs:
+                                raise ParserError(
+                                    "A worker process died while expanding variants"
+                                )
+                            if result.ready() and not result.successful():
+                                result.get()
+                            continue
+                        if child != index:
+                            pending[child].append(chunk)
+                            continue
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, str):
+                        raise ParserError(
+                            "Error expanding variants in a worker process:\n%s" % chunk
+                        )
+                    credits[index].release()
+                    for d in chunk:
+                        yield d
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            queue.close()
+            queue.join_thread()
+
+
+def _init_dicts_worker(state, queue, started):
+    """
+    Initialize a pool worker of Parser._get_dicts_parallel().
+
+    :param state: Parser, child nodes, get_dicts() arguments, chunk size
+                  and chunk credits of the child nodes.
+    :param queue: Queue receiving the dictionaries.
+    :param started: Shared counter of the started workers.
+    """
+    global _parallel_state
+    with started.get_lock():
+        started.value += 1
+    _parallel_state = state + (queue,)
+
+
+def _get_dicts_worker(index):
+    """
+    Expand one child node of Parser._get_dicts_parallel() in a pool worker.
+
+    The dictionaries are sent in chunks as (index, chunk) tuples, each one
+    taking a credit of the child node, followed by (index, None) at the
+    end or (index, traceback) on errors.
+
+    :param index: Index of the child node to expand.
+    """
+    parser, children, args, chunk_size, credits, queue = _parallel_state
+    try:
+        chunk = []
+        for d in parser.get_dicts(children[index], *args):
+            chunk.append(d)
+            if len(chunk) >= chunk_size:
+                credits[index].acquire()
+                queue.put((index, chunk))
+                chunk = []
+        credits[index].acquire()
+        queue.put((index, chunk))
+        queue.put((index, None))
+    except Exception:
+        queue.put((index, traceback.format_exc()))
+
 
 def print_dicts_default(options, dicts):
     """Print dictionaries in the default mode"""
@@ -2364,11 +2705,14 @@ def compare_string(str1, str2):
         return 1
 
 
+_postfixes = ("_max", "_min", "_fixed")
+
+
 def postfix_parse(dic):
     tmp_dict = {}
     for key in dic:
         # Bypass the case that use tuple as key value
-        if isinstance(key, tuple):
+        if isinstance(key, tuple) or not key.endswith(_postfixes):
             continue
         if key.endswith("_max"):
             tmp_key = key.split("_max")[0]
@@ -2442,6 +2786,14 @@ if __name__ == "__main__":
         action="store_false",
         help="Don't drop variables with different suffixes and same val",
     )
+    parser.add_option(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type="int",
+        default=1,
+        help="number of processes expanding the variants, 0 for one per CPU",
+    )
 
     options, args = parser.parse_args()
     if not args:
@@ -2454,7 +2806,11 @@ if __name__ == "__main__":
     if options.expand:
         expand = [x.strip() for x in options.expand.split(",")]
     c = Parser(
-        args[0], defaults=options.defaults, expand_defaults=expand, debug=options.debug
+        args[0],
+        defaults=options.defaults,
+        expand_defaults=expand,
+        debug=options.debug,
+        jobs=options.jobs,
     )
     for s in args[1:]:
         c.parse_string(s)
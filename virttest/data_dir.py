@@ -28,6 +28,8 @@ BASE_DOWNLOAD_DIR = os.path.join(SHARED_DIR, "downloads")
 DATA_DIR = os.path.join(data_dir.get_data_dir(), "avocado-vt")
 DOWNLOAD_DIR = os.path.join(DATA_DIR, "downloads")
 BACKING_DATA_DIR = None
+# Private tmp dir of a task running alongside others, see set_task_tmp_dir()
+_task_tmp_dir = None
 
 
 LOG = logging.getLogger("avocado." + __name__)
@@ -194,12 +196,30 @@ def get_deps_dir(target=None):
     )
 
 
+def set_task_tmp_dir(tmp_dir):
+    """
+    Make get_tmp_dir() return the private tmp dir of a task in this process.
+
+    Used to keep apart the files of tests running in parallel. The files
+    shared by all the tasks (e.g. the address pool or the port
+    reservations) are set up in the common tmp dir (vt.common.tmp_dir,
+    required by parallel runs) when their modules are imported, before
+    this is called.
+
+    :param tmp_dir: Tmp dir of the task, None to use the shared one again
+    """
+    global _task_tmp_dir
+    _task_tmp_dir = tmp_dir
+
+
 def get_tmp_dir(public=True):
     """
     Get the most appropriate tmp dir location.
 
     :param public: If public for all users' access
     """
+    if _task_tmp_dir is not None:
+        return _task_tmp_dir
     persistent_dir = get_settings_value("vt.common", "tmp_dir", default="")
     if persistent_dir != "":
         return persistent_dir
@@ -229,6 +249,18 @@ def get_tmp_dir(public=True):
     return tmp_dir
 
 
+def get_cache_dir(subdir=None):
+    """
+    Return the dir used to persist data that can be rebuilt at any time.
+
+    :param subdir: Optional subdirectory of the cache dir to return
+    """
+    cache_dir = os.path.join(get_data_dir(), "cache")
+    if subdir:
+        cache_dir = os.path.join(cache_dir, subdir)
+    return cache_dir
+
+
 def get_base_download_dir():
     return BASE_DOWNLOAD_DIR
 
@@ -1,5 +1,7 @@
 from __future__ import division
 
+import collections
+import concurrent.futures
 import copy
 import glob
 import logging
@@ -19,7 +21,6 @@ from avocado.utils import archive
 from avocado.utils import cpu as cpu_utils
 from avocado.utils import crypto, path
 from avocado.utils import process as a_process
-from six.moves import xrange
 
 from virttest import (
     cpu,
@@ -81,6 +82,7 @@ from virttest.test_setup.vms import ProcessVMOff, UnrequestedVMHandler
 
 utils_libvirtd = lazy_import("virttest.utils_libvirtd")
 virsh = lazy_import("virttest.virsh")
+virsh_api = lazy_import("virttest.virsh_api")
 libvirt_vm = lazy_import("virttest.libvirt_vm")
 
 
@@ -782,56 +784,50 @@ def process_command(test, params, env, command, command_timeout, command_noncrit
             raise
 
 
-class _CreateImages(threading.Thread):
-    """
-    Thread which creates images. In case of failure it stores the exception
-    in self.exc_info
+def process_images(image_func, test, params, vm_process_status=None):
     """
+    Wrapper which chooses the best way to process images.
 
-    def __init__(self, image_func, test, images, params, exit_event, vm_process_status):
-        threading.Thread.__init__(self)
-        self.image_func = image_func
-        self.test = test
-        self.images = images
-        self.params = params
-        self.exit_event = exit_event
-        self.exc_info = None
-        self.vm_process_status = vm_process_status
-
-    def run(self):
-        try:
-            _process_images_serial(
-                self.image_func,
-                self.test,
-                self.images,
-                self.params,
-                self.exit_event,
-                self.vm_process_status,
-            )
-        except Exception:
-            self.exc_info = sys.exc_info()
-            self.exit_event.set()
+    :param image_func: Process function
+    :param test: An Autotest test object.
+    :param params: A dict containing all VM and image parameters.
+    :param vm_process_status: (optional) vm process status like running, dead
+                              or None for no vm exist.
+    """
+    _process_images(
+        image_func, test, params.objects("images"), params, vm_process_status
+    )
 
 
-def process_images(image_func, test, params, vm_process_status=None):
+def _process_images(image_func, test, images, params, vm_process_status=None):
     """
-    Wrapper which chooses the best way to process images.
+    Process the images serially or with a pool of worker threads.
+
+    The number of workers is set by the image_process_workers param, by
+    default the images are processed in parallel only when there are more
+    than 20.  Chained images (image_chain) are always processed serially,
+    as a snapshot depends on its base.
 
     :param image_func: Process function
     :param test: An Autotest test object.
+    :param images: List of images (usually params.objects("images"))
     :param params: A dict containing all VM and image parameters.
     :param vm_process_status: (optional) vm process status like running, dead
                               or None for no vm exist.
     """
-    images = params.objects("images")
-    if len(images) > 20:  # Lets do it in parallel
-        _process_images_parallel(
-            image_func, test, params, vm_process_status=vm_process_status
-        )
-    else:
+    workers = params.get("image_process_workers")
+    if workers is not None:
+        workers = min(int(workers), len(images))
+    elif len(images) > 20:  # Lets do it in parallel
+        workers = min(len(images) // 5, 2 * multiprocessing.cpu_count())
+    if workers is None or workers < 2 or params.get("image_chain"):
         _process_images_serial(
             image_func, test, images, params, vm_process_status=vm_process_status
         )
+    else:
+        _process_images_parallel(
+            image_func, test, images, params, workers, vm_process_status
+        )
 
 
 def process_fs_sources(fs_source_func, test, params, vm_process_status=None):
@@ -870,36 +866,58 @@ def _process_images_serial(
             break
 
 
-def _process_images_parallel(image_func, test, params, vm_process_status=None):
+def _process_images_parallel(
+    image_func, test, images, params, workers, vm_process_status=None
+):
     """
-    The same as _process_images but in parallel.
+    The same as _process_images_serial but with a pool of worker threads.
+
+    Once an image failed no other image is started.  The failures are
+    logged in the order of the images and the first one is raised.
+
     :param image_func: Process function
     :param test: An Autotest test object.
+    :param images: List of images (usually params.objects("images"))
     :param params: A dict containing all VM and image parameters.
+    :param workers: Maximum number of images processed at the same time
     :param vm_process_status: (optional) vm process status like running, dead
                               or None for no vm exist.
     """
-    images = params.objects("images")
-    no_threads = min(len(images) // 5, 2 * multiprocessing.cpu_count())
     exit_event = threading.Event()
-    threads = []
-    for i in xrange(no_threads):
-        imgs = images[i::no_threads]
-        threads.append(
-            _CreateImages(image_func, test, imgs, params, exit_event, vm_process_status)
-        )
-        threads[-1].start()
 
-    for thread in threads:
-        thread.join()
-
-    if exit_event.is_set():  # Failure in some thread
+    def _process_image(image_name):
+        if exit_event.is_set():
+            return False
+        image_params = params.object_params(image_name)
+        try:
+            image_func(test, image_params, image_name, vm_process_status)
+        except Exception:
+            exit_event.set()
+            raise
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="ImageProcess"
+    ) as executor:
+        futures = [executor.submit(_process_image, image) for image in images]
+
+    failures = [
+        (image_name, future.exception())
+        for image_name, future in zip(images, futures)
+        if future.exception() is not None
+    ]
+    if failures:
         LOG.error("Image processing failed:")
-        for thread in threads:
-            if thread.exc_info:  # Throw the first failure
-                six.reraise(thread.exc_info[1], None, thread.exc_info[2])
-    del exit_event
-    del threads[:]
+        for image_name, error in failures:
+            LOG.error("%s: %s", image_name, error)
+        skipped = [
+            image_name
+            for image_name, future in zip(images, futures)
+            if future.exception() is None and not future.result()
+        ]
+        if skipped:
+            LOG.error("Not processed: %s", " ".join(skipped))
+        raise failures[0][1]
 
 
 def process(
@@ -993,19 +1011,15 @@ def process(
                     vm_params["skip_cluster_leak_warn"] = "yes"
                 try:
                     images = params.objects("images")
-                    _process_images_serial(
-                        check_image,
-                        test,
-                        images,
-                        vm_params,
-                        vm_process_status=vm_process_status,
+                    _process_images(
+                        check_image, test, images, vm_params, vm_process_status
                     )
                 finally:
                     if unpause_vm:
                         vm.resume()
         else:
             images = params.objects("images")
-            _process_images_serial(check_image, test, images, params)
+            _process_images(check_image, test, images, params)
 
     # preprocess
     if not vm_first:
@@ -1043,6 +1057,11 @@ def preprocess(test, params, env):
         vms = list(set(params.objects("vms") + migrate_vms))
         params["vms"] = " ".join(vms)
 
+    utils_logfile.set_flush_policy(
+        params.get_numeric("log_file_flush_interval", 0, float),
+        params.get_numeric("log_file_flush_size", 64 * 1024),
+    )
+
     _setup_manager.initialize(test, params, env)
     # Keep ProcessVMOff registered first. That way VM Off hooks will be first
     # and last running during pre/postprocess. That way vms will be actually
@@ -1089,6 +1108,7 @@ def preprocess(test, params, env):
         # Set the LIBVIRT_DEFAULT_URI to make virsh command
         # work on connect_uri as default behavior.
         os.environ["LIBVIRT_DEFAULT_URI"] = connect_uri
+        virsh_api.set_enabled(params.get("virsh_libvirt_api") == "yes")
         if params.get("setup_libvirt_polkit") == "yes":
             pol = test_setup.LibvirtPolkitConfig(params)
             try:
@@ -1707,18 +1727,132 @@ def _take_screendumps(test, params, env):
 
     random_id = utils_misc.generate_random_string(6)
     image_format = _get_screendump_format(params)
-    temp_filename = "scrdump-%s-iter%s.%s" % (random_id, test.iteration, image_format)
-    temp_filename = os.path.join(temp_dir, temp_filename)
     delay = float(params.get("screendump_delay", 5))
     quality = int(params.get("screendump_quality", 30))
     inactivity_treshold = float(params.get("inactivity_treshold", 1800))
     inactivity_watcher = params.get("inactivity_watcher", "log")
-
-    cache = {}
+    cache_size = int(params.get("screendump_cache_size", 1000))
+    skip_unchanged = params.get("screendump_skip_unchanged", "no") == "yes"
+    hash_method = params.get("screendump_hash_method", "file")
+    if hash_method == "ahash" and ppm_utils.Image is None:
+        LOG.warning("No python imaging library, hashing the screendump files")
+        hash_method = "file"
+    hash_size = int(params.get("screendump_hash_size", 16))
+    parallel = params.get("screendump_parallel", "yes") == "yes"
+
+    # Hashes of the recent screens (of any VM), least recently seen first
+    cache = collections.OrderedDict()
+    cache_lock = threading.Lock()
     counter = {}
     inactivity = {}
+    last_hash = {}
+
+    def take_screendump(vm):
+        temp_filename = "scrdump-%s-%s-iter%s.%s" % (
+            random_id,
+            vm.name,
+            test.iteration,
+            image_format,
+        )
+        temp_filename = os.path.join(temp_dir, temp_filename)
+        vm_pid = vm.get_pid()
+        try:
+            vm.screendump(filename=temp_filename, debug=False)
+        except qemu_monitor.MonitorError as e:
+            LOG.warning(e)
+            return
+        except AttributeError as e:
+            LOG.warning(e)
+            return
+        if not os.path.exists(temp_filename):
+            LOG.warning("VM '%s' failed to produce a screendump", vm.name)
+            return
+        verify_image_format = {
+            "ppm": ppm_utils.image_verify_ppm_file,
+            "png": png_utils.image_verify_png_file,
+        }
+        verify_result = verify_image_format.get(image_format)
+        if verify_result and not verify_result(temp_filename):
+            LOG.warning("VM '%s' produced an invalid screendump", vm.name)
+            os.unlink(temp_filename)
+            return
+        screendump_dir = "screendumps_%s_%s_iter%s" % (
+            vm.name,
+            vm_pid,
+            test.iteration,
+        )
+        screendump_dir = os.path.join(test.debugdir, screendump_dir)
+        try:
+            os.makedirs(screendump_dir)
+        except OSError:
+            pass
+        counter[vm.instance] += 1
+        filename = "%04d.jpg" % counter[vm.instance]
+        screendump_filename = os.path.join(screendump_dir, filename)
+        vm.verify_bsod(screendump_filename)
+        if hash_method == "ahash":
+            image_hash = ppm_utils.image_average_hash(
+                temp_filename, hash_size, hash_size
+            )
+        else:
+            image_hash = crypto.hash_file(temp_filename)
+        with cache_lock:
+            seen = image_hash in cache
+            cache[image_hash] = screendump_filename
+            cache.move_to_end(image_hash)
+            if len(cache) > cache_size:
+                cache.popitem(last=False)
+        if seen:
+            time_inactive = time.time() - inactivity[vm.instance]
+            if time_inactive > inactivity_treshold:
+                msg = "%s screen is inactive for more than %d s (%d min)" % (
+                    vm.name,
+                    time_inactive,
+                    time_inactive // 60,
+                )
+                if inactivity_watcher == "error":
+                    try:
+                        raise virt_vm.VMScreenInactiveError(vm, time_inactive)
+                    except virt_vm.VMScreenInactiveError:
+                        LOG.error(msg)
+                        # Let's reset the counter
+                        inactivity[vm.instance] = time.time()
+                        test.background_errors.put(sys.exc_info())
+                elif inactivity_watcher == "log":
+                    LOG.debug(msg)
+        else:
+            inactivity[vm.instance] = time.time()
+        if skip_unchanged and last_hash.get(vm.instance) == image_hash:
+            # Same screen as the previous screendump, already converted
+            counter[vm.instance] -= 1
+            os.unlink(temp_filename)
+            return
+        last_hash[vm.instance] = image_hash
+        try:
+            try:
+                timestamp = os.stat(temp_filename).st_ctime
+                image = PIL.Image.open(temp_filename)
+                if image_format == "ppm":
+                    image = ppm_utils.add_timestamp(image, timestamp)
+                if image_format == "png":
+                    image = png_utils.add_png_timestamp(image, timestamp)
+                image.save(screendump_filename, format="JPEG", quality=quality)
+            except (IOError, OSError) as error_detail:
+                LOG.warning(
+                    "VM '%s' failed to produce a " "screendump: %s",
+                    vm.name,
+                    error_detail,
+                )
+                # Decrement the counter as we in fact failed to
+                # produce a converted screendump
+                counter[vm.instance] -= 1
+                last_hash.pop(vm.instance, None)
+        except NameError:
+            pass
+        os.unlink(temp_filename)
 
     while True:
+        vms = []
         for vm in env.get_all_vms():
             if vm.instance not in list(counter.keys()):
                 counter[vm.instance] = 0
@@ -1726,85 +1860,12 @@ def _take_screendumps(test, params, env):
                 inactivity[vm.instance] = time.time()
             if not vm.is_alive():
                 continue
-            vm_pid = vm.get_pid()
-            try:
-                vm.screendump(filename=temp_filename, debug=False)
-            except qemu_monitor.MonitorError as e:
-                LOG.warning(e)
-                continue
-            except AttributeError as e:
-                LOG.warning(e)
-                continue
-            if not os.path.exists(temp_filename):
-                LOG.warning("VM '%s' failed to produce a screendump", vm.name)
-                continue
-            verify_image_format = {
-                "ppm": ppm_utils.image_verify_ppm_file,
-                "png": png_utils.image_verify_png_file,
-            }
-            verify_result = verify_image_format.get(image_format)
-            if verify_result and not verify_result(temp_filename):
-                if not verify_result(temp_filename):
-                    LOG.warning("VM '%s' produced an invalid screendump", vm.name)
-                    os.unlink(temp_filename)
-                    continue
-            screendump_dir = "screendumps_%s_%s_iter%s" % (
-                vm.name,
-                vm_pid,
-                test.iteration,
-            )
-            screendump_dir = os.path.join(test.debugdir, screendump_dir)
-            try:
-                os.makedirs(screendump_dir)
-            except OSError:
-                pass
-            counter[vm.instance] += 1
-            filename = "%04d.jpg" % counter[vm.instance]
-            screendump_filename = os.path.join(screendump_dir, filename)
-            vm.verify_bsod(screendump_filename)
-            image_hash = crypto.hash_file(temp_filename)
-            if image_hash in cache:
-                time_inactive = time.time() - inactivity[vm.instance]
-                if time_inactive > inactivity_treshold:
-                    msg = "%s screen is inactive for more than %d s (%d min)" % (
-                        vm.name,
-                        time_inactive,
-                        time_inactive // 60,
-                    )
-                    if inactivity_watcher == "error":
-                        try:
-                            raise virt_vm.VMScreenInactiveError(vm, time_inactive)
-                        except virt_vm.VMScreenInactiveError:
-                            LOG.error(msg)
-                            # Let's reset the counter
-                            inactivity[vm.instance] = time.time()
-                            test.background_errors.put(sys.exc_info())
-                    elif inactivity_watcher == "log":
-                        LOG.debug(msg)
-            else:
-                inactivity[vm.instance] = time.time()
-            cache[image_hash] = screendump_filename
-            try:
-                try:
-                    timestamp = os.stat(temp_filename).st_ctime
-                    image = PIL.Image.open(temp_filename)
-                    if image_format == "ppm":
-                        image = ppm_utils.add_timestamp(image, timestamp)
-                    if image_format == "png":
-                        image = png_utils.add_png_timestamp(image, timestamp)
-                    image.save(screendump_filename, format="JPEG", quality=quality)
-                except (IOError, OSError) as error_detail:
-                    LOG.warning(
-                        "VM '%s' failed to produce a " "screendump: %s",
-                        vm.name,
-                        error_detail,
-                    )
-                    # Decrement the counter as we in fact failed to
-                    # produce a converted screendump
-                    counter[vm.instance] -= 1
-            except NameError:
-                pass
-            os.unlink(temp_filename)
+            vms.append(vm)
+        if parallel and len(vms) > 1:
+            utils_misc.parallel([(take_screendump, (vm,)) for vm in vms])
+        else:
+            for vm in vms:
+                take_screendump(vm)
 
         if _screendump_thread_termination_event is not None:
             if _screendump_thread_termination_event.is_set():
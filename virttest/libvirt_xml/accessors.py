@@ -837,7 +837,7 @@ class XMLElementList(AccessorGeneratorBase):
                 # xml objects, first create xmltreefile for new object
                 if self.has_subclass:
                     new_xmltreefile = xml_utils.XMLTreeFile(
-                        tostring(child, encoding="unicode")
+                        tostring(child, encoding="unicode"), in_memory=True
                     )
                     item = self.marshal_to(
                         child.tag, new_xmltreefile, index, self.libvirtxml
@@ -955,7 +955,7 @@ class XMLElementList(AccessorGeneratorBase):
                 # first create xmltreefile for new object
                 if self.has_subclass:
                     new_xmltreefile = xml_utils.XMLTreeFile(
-                        tostring(child, encoding="unicode")
+                        tostring(child, encoding="unicode"), in_memory=True
                     )
                     item = self.marshal_to(
                         child.tag, new_xmltreefile, index, self.libvirtxml
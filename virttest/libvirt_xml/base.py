@@ -129,8 +129,9 @@ class LibvirtXMLBase(propcan.PropCanBase):
                     del self["xml"]  # clean up old temporary files
             except KeyError:
                 pass  # Allow other exceptions through
-            # value could be filename or a string full of XML
-            self.__dict_set__("xml", xml_utils.XMLTreeFile(value))
+            # value could be filename or a string full of XML, the temporary
+            # files are only created once the filename is needed
+            self.__dict_set__("xml", xml_utils.XMLTreeFile(value, in_memory=True))
 
     def get_xml(self):
         """
@@ -177,9 +178,9 @@ class LibvirtXMLBase(propcan.PropCanBase):
         try:
             # file may not be accessible, obtain XML string value
             xmlstr = str(self.__dict_get__("xml"))
-            # Create fresh/new XMLTreeFile along with tmp files from XML content
-            # content
-            the_copy.__dict_set__("xml", xml_utils.XMLTreeFile(xmlstr))
+            # Create fresh/new XMLTreeFile from XML content, the tmp files
+            # are created when needed
+            the_copy.__dict_set__("xml", xml_utils.XMLTreeFile(xmlstr, in_memory=True))
         except xcepts.LibvirtXMLError:  # Allow other exceptions through
             pass  # no XML was loaded yet
         return the_copy
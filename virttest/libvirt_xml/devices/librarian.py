@@ -45,6 +45,10 @@ DEVICE_TYPES = [
 ]
 
 
+# Handler classes already loaded, by device name
+_HANDLER_CLASSES = {}
+
+
 def get(name):
     """
     Returns named device xml element's handler class
@@ -52,6 +56,10 @@ def get(name):
     :param name: the device name
     :return: the named device xml element's handler class
     """
+    key = str(name).lower()
+    if key in DEVICE_TYPES and key in _HANDLER_CLASSES:
+        return _HANDLER_CLASSES[key]
     mod_path = os.path.abspath(os.path.dirname(__file__))
     handler_cl = base.load_xml_module(mod_path, name, DEVICE_TYPES)
+    _HANDLER_CLASSES[key] = handler_cl
     return handler_cl
@@ -3,6 +3,7 @@ Module simplifying manipulation of XML described at
 http://libvirt.org/formatdomain.html
 """
 
+import copy
 import logging
 import platform
 import re
@@ -16,9 +17,30 @@ from ..libvirt_xml.other.idmap_xml import VMIDMapXML
 LOG = logging.getLogger("avocado." + __name__)
 
 
+class _DeviceElement(object):
+    """
+    Copy of a device element, replaced by its device instance when first
+    accessed in a VMXMLDevices list
+    """
+
+    __slots__ = ("element", "virsh_instance")
+
+    def __init__(self, element, virsh_instance):
+        self.element = copy.deepcopy(element)
+        self.virsh_instance = virsh_instance
+
+    def new_device(self):
+        device_class = librarian.get(self.element.tag)
+        return device_class.new_from_element(
+            self.element, virsh_instance=self.virsh_instance
+        )
+
+
 class VMXMLDevices(list):
     """
     List of device instances from classes handed out by librarian.get()
+
+    Devices listed from a VMXML are only created when accessed.
     """
 
     @staticmethod
@@ -32,6 +54,74 @@ class VMXMLDevices(list):
             # Required to always raise TypeError for list API in VMXML class
             raise TypeError("Unsupported item type: %s" % str(type(other)))
 
+    def __get_device__(self, index):
+        device = super(VMXMLDevices, self).__getitem__(index)
+        if isinstance(device, _DeviceElement):
+            device = device.new_device()
+            super(VMXMLDevices, self).__setitem__(index, device)
+        return device
+
+    def __create_devices__(self):
+        for index in range(len(self)):
+            self.__get_device__(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            for index in range(*key.indices(len(self))):
+                self.__get_device__(index)
+            return super(VMXMLDevices, self).__getitem__(key)
+        return self.__get_device__(key)
+
+    def __iter__(self):
+        # Same as the list iterator, the list may change while iterating
+        index = 0
+        while index < len(self):
+            yield self.__get_device__(index)
+            index += 1
+
+    def __reversed__(self):
+        index = len(self) - 1
+        while index >= 0:
+            if index < len(self):
+                yield self.__get_device__(index)
+            index -= 1
+
+    def __contains__(self, value):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).__contains__(value)
+
+    def __eq__(self, other):
+        self.__create_devices__()
+        if isinstance(other, VMXMLDevices):
+            other.__create_devices__()
+        return super(VMXMLDevices, self).__eq__(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __add__(self, other):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).__add__(list(other))
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        self.__create_devices__()
+        return other + list(self)
+
+    def __mul__(self, count):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).__mul__(count)
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).__repr__()
+
     def __setitem__(self, key, value):
         self.__type_check__(value)
         super(VMXMLDevices, self).__setitem__(key, value)
@@ -48,11 +138,42 @@ class VMXMLDevices(list):
             self.append(item)
         return self
 
+    def copy(self):
+        return list(self)
+
+    def count(self, value):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).count(value)
+
+    def index(self, value, *args):
+        self.__create_devices__()
+        return super(VMXMLDevices, self).index(value, *args)
+
+    def pop(self, index=-1):
+        self.__get_device__(index)
+        return super(VMXMLDevices, self).pop(index)
+
+    def remove(self, value):
+        self.__create_devices__()
+        super(VMXMLDevices, self).remove(value)
+
+    def sort(self, *args, **kwargs):
+        self.__create_devices__()
+        super(VMXMLDevices, self).sort(*args, **kwargs)
+
     def by_device_tag(self, tag):
         result = VMXMLDevices()
-        for device in self:
-            if device.device_tag == tag:
-                result.append(device)
+        # Don't create the devices only to check their tag
+        for index in range(len(self)):
+            device = super(VMXMLDevices, self).__getitem__(index)
+            if isinstance(device, _DeviceElement):
+                device_tag = device.element.tag
+            else:
+                device_tag = device.device_tag
+            if device_tag == tag:
+                # Share the device instance, changes made through the result
+                # are seen in this list
+                super(VMXMLDevices, result).append(self.__get_device__(index))
         return result
 
 
@@ -558,10 +679,9 @@ class VMXMLBase(LibvirtXMLBase):
         else:
             device_nodes = all_devices
         for node in device_nodes:
-            device_tag = node.tag
-            device_class = librarian.get(device_tag)
-            new_one = device_class.new_from_element(node, virsh_instance=self.virsh)
-            devices.append(new_one)
+            # Fail early on unsupported devices, they are created when accessed
+            librarian.get(node.tag)
+            list.append(devices, _DeviceElement(node, self.virsh))
         return devices
 
     def set_devices(self, value):
@@ -10,9 +10,12 @@ import glob
 import logging
 import os
 import re
-import struct
 import time
-from functools import reduce
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 try:
     from PIL import Image, ImageDraw, ImageFont, ImageOps
@@ -104,6 +107,16 @@ def get_data_dir(steps_filename):
 # Functions for working with PPM files
 
 
+def _ppm_array(width, height, data):
+    """
+    Return a read-only numpy view of the pixels of a PPM image.
+
+    :return: (width * height, 3) array of the RGB values, sharing the memory
+             of data
+    """
+    return numpy.frombuffer(data, numpy.uint8, width * height * 3).reshape(-1, 3)
+
+
 def image_read_from_ppm_file(filename):
     """
     Read a PPM image.
@@ -158,11 +171,15 @@ def image_crop(width, height, data, x1, y1, dx, dy):
         dx = width - x1
     if dy > height - y1:
         dy = height - y1
-    newdata = b""
+    if numpy is not None and len(data) >= width * height * 3:
+        rows = _ppm_array(width, height, data).reshape(height, width * 3)
+        return (dx, dy, rows[y1 : y1 + dy, x1 * 3 : (x1 + dx) * 3].tobytes())
     index = (x1 + y1 * width) * 3
-    for _ in range(dy):
-        newdata += data[index : (index + dx * 3)]
-        index += width * 3
+    stride = width * 3
+    newdata = b"".join(
+        data[start : start + dx * 3]
+        for start in range(index, index + dy * stride, stride)
+    )
     return (dx, dy, newdata)
 
 
@@ -237,31 +254,37 @@ def image_comparison(width, height, data1, data2):
 
     :note: Input images must be the same size.
     """
-    newdata = ""
-    i = 0
-    while i < width * height * 3:
-        # Compute monochromatic value of current pixel in data1
-        pixel1_str = data1[i : i + 3]
-        temp = struct.unpack("BBB", pixel1_str)
-        value1 = int((temp[0] + temp[1] + temp[2]) / 3)
-        # Compute monochromatic value of current pixel in data2
-        pixel2_str = data2[i : i + 3]
-        temp = struct.unpack("BBB", pixel2_str)
-        value2 = int((temp[0] + temp[1] + temp[2]) / 3)
-        # Compute average of the two values
-        value = int((value1 + value2) / 2)
-        # Scale value to the upper half of the range [0, 255]
-        value = 128 + value // 2
+    if numpy is not None:
+        pixels1 = _ppm_array(width, height, data1)
+        pixels2 = _ppm_array(width, height, data2)
+        # Monochromatic values of the pixels, their average scaled to the
+        # upper half of the range [0, 255]
+        value1 = pixels1.sum(axis=1, dtype=numpy.uint16) // 3
+        value2 = pixels2.sum(axis=1, dtype=numpy.uint16) // 3
+        value = (128 + (value1 + value2) // 4).astype(numpy.uint8)
+        # Equal pixels get a greenish hue, different ones a reddish hue
+        equal = (pixels1 == pixels2).all(axis=1)
+        newpixels = numpy.zeros_like(pixels1)
+        newpixels[:, 1] = numpy.where(equal, value, 0)
+        newpixels[:, 0] = numpy.where(equal, 0, value)
+        return (width, height, newpixels.tobytes())
+
+    newdata = bytearray(width * height * 3)
+    for i in range(0, width * height * 3, 3):
+        # Compute monochromatic value of current pixel in data1 and data2
+        value1 = (data1[i] + data1[i + 1] + data1[i + 2]) // 3
+        value2 = (data2[i] + data2[i + 1] + data2[i + 2]) // 3
+        # Compute average of the two values and scale it to the upper half
+        # of the range [0, 255]
+        value = 128 + (value1 + value2) // 4
         # Compare pixels
-        if pixel1_str == pixel2_str:
+        if data1[i : i + 3] == data2[i : i + 3]:
             # Equal -- give the pixel a greenish hue
-            newpixel = [0, value, 0]
+            newdata[i + 1] = value
         else:
             # Not equal -- give the pixel a reddish hue
-            newpixel = [value, 0, 0]
-        newdata += struct.pack("BBB", newpixel[0], newpixel[1], newpixel[2])
-        i += 3
-    return (width, height, newdata)
+            newdata[i] = value
+    return (width, height, bytes(newdata))
 
 
 def image_fuzzy_compare(width, height, data1, data2):
@@ -276,19 +299,14 @@ def image_fuzzy_compare(width, height, data1, data2):
 
     :note: Input images must be the same size.
     """
-    equal = 0.0
-    different = 0.0
-    i = 0
-    while i < width * height * 3:
-        pixel1_str = data1[i : i + 3]
-        pixel2_str = data2[i : i + 3]
-        # Compare pixels
-        if pixel1_str == pixel2_str:
-            equal += 1.0
-        else:
-            different += 1.0
-        i += 3
-    return equal / (equal + different)
+    size = width * height * 3
+    if data1[:size] == data2[:size]:
+        return 1.0
+    if numpy is not None:
+        equal = _ppm_array(width, height, data1) == _ppm_array(width, height, data2)
+        return numpy.count_nonzero(equal.all(axis=1)) / (width * height)
+    equal = sum(1 for i in range(0, size, 3) if data1[i : i + 3] == data2[i : i + 3])
+    return equal / (width * height)
 
 
 def image_average_hash(image, img_wd=8, img_ht=8):
@@ -299,18 +317,15 @@ def image_average_hash(image, img_wd=8, img_ht=8):
     """
     if not isinstance(image, Image.Image):
         image = Image.open(image)
-    image = image.resize((img_wd, img_ht), Image.ANTIALIAS).convert("L")
-    avg = reduce(lambda x, y: x + y, image.getdata()) / (img_wd * img_ht)
-
-    def _hta(i):
-        if i < avg:
-            return 0
-        else:
-            return 1
-
-    return reduce(
-        lambda x, y_z: x | (y_z[1] << y_z[0]), enumerate(map(_hta, image.getdata())), 0
-    )
+    image = image.resize((img_wd, img_ht), Image.LANCZOS).convert("L")
+    if numpy is not None:
+        pixels = numpy.asarray(image).ravel()
+        avg = pixels.sum(dtype=numpy.int64) / pixels.size
+        bits = numpy.packbits(pixels >= avg, bitorder="little")
+        return int.from_bytes(bits.tobytes(), "little")
+    pixels = list(image.getdata())
+    avg = sum(pixels) / (img_wd * img_ht)
+    return sum(1 << i for i, pixel in enumerate(pixels) if pixel >= avg)
 
 
 def cal_hamming_distance(h1, h2):
@@ -406,6 +421,13 @@ def image_histogram_compare(image_a, image_b, size=(0, 0)):
         size = tuple(map(max, img_a.size, img_b.size))
     img_a_h = img_a.resize(size).convert("RGB").histogram()
     img_b_h = img_b.resize(size).convert("RGB").histogram()
+    if numpy is not None:
+        hist_a = numpy.array(img_a_h, dtype=numpy.float64)
+        hist_b = numpy.array(img_b_h, dtype=numpy.float64)
+        differ = hist_a != hist_b
+        hist_a, hist_b = hist_a[differ], hist_b[differ]
+        diff = numpy.abs(hist_a - hist_b) / numpy.maximum(hist_a, hist_b)
+        return float(len(img_a_h) - diff.sum()) / len(img_a_h)
     s = 0
     for i, j in list(zip(img_a_h, img_b_h)):
         if i == j:
@@ -106,6 +106,9 @@ class DevContainer(object):
     MIGRATION_MAX_BANDWIDTH_VERSION_SCOPE = "[5.1.0, )"
     MIGRATION_XBZRLE_CACHE_SIZE_VERSION_SCOPE = "[5.1.0, )"
 
+    # Device attributes the inserted devices are indexed by
+    INDEXED_KEYS = ("qid", "id", "drive", "aobject", "type")
+
     def __init__(
         self,
         qemu_binary,
@@ -113,11 +116,14 @@ class DevContainer(object):
         strict_mode="no",
         workaround_qemu_qmp_crash="no",
         allow_hotplugged_vm="yes",
+        probe_cache="yes",
     ):
         """
         :param qemu_binary: qemu binary
         :param vm: related VM
         :param strict_mode: Use strict mode (set optional params)
+        :param probe_cache: Reuse the results of probing qemu_binary
+                            stored on disk (see utils_qemu.load_probe_cache)
         """
 
         def get_hmp_cmds(qemu_binary):
@@ -141,81 +147,121 @@ class DevContainer(object):
             return hmp_cmds
 
         def get_qmp_cmds(qemu_binary, workaround_qemu_qmp_crash=False):
-            """:return: list of qmp commands"""
-            cmds = None
+            """
+            :return: list of qmp commands and dict of the arguments of each
+                     command (see utils_qemu.get_qmp_commands_args())
+            """
+            output = None
             if not workaround_qemu_qmp_crash:
-                cmds = process.run(
+                output = process.run(
                     "echo -e '"
                     '{ "execute": "qmp_capabilities" }\n'
                     '{ "execute": "query-commands", "id": "RAND91" }\n'
+                    '{ "execute": "query-qmp-schema", "id": "RAND92" }\n'
                     '{ "execute": "quit" }\''
                     "| %s -qmp stdio -vnc none -S | grep return |"
-                    " grep RAND91" % qemu_binary,
+                    " grep 'RAND9[12]'" % qemu_binary,
                     timeout=10,
                     ignore_status=True,
                     shell=True,
                     verbose=False,
                 ).stdout_text.splitlines()
-            if not cmds:
+            if not output:
                 # Some qemu versions crashes when qmp used too early; add sleep
-                cmds = process.run(
+                output = process.run(
                     "echo -e '"
                     '{ "execute": "qmp_capabilities" }\n'
                     '{ "execute": "query-commands", "id": "RAND91" }\n'
+                    '{ "execute": "query-qmp-schema", "id": "RAND92" }\n'
                     '{ "execute": "quit" }\' | (sleep 1; cat )'
                     "| %s -qmp stdio -vnc none -S | grep return |"
-                    " grep RAND91" % qemu_binary,
+                    " grep 'RAND9[12]'" % qemu_binary,
                     timeout=10,
                     ignore_status=True,
                     shell=True,
                     verbose=False,
                 ).stdout_text.splitlines()
+            cmds = [line for line in output if "RAND91" in line]
+            schema = [line for line in output if "RAND92" in line]
             if cmds:
                 cmds = re.findall(r'{\s*"name"\s*:\s*"([^"]+)"\s*}', cmds[0])
-            if cmds:
-                return cmds
-            return []
+            cmds_args = utils_qemu.get_qmp_commands_args(schema[0]) if schema else {}
+            return cmds or [], cmds_args
+
+        def get_machine_type_workaround(qemu_binary):
+            """:return: whether the machine type always has to be set"""
+            cmd = (
+                "echo -e 'quit' | %s -monitor stdio -nodefaults -nographic -S"
+                % qemu_binary
+            )
+            result = process.run(
+                cmd, timeout=10, ignore_status=True, shell=True, verbose=False
+            )
+            # Some architectures (arm) require machine type to be always set
+            # and some hardware/firmware restrictions cause we need to set
+            # machine type.
+            failed_pattern = (
+                r"(?:kvm_init_vcpu.*failed)|(?:machine specified)"
+                r"|(?:appending -machine)"
+            )
+            output = result.stdout_text + result.stderr_text
+            return bool(result.exit_status and re.search(failed_pattern, output))
+
+        def probe_qemu(qemu_binary):
+            """:return: dict of all the data probed from the qemu binary"""
+            probe = {}
+            self.__workaround_machine_type = get_machine_type_workaround(qemu_binary)
+            probe["workaround_machine_type"] = self.__workaround_machine_type
+            if self.__workaround_machine_type:
+                basic_qemu_cmd = "%s -machine none" % qemu_binary
+            else:
+                basic_qemu_cmd = qemu_binary
+            probe["qemu_help"] = self.execute_qemu("-help", 10)
+            # escape the '?' otherwise it will fail if we have a single-char
+            # filename in cwd
+            probe["device_help"] = self.execute_qemu(r"-device \? 2>&1", 10)
+            probe["object_help"] = self.execute_qemu(r"-object \? 2>&1", 10)
+            probe["machine_help"] = self.execute_qemu("-machine none,help")
+            probe["machines_info"] = utils_qemu.get_machines_info(qemu_binary)
+            probe["hmp_cmds"] = get_hmp_cmds(basic_qemu_cmd)
+            probe["qmp_cmds"], probe["qmp_cmds_args"] = get_qmp_cmds(
+                basic_qemu_cmd, workaround_qemu_qmp_crash == "always"
+            )
+            probe["qemu_version"] = utils_qemu.get_qemu_version(qemu_binary)[0]
+            return probe
 
         self.__state = -1  # -1 synchronized, 0 synchronized after hotplug
         self.__qemu_binary = qemu_binary
         self.__execute_qemu_last = None
         self.__execute_qemu_out = ""
-        # Check whether we need to add machine_type
-        cmd = (
-            "echo -e 'quit' | %s -monitor stdio -nodefaults -nographic -S" % qemu_binary
-        )
-        result = process.run(
-            cmd, timeout=10, ignore_status=True, shell=True, verbose=False
-        )
-        # Some architectures (arm) require machine type to be always set and some
-        # hardware/firmware restrictions cause we need to set machine type.
-        failed_pattern = (
-            r"(?:kvm_init_vcpu.*failed)|(?:machine specified)"
-            r"|(?:appending -machine)"
-        )
-        output = result.stdout_text + result.stderr_text
-        if result.exit_status and re.search(failed_pattern, output):
-            self.__workaround_machine_type = True
-            basic_qemu_cmd = "%s -machine none" % qemu_binary
-        else:
-            self.__workaround_machine_type = False
-            basic_qemu_cmd = qemu_binary
-        self.__qemu_help = self.execute_qemu("-help", 10)
-        # escape the '?' otherwise it will fail if we have a single-char
-        # filename in cwd
-        self.__device_help = self.execute_qemu(r"-device \? 2>&1", 10)
-        self.__object_help = self.execute_qemu(r"-object \? 2>&1", 10)
-        self.__machines_info = utils_qemu.get_machines_info(qemu_binary)
-        self.__hmp_cmds = get_hmp_cmds(basic_qemu_cmd)
-        self.__qmp_cmds = get_qmp_cmds(
-            basic_qemu_cmd, workaround_qemu_qmp_crash == "always"
-        )
+        # Spawning qemu to probe it is expensive, the results are shared by
+        # all the containers created for the same (unmodified) binary
+        probe = None
+        if probe_cache == "yes":
+            probe = utils_qemu.load_probe_cache(qemu_binary)
+        if probe is None:
+            probe = probe_qemu(qemu_binary)
+            if probe_cache == "yes":
+                utils_qemu.save_probe_cache(qemu_binary, probe)
+        self.__workaround_machine_type = probe["workaround_machine_type"]
+        self.__qemu_help = probe["qemu_help"]
+        self.__device_help = probe["device_help"]
+        self.__object_help = probe["object_help"]
+        self.__machine_help = probe["machine_help"]
+        self.__machines_info = probe["machines_info"]
+        self.__hmp_cmds = probe["hmp_cmds"]
+        self.__qmp_cmds = probe["qmp_cmds"]
+        self.__qmp_cmds_args = probe["qmp_cmds_args"]
+        self.__qemu_ver = probe["qemu_version"]
         self.vmname = vmname
         self.strict_mode = strict_mode == "yes"
         self.__devices = []
         self.__buses = []
+        # Indexes of the inserted devices and buses, see __index_device()
+        self.__aids = {}
+        self.__index = dict((key, {}) for key in self.INDEXED_KEYS)
+        self.__buses_by_aobject = {}
         self.allow_hotplugged_vm = allow_hotplugged_vm == "yes"
-        self.__qemu_ver = utils_qemu.get_qemu_version(self.__qemu_binary)[0]
         self.caps = Capabilities()
         self.mig_params = Capabilities()
         self._probe_capabilities()
@@ -224,6 +270,10 @@ class DevContainer(object):
         self.__iothread_supported_devices = set()
         self.__iothread_vq_mapping_supported_devices = set()
         self.temporary_image_snapshots = set()
+        # Digest of the VM inputs this representation was built from and the
+        # params updated by the build, see qemu_vm.VM.make_create_command()
+        self.params_digest = None
+        self.params_updates = {}
 
     @property
     def qemu_version(self):
@@ -424,8 +474,7 @@ class DevContainer(object):
         if self.has_option("incoming defer"):
             self.caps.set_flag(Flags.INCOMING_DEFER)
         # -machine memory-backend
-        machine_help = self.execute_qemu("-machine none,help")
-        if re.search(r"memory-backend=", machine_help, re.MULTILINE):
+        if re.search(r"memory-backend=", self.__machine_help, re.MULTILINE):
             self.caps.set_flag(Flags.MACHINE_MEMORY_BACKEND)
         # -object sev-guest
         if self.has_object("sev-guest"):
@@ -444,9 +493,11 @@ class DevContainer(object):
             self.caps.set_flag(Flags.FLOPPY_DEVICE)
 
         # QMP: block-stream/block-commit @backing-mask-protocol
-        # TODO: probe cap via using the qmp command `query-qmp-schema`
-        #       instead of hard-coding the version range
-        if self.__qemu_ver in VersionInterval(
+        # (fall back to the version range if the schema was not available)
+        if self.__qmp_cmds_args:
+            if "backing-mask-protocol" in self.__qmp_cmds_args.get("block-commit", []):
+                self.caps.set_flag(Flags.BLOCKJOB_BACKING_MASK_PROTOCOL)
+        elif self.__qemu_ver in VersionInterval(
             self.BLOCKJOB_BACKING_MASK_PROTOCOL_VERSION_SCOPE
         ):
             self.caps.set_flag(Flags.BLOCKJOB_BACKING_MASK_PROTOCOL)
@@ -468,6 +519,151 @@ class DevContainer(object):
             if self.__qemu_ver in VersionInterval(ver_scope):
                 self.mig_params.set_flag(mig_param)
 
+    @staticmethod
+    def __get_index_keys(device):
+        """
+        :param device: qdevices.QBaseDevice device
+        :return: dict of the values the device is indexed by
+        """
+        keys = {
+            "qid": device.get_qid(),
+            "id": device.params.get("id"),
+            "aobject": device.aobject,
+            "type": device.type,
+        }
+        if isinstance(device, qdevices.QDevice):
+            keys["drive"] = device.params.get("drive")
+        # Only index hashable values, other lookups fall back to a scan
+        for key, value in list(keys.items()):
+            try:
+                hash(value)
+            except TypeError:
+                del keys[key]
+        return keys
+
+    def __index_device(self, device):
+        """
+        Index an inserted device by its aid and by its INDEXED_KEYS values.
+
+        The device calls _reindex_device() when its params or aid change so
+        the indexes follow the values set after its insertion.
+        """
+        keys = self.__get_index_keys(device)
+        self.__aids[device.get_aid()] = (device, keys)
+        for key, value in six.iteritems(keys):
+            self.__index[key].setdefault(value, []).append(device)
+        device.index_hooks += (self._reindex_device,)
+
+    def __unindex_device(self, device):
+        """Remove a device from the indexes"""
+        aid = self.__find_aid(device)
+        if aid is None:
+            return
+        keys = self.__aids.pop(aid)[1]
+        for key, value in six.iteritems(keys):
+            self.__unindex_value(device, key, value)
+        device.index_hooks = tuple(
+            hook for hook in device.index_hooks if hook.__self__ is not self
+        )
+
+    def __unindex_value(self, device, key, value):
+        """Remove a device from the devices indexed by the value of key"""
+        devices = self.__index[key][value]
+        for i, dev in enumerate(devices):
+            if dev is device:
+                del devices[i]
+                break
+        if not devices:
+            del self.__index[key][value]
+
+    def __find_aid(self, device):
+        """:return: The aid this very device object is indexed by or None"""
+        aid = device.get_aid()
+        entry = self.__aids.get(aid)
+        if entry is not None and entry[0] is device:
+            return aid
+        # The aid was changed after the insertion
+        for aid, entry in six.iteritems(self.__aids):
+            if entry[0] is device:
+                return aid
+        return None
+
+    def _reindex_device(self, device):
+        """
+        Update the indexes after a change of the params or aid of a device.
+
+        :param device: inserted device, see qdevices.QBaseDevice.index_hooks
+        """
+        aid = self.__find_aid(device)
+        if aid is None:
+            return
+        old_keys = self.__aids[aid][1]
+        keys = self.__get_index_keys(device)
+        if aid == device.get_aid() and keys == old_keys:
+            return
+        del self.__aids[aid]
+        self.__aids[device.get_aid()] = (device, keys)
+        order = None
+        for key in self.INDEXED_KEYS:
+            if (key in old_keys) == (key in keys) and (
+                old_keys.get(key) == keys.get(key)
+            ):
+                continue
+            if key in old_keys:
+                self.__unindex_value(device, key, old_keys[key])
+            if key not in keys:
+                continue
+            devices = self.__index[key].setdefault(keys[key], [])
+            devices.append(device)
+            if len(devices) > 1:
+                # Keep the insertion order of the devices
+                if order is None:
+                    order = dict((id(dev), i) for i, dev in enumerate(self.__devices))
+                devices.sort(key=lambda dev: order[id(dev)])
+
+    def __indexed(self, key, value):
+        """
+        :return: devices indexed by the value of key (in insertion order) or
+                 None when the value can't be indexed
+        """
+        try:
+            return self.__index[key].get(value, [])
+        except TypeError:
+            return None
+
+    def __is_inserted(self, device):
+        """:return: Is this very device object inserted?"""
+        entry = self.__aids.get(device.get_aid())
+        return entry is not None and entry[0] is device
+
+    def __remove_device(self, device):
+        """Remove device (or the first equal device) from the devices list"""
+        for i, dev in enumerate(self.__devices):
+            if dev is device:
+                del self.__devices[i]
+                break
+        else:
+            if device not in self.__devices:
+                return
+            device = self.__devices.pop(self.__devices.index(device))
+        self.__unindex_device(device)
+
+    def __add_bus(self, bus):
+        """Register a child bus, the latest buses come first"""
+        self.__buses.insert(0, bus)
+        self.__buses_by_aobject.setdefault(bus.aobject, []).insert(0, bus)
+
+    def __remove_bus(self, bus):
+        """Unregister a child bus"""
+        self.__buses.remove(bus)
+        buses = self.__buses_by_aobject.get(bus.aobject, [])
+        for i, _bus in enumerate(buses):
+            if _bus is bus:
+                del buses[i]
+                break
+        if not buses:
+            self.__buses_by_aobject.pop(bus.aobject, None)
+
     def __getitem__(self, item):
         """
         :param item: autotest id or QObject-like object
@@ -475,12 +671,10 @@ class DevContainer(object):
         :raise KeyError: In case no match was found
         """
         if isinstance(item, qdevices.QBaseDevice):
-            if item in self.__devices:
+            if self.__is_inserted(item) or item in self.__devices:
                 return item
-        elif item:
-            for device in self.__devices:
-                if device.get_aid() == item:
-                    return device
+        elif item and item in self.__aids:
+            return self.__aids[item][0]
         raise KeyError("Device %s is not in %s" % (item, self))
 
     def get(self, item):
@@ -497,8 +691,16 @@ class DevContainer(object):
         :param filt: filter {'property': 'value', ...}
         :type filt: dict
         """
+        devices = None
+        for key in ("aobject", "type"):
+            if key in filt:
+                devices = self.__indexed(key, filt[key])
+                if devices is not None:
+                    break
+        if devices is None:
+            devices = self.__devices
         out = []
-        for device in self.__devices:
+        for device in devices:
             for key, value in six.iteritems(filt):
                 if not hasattr(device, key):
                     break
@@ -514,8 +716,13 @@ class DevContainer(object):
         :param filt: filter {'param': 'value', ...}
         :type filt: dict
         """
+        devices = None
+        if "id" in filt:
+            devices = self.__indexed("id", filt["id"])
+        if devices is None:
+            devices = self.__devices
         out = []
-        for device in self.__devices:
+        for device in devices:
             for key, value in six.iteritems(filt):
                 if key not in device.params:
                     break
@@ -554,12 +761,12 @@ class DevContainer(object):
                 # One child might be already removed from other child's bus
                 if dev in self:
                     self.remove(dev, True)
-        if device in self.__devices:  # It might be removed from child bus
+        if device in self:  # It might be removed from child bus
             for bus in self.__buses:  # Remove from parent_buses
                 bus.remove(device)
             for bus in device.child_bus:  # Remove child buses from vm buses
-                self.__buses.remove(bus)
-            self.__devices.remove(device)  # Remove from list of devices
+                self.__remove_bus(bus)
+            self.__remove_device(device)  # Remove from list of devices
 
         if isinstance(device, qdevices.QIOThread):
             self.__iothread_manager.release_iothread(device)
@@ -580,10 +787,9 @@ class DevContainer(object):
                     self.remove(dev, True)
             # remove child_buses from self.__buses
             if bus in self.__buses:
-                self.__buses.remove(bus)
+                self.__remove_bus(bus)
         # remove device from self.__devices
-        if device in self.__devices:
-            self.__devices.remove(device)
+        self.__remove_device(device)
 
     def __len__(self):
         """:return: Number of inserted devices"""
@@ -596,12 +802,9 @@ class DevContainer(object):
         :return: True - yes, False - no
         """
         if isinstance(item, qdevices.QBaseDevice):
-            if item in self.__devices:
-                return True
+            return self.__is_inserted(item) or item in self.__devices
         elif item:
-            for device in self.__devices:
-                if device.get_aid() == item:
-                    return True
+            return item in self.__aids
         return False
 
     def __iter__(self):
@@ -628,12 +831,17 @@ class DevContainer(object):
             if key in (
                 "_DevContainer__devices",
                 "_DevContainer__buses",
+                "_DevContainer__aids",
+                "_DevContainer__index",
+                "_DevContainer__buses_by_aobject",
                 "_DevContainer__state",
                 "caps",
                 "allow_hotplugged_vm",
                 "_DevContainer__iothread_manager",
                 "_DevContainer__iothread_supported_devices",
                 "temporary_image_snapshots",
+                "params_digest",
+                "params_updates",
                 "mig_params",
             ):
                 continue
@@ -679,7 +887,8 @@ class DevContainer(object):
         """
         ret = []
         if qid:
-            for device in self:
+            devices = self.__indexed("qid", qid)
+            for device in self if devices is None else devices:
                 if device.get_qid() == qid:
                     ret.append(device)
         return ret
@@ -693,7 +902,8 @@ class DevContainer(object):
         :return: the qdev ID
         :rtype: str
         """
-        for dev in self.__devices:
+        devices = self.__indexed("drive", device)
+        for dev in self.__devices if devices is None else devices:
             try:
                 if isinstance(dev, qdevices.QDevice) and device == dev.params["drive"]:
                     return dev.params["id"]
@@ -805,6 +1015,15 @@ class DevContainer(object):
         """
         return cmd in self.__qmp_cmds
 
+    def has_qmp_cmd_arg(self, cmd, arg):
+        """
+        :param cmd: Desired command
+        :param arg: Desired argument of the command
+        :return: Does this qemu's QMP command accept the argument (according
+                 to query-qmp-schema)?
+        """
+        return arg in self.__qmp_cmds_args.get(cmd, [])
+
     def execute_qemu(self, options, timeout=5):
         """
         Execute this qemu and return the stdout+stderr output.
@@ -836,8 +1055,15 @@ class DevContainer(object):
         :return: All matching buses
         :rtype: List of QSparseBus
         """
+        candidates = self.__buses
+        aobject = bus_spec.get("aobject")
+        # A type match is enough with type_test, otherwise aobject has to match
+        if isinstance(aobject, six.string_types) and not (
+            type_test and bus_spec.get("type")
+        ):
+            candidates = self.__buses_by_aobject.get(aobject, [])
         buses = []
-        for bus in self.__buses:
+        for bus in candidates:
             if bus.match_bus(bus_spec, type_test):
                 buses.append(bus)
         return buses
@@ -956,7 +1182,7 @@ class DevContainer(object):
             raise DeviceInsertError(device, err, self)
         # 3
         for bus in device.child_bus:
-            self.__buses.insert(0, bus)
+            self.__add_bus(bus)
         # 4
         if device.get_qid() and self.get_by_qid(device.get_qid()):
             err = "Devices qid %s already used in VM\n" % device.get_qid()
@@ -964,6 +1190,7 @@ class DevContainer(object):
             raise DeviceInsertError(device, err, self)
         device.set_aid(self.__create_unique_aid(device.get_qid()))
         self.__devices.append(device)
+        self.__index_device(device)
         added_devices.append(device)
         return added_devices
 
@@ -68,6 +68,10 @@ def _build_cmd(cmd, args=None, q_id=None):
 class QBaseDevice(object):
     """Base class of qemu objects"""
 
+    # Called with the device when its params or aid change, used by the
+    # containers to keep their indexes up to date
+    index_hooks = ()
+
     def __init__(
         self,
         dev_type="QBaseDevice",
@@ -154,6 +158,8 @@ class QBaseDevice(object):
             del self.params[option]
             if option in self.dynamic_params:
                 self.dynamic_params.remove(option)
+        for hook in self.index_hooks:
+            hook(self)
 
     def get_param(self, option, default=None):
         """:return: object param"""
@@ -166,6 +172,8 @@ class QBaseDevice(object):
     def __delitem__(self, option):
         """deletes self.params[option]"""
         del self.params[option]
+        for hook in self.index_hooks:
+            hook(self)
 
     def __len__(self):
         """length of self.params"""
@@ -254,6 +262,8 @@ class QBaseDevice(object):
     def set_aid(self, aid):
         """:param aid: new autotest id for this device"""
         self.aid = aid
+        for hook in self.index_hooks:
+            hook(self)
 
     def get_children(self):
         """:return: List of all children (recursive)"""
@@ -2736,14 +2746,10 @@ class QSparseBus(object):
         :param device: QBaseDevice device
         :return: True when removed, False when the device wasn't found
         """
-        if device in six.itervalues(self.bus):
-            remove = None
-            for key, item in six.iteritems(self.bus):
-                if item is device:
-                    remove = key
-                    break
-            if remove is not None:
-                del self.bus[remove]
+        # Only the very same object is removed, no need to compare devices
+        for key, item in six.iteritems(self.bus):
+            if item is device:
+                del self.bus[key]
                 return True
         return False
 
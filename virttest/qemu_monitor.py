@@ -7,6 +7,7 @@ Interfaces to the QEMU monitor.
 from __future__ import division
 
 import array
+import collections
 import json
 import logging
 import os
@@ -15,6 +16,7 @@ import selectors
 import socket
 import threading
 import time
+import weakref
 
 import six
 
@@ -123,6 +125,38 @@ class QMPEventError(MonitorError):
         )
 
 
+def _qmp_reader(monitor_ref, sock):
+    """
+    Body of the QMPMonitor reader thread.
+
+    Only a weak reference to the monitor is kept so it still gets garbage
+    collected, which closes the socket and ends the thread.
+
+    :param monitor_ref: weakref.ref to the QMPMonitor
+    :param sock: socket of the monitor
+    """
+    chunks = []
+    while True:
+        try:
+            data = sock.recv(65536)
+        except (socket.error, ValueError):
+            data = b""
+        monitor = monitor_ref()
+        if monitor is None:
+            return
+        if not data:
+            monitor._reader_closed()
+            return
+        chunks.append(data)
+        if b"\n" in data:
+            # Every byte is joined once more at most, when its line is done
+            lines = b"".join(chunks).split(b"\n")
+            tail = lines.pop()
+            chunks = [tail] if tail else []
+            monitor._process_lines(lines)
+        del monitor
+
+
 def get_monitor_filename(vm, monitor_name):
     """
     Return the filename corresponding to a given monitor name.
@@ -388,14 +422,9 @@ class Monitor(object):
         self._socket.close()
 
     def _acquire_lock(self, timeout=ACQUIRE_LOCK_TIMEOUT, lock=None):
-        end_time = time.time() + timeout
         if not lock:
             lock = self._lock
-        while time.time() < end_time:
-            if lock.acquire(False):
-                return True
-            time.sleep(0.05)
-        return False
+        return lock.acquire(timeout=max(timeout, 0))
 
     def _data_available(self, timeout=DATA_AVAILABLE_TIMEOUT):
         if self._server_closed:
@@ -414,17 +443,17 @@ class Monitor(object):
 
         return s type: bytes
         """
-        s = b""
+        chunks = []
         while self._data_available():
             try:
-                data = self._socket.recv(1024)
+                data = self._socket.recv(65536)
             except socket.error as e:
                 raise MonitorSocketError("Could not receive data from monitor", e)
             if not data:
                 self._server_closed = True
                 break
-            s += data
-        return s
+            chunks.append(data)
+        return b"".join(chunks)
 
     def _has_command(self, cmd):
         """
@@ -1773,6 +1802,90 @@ class HumanMonitor(Monitor):
         return self.cmd(netdev_cmd)
 
 
+class QMPEventStore(object):
+    """
+    Asynchronous QMP events, indexed by event name.
+
+    The store keeps the events in arrival order and in one queue per event
+    name, so looking for an event only goes through the events of that name.
+    At most max_events events are retained, the oldest ones are dropped
+    first.  The store is not locked by itself, the monitor accesses it with
+    its condition held (see QMPMonitor._reader_cond).
+    """
+
+    MAX_EVENTS = 10000
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self._events = collections.deque()
+        self._index = {}
+        self._subscribers = {}
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        """
+        Store an event.
+
+        :param event: The event object (a dict with an "event" key)
+        :return: The callbacks subscribed to this event, the caller runs
+                 them once it released the lock protecting the store
+        """
+        name = event.get("event")
+        self._events.append(event)
+        self._index.setdefault(name, collections.deque()).append(event)
+        while len(self._events) > self.max_events:
+            oldest = self._events.popleft()
+            self._index[oldest.get("event")].popleft()
+        return self._subscribers.get(name, []) + self._subscribers.get(None, [])
+
+    def get_all(self):
+        """
+        :return: A list of all the retained events, in arrival order
+        """
+        return list(self._events)
+
+    def find(self, name, predicate=None):
+        """
+        Look for the first event with the given name.
+
+        :param name: The name of the event to look for (e.g. 'RESET')
+        :param predicate: If given, a callable taking the event and returning
+                          whether it matches
+        :return: An event object or None if none is found
+        """
+        for event in self._index.get(name, ()):
+            if predicate is None or predicate(event):
+                return event
+        return None
+
+    def clear(self, name=None):
+        """
+        Drop the events with the given name, or all the events if no name is
+        given.
+        """
+        if name is None:
+            self._events.clear()
+            self._index.clear()
+        elif self._index.pop(name, None):
+            self._events = collections.deque(
+                e for e in self._events if e.get("event") != name
+            )
+
+    def subscribe(self, name, callback):
+        """
+        Call callback(event) for every new event with the given name (or for
+        every event if name is None).
+        """
+        self._subscribers.setdefault(name, []).append(callback)
+
+    def unsubscribe(self, name, callback):
+        callbacks = self._subscribers.get(name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+
 class QMPMonitor(Monitor):
     """
     Wraps QMP monitor commands.
@@ -1806,8 +1919,16 @@ class QMPMonitor(Monitor):
 
             self.protocol = "qmp"
             self._greeting = None
-            self._events = []
+            max_events = monitor_params.get(
+                "monitor_max_events", QMPEventStore.MAX_EVENTS
+            )
+            self._events = QMPEventStore(int(max_events))
             self._supported_hmp_cmds = []
+            # Guards the data filled by the reader thread (see _start_reader)
+            self._reader_cond = threading.Condition()
+            self._reader = None
+            if monitor_params.get("monitor_reader_thread") == "yes":
+                self._start_reader()
 
             # Make sure json is available
             try:
@@ -1818,22 +1939,30 @@ class QMPMonitor(Monitor):
                 )
 
             # Read greeting message
-            end_time = time.time() + 20
-            output_str = ""
-            while time.time() < end_time:
-                for obj in self._read_objects():
-                    output_str += str(obj)
-                    if "QMP" in obj:
-                        self._greeting = obj
-                        break
-                if self._greeting:
-                    break
-                time.sleep(0.1)
+            if self._reader:
+                with self._reader_cond:
+                    self._reader_cond.wait_for(
+                        lambda: self._greeting or self._server_closed, 20
+                    )
+                if not self._greeting:
+                    raise MonitorProtocolError("No QMP greeting message received.")
             else:
-                raise MonitorProtocolError(
-                    "No QMP greeting message received."
-                    " Output so far: %s" % output_str
-                )
+                end_time = time.time() + 20
+                output_str = ""
+                while time.time() < end_time:
+                    for obj in self._read_objects():
+                        output_str += str(obj)
+                        if "QMP" in obj:
+                            self._greeting = obj
+                            break
+                    if self._greeting:
+                        break
+                    time.sleep(0.1)
+                else:
+                    raise MonitorProtocolError(
+                        "No QMP greeting message received."
+                        " Output so far: %s" % output_str
+                    )
 
             # Issue qmp_capabilities
             self.cmd("qmp_capabilities")
@@ -1848,6 +1977,97 @@ class QMPMonitor(Monitor):
                 raise
 
     # Private methods
+    def _start_reader(self):
+        """
+        Start a thread reading everything qemu sends to the monitor.
+
+        The thread parses the lines as they arrive and files the responses
+        by id and the events in self._events, the callers then wait on
+        self._reader_cond instead of polling the socket.
+        """
+        self._responses = {}
+        self._socket.settimeout(None)
+        self._reader = threading.Thread(
+            target=_qmp_reader,
+            args=(weakref.ref(self), self._socket),
+            name="qmp-reader-%s.%s" % (self.vm.name, self.name),
+        )
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _close_sock(self):
+        super(QMPMonitor, self)._close_sock()
+        reader = getattr(self, "_reader", None)
+        if reader and reader is not threading.current_thread():
+            reader.join(1)
+
+    def _process_lines(self, lines):
+        """
+        Decode the lines received by the reader thread and file the objects.
+
+        :param lines: Complete lines received from the monitor
+        :type lines: list[bytes]
+        """
+        objs = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                objs.append(json.loads(line))
+            except ValueError:
+                LOG.warning(
+                    "(monitor %s.%s) Dropping undecodable data: %r",
+                    self.vm.name,
+                    self.name,
+                    line,
+                )
+                continue
+            self._log_lines(line.decode(errors="replace"))
+        objs = [obj for obj in objs if isinstance(obj, dict)]
+        # File the events first, a command may wait for them once it got
+        # its response
+        self._file_events([obj for obj in objs if "event" in obj])
+        with self._reader_cond:
+            for obj in objs:
+                if "QMP" in obj:
+                    self._greeting = obj
+                elif "return" in obj or "error" in obj:
+                    self._responses[obj.get("id")] = obj
+            self._reader_cond.notify_all()
+
+    def _file_events(self, events):
+        """
+        Store the received events and run the callbacks subscribed to them.
+
+        :param events: The event objects, in arrival order
+        """
+        if not events:
+            return
+        callbacks = []
+        with self._reader_cond:
+            for event in events:
+                callbacks += [(cb, event) for cb in self._events.add(event)]
+            self._reader_cond.notify_all()
+        for callback, event in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                LOG.warning(
+                    "(monitor %s.%s) Callback for event %s failed: %s",
+                    self.vm.name,
+                    self.name,
+                    event.get("event"),
+                    e,
+                )
+
+    def _reader_closed(self):
+        """
+        Called by the reader thread when the connection is gone.
+        """
+        with self._reader_cond:
+            self._server_closed = True
+            self._reader_cond.notify_all()
+
     def _build_cmd(self, cmd, args=None, q_id=None):
         obj = {"execute": cmd}
         if args is not None:
@@ -1866,33 +2086,32 @@ class QMPMonitor(Monitor):
         :param timeout: Time to wait for all lines to decode successfully
         :return: A list of objects
         """
+        if self._reader:
+            # The reader thread does the job, only drop the responses nobody
+            # waited for (the callers hold the lock, no command is pending)
+            with self._reader_cond:
+                self._responses.clear()
+            return []
         if not self._data_available():
             return []
-        s = b""
+        chunks = []
         end_time = time.time() + timeout
         while self._data_available(end_time - time.time()):
-            s += self._recvall()
-            # Make sure all lines are decodable
-            for line in s.splitlines():
-                if line:
-                    try:
-                        json.loads(line)
-                    except Exception:
-                        # Found an incomplete or broken line -- keep reading
-                        break
-            else:
-                # All lines are OK -- stop reading
+            chunks.append(self._recvall())
+            # QMP ends every message with a newline, keep reading until the
+            # data ends with a complete line
+            if chunks[-1].endswith(b"\n"):
                 break
         # Decode all decodable lines
         objs = []
-        for line in s.splitlines():
+        for line in b"".join(chunks).splitlines():
             try:
                 objs += [json.loads(line)]
                 self._log_lines(line.decode(errors="replace"))
             except Exception:
                 pass
         # Keep track of asynchronous events
-        self._events += [obj for obj in objs if "event" in obj]
+        self._file_events([obj for obj in objs if "event" in obj])
         return objs
 
     def _send(self, data, fds=None):
@@ -1927,6 +2146,20 @@ class QMPMonitor(Monitor):
         :param timeout: Time duration to wait for response
         :return: The response dict, or None if none was found
         """
+        if self._reader:
+            with self._reader_cond:
+                if q_id is None:
+                    # Any response will do, take the first one received
+                    self._reader_cond.wait_for(
+                        lambda: self._responses or self._server_closed, timeout
+                    )
+                    q_id = next(iter(self._responses), None)
+                else:
+                    self._reader_cond.wait_for(
+                        lambda: q_id in self._responses or self._server_closed,
+                        timeout,
+                    )
+                return self._responses.pop(q_id, None)
         end_time = time.time() + timeout
         while self._data_available(end_time - time.time()):
             for obj in self._read_objects():
@@ -1936,6 +2169,41 @@ class QMPMonitor(Monitor):
                     if "return" in obj or "error" in obj:
                         return obj
 
+    def _get_responses(self, q_ids, timeout=RESPONSE_TIMEOUT):
+        """
+        Read the responses to several commands from the QMP monitor.
+
+        :param q_ids: The ids of the commands
+        :param timeout: Time duration to wait for all the responses
+        :return: A dict mapping the ids to their response dict, ids without
+                 response are missing
+        """
+        if self._reader:
+            with self._reader_cond:
+                self._reader_cond.wait_for(
+                    lambda: (
+                        all(q_id in self._responses for q_id in q_ids)
+                        or self._server_closed
+                    ),
+                    timeout,
+                )
+                return dict(
+                    (q_id, self._responses.pop(q_id))
+                    for q_id in q_ids
+                    if q_id in self._responses
+                )
+        responses = {}
+        pending = set(q_ids)
+        end_time = time.time() + timeout
+        while pending and self._data_available(end_time - time.time()):
+            for obj in self._read_objects():
+                if not isinstance(obj, dict) or obj.get("id") not in pending:
+                    continue
+                if "return" in obj or "error" in obj:
+                    responses[obj["id"]] = obj
+                    pending.discard(obj["id"])
+        return responses
+
     def _get_supported_cmds(self):
         """
         Get supported qmp cmds list.
@@ -2095,6 +2363,92 @@ class QMPMonitor(Monitor):
         finally:
             self._lock.release()
 
+    def cmd_batch(self, cmds, timeout=CMD_TIMEOUT, debug=True, transaction=False):
+        """
+        Send several QMP monitor commands at once and return their responses.
+
+        The commands are written in one go, each with its own id, then all
+        the responses are collected, so the whole batch costs a single round
+        trip.  QEMU runs the commands in order and a failing command does not
+        stop the following ones.
+
+        :param cmds: List of commands, each one either a command name or a
+                     (command, args) tuple
+        :param timeout: Time duration to wait for all the responses
+        :param debug: Whether to print the commands being sent and responses
+        :param transaction: Send the commands as the actions of a single
+                            'transaction' command, so that they are applied
+                            atomically.  Only the commands supported by
+                            'transaction' can be used this way.
+        :return: The list of the values returned by the commands (with
+                 transaction=True, the value returned by the transaction for
+                 each command)
+
+        :raise MonitorLockError: Raised if the lock cannot be acquired
+        :raise MonitorSocketError: Raised if a socket error occurs
+        :raise MonitorProtocolError: Raised if a response is missing
+        :raise QMPCmdError: Raised for the first command whose response is an
+                            error message, once all the responses are read
+        """
+        cmds = [(c, None) if isinstance(c, six.string_types) else c for c in cmds]
+        if transaction:
+            self.verify_supported_cmd("transaction")
+            actions = [{"type": c, "data": args or {}} for c, args in cmds]
+            ret = self.cmd("transaction", {"actions": actions}, timeout, debug)
+            return [ret] * len(cmds)
+        if not cmds:
+            return []
+        for cmd, _ in cmds:
+            self._log_command(cmd, debug)
+        if not self._acquire_lock():
+            raise MonitorLockError(
+                "Could not acquire exclusive lock to send "
+                "QMP commands %s" % [c for c, _ in cmds]
+            )
+
+        try:
+            # Read any data that might be available
+            self._read_objects()
+            # Send all the commands in a single write
+            q_ids = []
+            msgs = []
+            for cmd, args in cmds:
+                q_id = utils_misc.generate_random_string(8)
+                while q_id in q_ids:
+                    q_id = utils_misc.generate_random_string(8)
+                cmdobj = json.dumps(self._build_cmd(cmd, args, q_id))
+                if debug:
+                    LOG.debug("Send command: %s" % cmdobj)
+                q_ids.append(q_id)
+                msgs.append(cmdobj.encode())
+            self._send(b"\n".join(msgs))
+            # Read responses
+            responses = self._get_responses(q_ids, timeout)
+        finally:
+            self._lock.release()
+
+        rets = []
+        error = None
+        for (cmd, args), q_id in zip(cmds, q_ids):
+            r = responses.get(q_id)
+            if r is None:
+                raise MonitorProtocolError(
+                    "Received no response to QMP "
+                    "command '%s', or received a "
+                    "response with an incorrect id" % cmd
+                )
+            if "error" in r:
+                error = error or QMPCmdError(cmd, args, r["error"])
+                rets.append(None)
+                continue
+            ret = r["return"]
+            if ret:
+                self._log_response(cmd, ret, debug)
+            rets.append(ret)
+        if error:
+            raise error
+        return rets
+
     def cmd_raw(self, data, timeout=CMD_TIMEOUT):
         """
         Send a raw string to the QMP monitor and return the response.
@@ -2214,20 +2568,86 @@ class QMPMonitor(Monitor):
             )
         try:
             self._read_objects()
-            return self._events[:]
+            with self._reader_cond:
+                return self._events.get_all()
         finally:
             self._lock.release()
 
-    def get_event(self, name):
+    def get_event(self, name, predicate=None):
         """
         Look for an event with the given name in the list of events.
 
         :param name: The name of the event to look for (e.g. 'RESET')
+        :param predicate: If given, a callable taking the event and returning
+                          whether it is the one looked for
         :return: An event object or None if none is found
+        :raise MonitorLockError: Raised if the lock cannot be acquired
+        """
+        if not self._acquire_lock():
+            raise MonitorLockError(
+                "Could not acquire exclusive lock to read " "QMP events"
+            )
+        try:
+            self._read_objects()
+            with self._reader_cond:
+                return self._events.find(name, predicate)
+        finally:
+            self._lock.release()
+
+    def wait_for_event(self, name, predicate=None, timeout=RESPONSE_TIMEOUT):
         """
-        for e in self.get_events():
-            if e.get("event") == name:
-                return e
+        Wait until an event with the given name is received.
+
+        Events received before the call (and not cleared yet) are taken into
+        account too, so clear_event() should be called before triggering the
+        event.
+
+        :param name: The name of the event to wait for (e.g. 'RESET')
+        :param predicate: If given, a callable taking the event and returning
+                          whether it is the one waited for
+        :param timeout: Time duration to wait for the event
+        :return: The event object or None if it was not received in time
+        :raise MonitorLockError: Raised if the lock cannot be acquired
+        """
+        if self._reader:
+            with self._reader_cond:
+                self._reader_cond.wait_for(
+                    lambda: (
+                        self._events.find(name, predicate) is not None
+                        or self._server_closed
+                    ),
+                    timeout,
+                )
+                return self._events.find(name, predicate)
+        end_time = time.time() + timeout
+        while True:
+            event = self.get_event(name, predicate)
+            remaining = end_time - time.time()
+            if event is not None or remaining <= 0 or self._server_closed:
+                return event
+            # Sleep until qemu sends something instead of polling
+            self._data_available(min(remaining, 1.0))
+
+    def subscribe_event(self, name, callback):
+        """
+        Call callback(event) whenever an event with the given name arrives.
+
+        The callback runs in the thread reading the monitor (the reader
+        thread, or the thread issuing commands), so it must be quick and it
+        must not send monitor commands itself.
+
+        :param name: The name of the event (e.g. 'RESET'), None for all events
+        :param callback: Callable taking the event object
+        """
+        with self._reader_cond:
+            self._events.subscribe(name, callback)
+
+    def unsubscribe_event(self, name, callback):
+        """
+        Stop calling a callback registered with subscribe_event().
+        """
+        with self._reader_cond:
+            self._events.unsubscribe(name, callback)
 
     def human_monitor_cmd(self, cmd="", timeout=CMD_TIMEOUT, debug=True, fd=None):
         """
@@ -2259,7 +2679,8 @@ class QMPMonitor(Monitor):
             raise MonitorLockError(
                 "Could not acquire exclusive lock to clear " "QMP event list"
             )
-        self._events = []
+        with self._reader_cond:
+            self._events.clear()
         self._lock.release()
 
     def clear_event(self, name):
@@ -2272,12 +2693,9 @@ class QMPMonitor(Monitor):
             raise MonitorLockError(
                 "Could not acquire exclusive lock to clear " "QMP event list"
             )
-        while True:
-            event = self.get_event(name)
-            if event:
-                self._events.remove(event)
-            else:
-                break
+        self._read_objects()
+        with self._reader_cond:
+            self._events.clear(name)
         self._lock.release()
 
     def get_greeting(self):
@@ -2408,7 +2826,7 @@ class QMPMonitor(Monitor):
         self.verify_supported_cmd(cmd)
         self.clear_event(event)
         ret = self.cmd(cmd=cmd)
-        if not utils_misc.wait_for(lambda: self.get_event(event), timeout=120):
+        if not self.wait_for_event(event, timeout=120):
             raise QMPEventError(cmd, event, self.vm.name, self.name)
         return ret
 
@@ -2807,7 +3225,7 @@ class QMPMonitor(Monitor):
         # Send a system_wakeup monitor command
         self.cmd(cmd)
         # Look for WAKEUP QMP event
-        if not utils_misc.wait_for(lambda: self.get_event(qmp_event), 120):
+        if not self.wait_for_event(qmp_event, timeout=120):
             raise QMPEventError(cmd, qmp_event, self.vm.name, self.name)
         LOG.info("%s QMP event received" % qmp_event)
 
@@ -3053,7 +3471,7 @@ class QMPMonitor(Monitor):
         # Send a balloon monitor command
         self.send_args_cmd("%s value=%s" % (cmd, size))
         # Look for BALLOON QMP events
-        if not utils_misc.wait_for(lambda: self.get_event(qmp_event), 120):
+        if not self.wait_for_event(qmp_event, timeout=120):
             raise QMPEventError(cmd, qmp_event, self.vm.name, self.name)
         LOG.info("%s QMP event received" % qmp_event)
 
@@ -3232,7 +3650,7 @@ class QMPMonitor(Monitor):
         # Send a powerdown monitor command
         self.cmd(cmd)
         # Look for POWERDOWN QMP events
-        if not utils_misc.wait_for(lambda: self.get_event(qmp_event), 120):
+        if not self.wait_for_event(qmp_event, timeout=120):
             raise QMPEventError(cmd, qmp_event, self.vm.name, self.name)
         LOG.info("%s QMP event received" % qmp_event)
 
@@ -598,8 +598,9 @@ class QemuImg(storage.QemuImg):
             )
         storage.QemuImg.__init__(self, params, root_dir, tag)
         self.image_cmd = utils_misc.get_qemu_img_binary(params)
+        self.probe_cache = params.get("qemu_probe_cache", "yes") == "yes"
         qemu_bin = utils_misc.get_qemu_binary(params)
-        self.qemu_ver = utils_qemu.get_qemu_version(qemu_bin)[0]
+        self.qemu_ver = utils_qemu.get_qemu_version(qemu_bin, self.probe_cache)[0]
         self._cmd_formatter = _ParameterAssembler(self.qemu_img_parameters)
 
     def _parse_options(self, params):
@@ -849,7 +850,16 @@ class QemuImg(storage.QemuImg):
         :rtype: str
         :note: Returns stdout even if the command fails, allowing callers to handle
                parsing and error detection as needed
+        :note: The help texts of the successful commands are kept in the
+               probe cache of the qemu-img binary, shared by all the
+               instances and test processes
         """
+        help_texts = {}
+        if self.probe_cache:
+            help_texts = utils_qemu.load_probe_cache(self.image_cmd, "img_help") or {}
+            if cmd in help_texts:
+                return help_texts[cmd]
+
         cmd_help = f"{self.image_cmd} {cmd} -h"
 
         result = process.run(
@@ -859,6 +869,10 @@ class QemuImg(storage.QemuImg):
             verbose=False,
         )
 
+        if self.probe_cache and result.exit_status == 0 and result.stdout_text:
+            help_texts = dict(help_texts)
+            help_texts[cmd] = result.stdout_text
+            utils_qemu.save_probe_cache(self.image_cmd, help_texts, "img_help")
         return result.stdout_text
 
     def _get_cmd_cap_force_share(self, cmd):
@@ -8,6 +8,7 @@ from __future__ import division
 
 import ast
 import fcntl
+import hashlib
 import json
 import logging
 import math
@@ -463,6 +464,31 @@ class VM(virt_vm.BaseVM):
             except OSError:
                 pass
 
+    def _create_command_digest(self, name, params, root_dir):
+        """
+        :return: digest of the inputs of make_create_command(): its
+                 arguments, the VM state it reads and the qemu binary
+        """
+        qemu_binary = utils_misc.get_qemu_binary(params)
+        try:
+            st = os.stat(qemu_binary)
+            binary_id = (qemu_binary, st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            binary_id = qemu_binary
+        state = (
+            name,
+            root_dir,
+            sorted((key, repr(value)) for key, value in six.iteritems(params)),
+            self.instance,
+            self.vnc_port,
+            sorted(self.redirs.items()),
+            self.uuid,
+            getattr(self, "pa_pci_ids", None),
+            [sorted(dict(nic).items()) for nic in self.virtnet],
+            binary_id,
+        )
+        return hashlib.sha256(repr(state).encode()).hexdigest()
+
     def make_create_command(self, name=None, params=None, root_dir=None):
         """
         Generate a qemu command line. All parameters are optional. If a
@@ -500,6 +526,56 @@ class VM(virt_vm.BaseVM):
                NIC (e.g. e1000)
         """
 
+        # If nothing changed and devices exists, return immediately
+        if (
+            name is None
+            and params is None
+            and root_dir is None
+            and self.devices is not None
+        ):
+            return self.devices, self.spice_options
+
+        if name is None:
+            name = self.name
+        if params is None:
+            params = self.params
+        if root_dir is None:
+            root_dir = self.root_dir
+
+        # The build updates params (the VM clone it does sets
+        # driver_type_<name>, the monitor filenames...), it works on a copy
+        # and its updates are applied to params once it is done.  The
+        # representation of the running VM was built from the same inputs
+        # and was not modified since (hotplug), building it again would give
+        # the same result (see needs_restart): only the updates are applied.
+        build_params = params.copy()
+        build_params["driver_type_" + name] = self.driver_type
+        digest = self._create_command_digest(name, build_params, root_dir)
+        if (
+            self.devices is not None
+            and getattr(self.devices, "params_digest", None) == digest
+            and self.devices.get_state() == -1
+        ):
+            params.update(self.devices.params_updates)
+            return self.devices, self.spice_options
+
+        devices, spice_options = self._make_create_command(name, build_params, root_dir)
+        devices.params_digest = digest
+        devices.params_updates = dict(
+            (key, value)
+            for key, value in six.iteritems(build_params)
+            if key not in params or params[key] != value
+        )
+        # Also for the params it's reused with
+        devices.params_updates["driver_type_" + name] = self.driver_type
+        params.update(devices.params_updates)
+        return devices, spice_options
+
+    def _make_create_command(self, name, params, root_dir):
+        """
+        Build the devices representation of the VM, see make_create_command()
+        """
+
         # Helper function for command line option wrappers
         def _add_option(option, value, option_type=None, first=False):
             """
@@ -605,7 +681,10 @@ class VM(virt_vm.BaseVM):
             monitor_id = "qmp_id_%s" % monitor_name
             if backend == "tcp_socket":
                 host = chardev_params.get("chardev_host", "127.0.0.1")
-                port = str(utils_misc.find_free_ports(5000, 6000, 1, host)[0])
+                port = utils_misc.find_free_ports(
+                    5000, 6000, 1, host, reserve=reserve_ports
+                )
+                port = str(port[0])
                 chardev_params["chardev_host"] = host
                 chardev_params["chardev_port"] = port
                 params["chardev_host_%s" % monitor_name] = host
@@ -1257,7 +1336,8 @@ class VM(virt_vm.BaseVM):
             if optget("spice_port") == "generate":
                 # FIXME: This makes the "needs_restart" to always re-create the
                 # machine.
-                s_port = str(utils_misc.find_free_port(*port_range))
+                s_port = utils_misc.find_free_port(*port_range, reserve=reserve_ports)
+                s_port = str(s_port)
                 spice_options["spice_port"] = s_port
                 spice_opts.append("port=%s" % s_port)
             # spice_port = no: spice_port value is not present on qemu cmdline
@@ -1291,7 +1371,10 @@ class VM(virt_vm.BaseVM):
             if optget("spice_ssl") == "yes":
                 # SSL only part
                 if optget("spice_tls_port") == "generate":
-                    t_port = str(utils_misc.find_free_port(*tls_port_range))
+                    t_port = utils_misc.find_free_port(
+                        *tls_port_range, reserve=reserve_ports
+                    )
+                    t_port = str(t_port)
                     spice_options["spice_tls_port"] = t_port
                     spice_opts.append("tls-port=%s" % t_port)
                 # spice_tls_port = no: spice_port value is not present on qemu
@@ -1757,24 +1840,9 @@ class VM(virt_vm.BaseVM):
 
         # End of command line option wrappers
 
-        # If nothing changed and devices exists, return immediately
-        if (
-            name is None
-            and params is None
-            and root_dir is None
-            and self.devices is not None
-        ):
-            return self.devices, self.spice_options
-
-        if name is None:
-            name = self.name
-        if params is None:
-            params = self.params
-        if root_dir is None:
-            root_dir = self.root_dir
-
         pci_bus = {"aobject": params.get("pci_bus", "pci.0")}
         spice_options = {}
+        reserve_ports = params.get("reserve_ports") == "yes"
 
         # init value by default.
         # PCI addr 0,1,2 are taken by PCI/ISA/IDE bridge and the GPU.
@@ -1842,6 +1910,7 @@ class VM(virt_vm.BaseVM):
             params.get("strict_mode"),
             params.get("workaround_qemu_qmp_crash"),
             params.get("allow_hotplugged_vm"),
+            params.get("qemu_probe_cache", "yes"),
         )
         StrDev = qdevices.QStringDevice
         QDevice = qdevices.QDevice
@@ -2460,7 +2529,9 @@ class VM(virt_vm.BaseVM):
         if serials:
             self.serial_session_device = serials[0]
             host = params.get("chardev_host", "127.0.0.1")
-            free_ports = utils_misc.find_free_ports(5000, 5899, len(serials), host)
+            free_ports = utils_misc.find_free_ports(
+                5000, 5899, len(serials), host, reserve=reserve_ports
+            )
             reg_count = 0
         for index, serial in enumerate(serials):
             serial_params = params.object_params(serial)
@@ -3545,6 +3616,7 @@ class VM(virt_vm.BaseVM):
         name = self.name
         params = self.params
         root_dir = self.root_dir
+        reserve_ports = params.get("reserve_ports") == "yes"
         pass_fds = []
         if migration_fd:
             pass_fds.append(int(migration_fd))
@@ -3609,7 +3681,9 @@ class VM(virt_vm.BaseVM):
         try:
             # Handle port redirections
             redir_names = params.objects("redirs")
-            host_ports = utils_misc.find_free_ports(5000, 5899, len(redir_names))
+            host_ports = utils_misc.find_free_ports(
+                5000, 5899, len(redir_names), reserve=reserve_ports
+            )
 
             old_redirs = {}
             if self.redirs:
@@ -3742,7 +3816,9 @@ class VM(virt_vm.BaseVM):
 
             # Find available VNC port, if needed
             if params.get("display") == "vnc":
-                self.vnc_port = utils_misc.find_free_port(5900, 6900, sequent=True)
+                self.vnc_port = utils_misc.find_free_port(
+                    5900, 6900, sequent=True, reserve=reserve_ports
+                )
 
             # Find random UUID if specified 'uuid = random' in config file
             if params.get("uuid") == "random":
@@ -3796,7 +3872,9 @@ class VM(virt_vm.BaseVM):
 
             # Add migration parameters if required
             if migration_mode in ["tcp", "rdma", "x-rdma"]:
-                self.migration_port = utils_misc.find_free_port(5200, 5899)
+                self.migration_port = utils_misc.find_free_port(
+                    5200, 5899, reserve=reserve_ports
+                )
                 incoming_val = (
                     " -incoming " + migration_mode + ":0:%d" % self.migration_port
                 )
@@ -3815,7 +3893,9 @@ class VM(virt_vm.BaseVM):
                 qemu_command += incoming_val
             elif migration_mode == "exec":
                 if migration_exec_cmd is None:
-                    self.migration_port = utils_misc.find_free_port(5200, 5899)
+                    self.migration_port = utils_misc.find_free_port(
+                        5200, 5899, reserve=reserve_ports
+                    )
                     # check whether ip version supported by nc
                     if (
                         process.system(
@@ -4494,6 +4574,7 @@ class VM(virt_vm.BaseVM):
                 self.params.get("strict_mode"),
                 self.params.get("workaround_qemu_qmp_crash"),
                 self.params.get("allow_hotplugged_vm"),
+                self.params.get("qemu_probe_cache", "yes"),
             )
             if devices.has_device("pcie-pci-bridge"):
                 bridge_type = "pcie-pci-bridge"
@@ -5602,7 +5683,7 @@ class VM(virt_vm.BaseVM):
                 in this loop until a timeout and error is raised.
             """
             try:
-                return bool(self.monitor.get_event("RESET"))
+                return bool(self.monitor.wait_for_event("RESET", timeout=1))
             except (qemu_monitor.MonitorSocketError, AttributeError):
                 LOG.warning(
                     "MonitorSocketError while querying for RESET QMP "
@@ -10,6 +10,7 @@ from __future__ import division
 
 import collections
 import errno
+import fcntl
 import functools
 import json
 import logging
@@ -882,6 +883,87 @@ def copy_nfs_image(params, root_dir, basename=False):
                 )
 
 
+# ioctl cloning a whole file on filesystems sharing extents (XFS, Btrfs)
+FICLONE = 0x40049409
+
+
+def _reflink_file(src, dst):
+    """Make dst a copy on write clone of src, raise OSError if unsupported."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_file_sparse(src, dst):
+    """
+    Copy the data segments of src to dst in the kernel, keeping the holes.
+
+    :raise OSError: if copy_file_range() is not supported for the files
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fin, fout = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(fin).st_size
+        offset = 0
+        while offset < size:
+            try:
+                start = os.lseek(fin, offset, os.SEEK_DATA)
+                end = os.lseek(fin, start, os.SEEK_HOLE)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # Only a hole is left
+                    break
+                if e.errno != errno.EINVAL:
+                    raise
+                # Holes are not reported by this filesystem
+                start, end = offset, size
+            while start < end:
+                copied = os.copy_file_range(
+                    fin, fout, end - start, offset_src=start, offset_dst=start
+                )
+                if not copied:
+                    break
+                start += copied
+            offset = end
+        fdst.truncate(size)
+
+
+def copy_image_file(src, dst, method="auto"):
+    """
+    Copy an image file.
+
+    :param src: Source file.
+    :param dst: Destination file, overwritten.
+    :param method: 'reflink' to clone the file (XFS, Btrfs), 'copy' to copy
+            it in the kernel keeping it sparse, 'auto' to try a reflink,
+            then a sparse copy and then a regular copy.
+    :raise ValueError: if the method is unknown.
+    :raise OSError: if the forced method is not supported.
+    """
+    if method not in ("auto", "reflink", "copy"):
+        raise ValueError("Unknown image copy method '%s'" % method)
+    if method == "copy" and not hasattr(os, "copy_file_range"):
+        raise OSError(
+            errno.ENOTSUP, "copy_file_range() is not available to copy %s" % src
+        )
+    copy_funcs = []
+    if method in ("auto", "reflink"):
+        copy_funcs.append(("reflink", _reflink_file))
+    if method in ("auto", "copy") and hasattr(os, "copy_file_range"):
+        copy_funcs.append(("copy", _copy_file_sparse))
+    for name, copy_func in copy_funcs:
+        try:
+            copy_func(src, dst)
+        except OSError as e:
+            LOG.debug("Can not %s %s: %s", name, src, e)
+            if os.path.exists(dst):
+                os.unlink(dst)
+            if method != "auto":
+                raise
+            continue
+        shutil.copymode(src, dst)
+        return
+    shutil.copy(src, dst)
+
+
 class OptionMissing(Exception):
     """
     Option not found in the odbject
@@ -1049,14 +1131,22 @@ class QemuImg(object):
         if not os.path.isabs(backup_dir):
             backup_dir = os.path.join(root_dir, backup_dir)
         backup_set = get_backup_set(self.image_filename, backup_dir, action, good)
+        method = self.get_backup_method(params)
+        overlay = False
         if self.is_remote_image():
             backup_func = self.copy_data_remote
         elif params.get("image_raw_device") == "yes":
             backup_func = self.copy_data_raw
+        elif method == "overlay" and good:
+            # Nothing is copied, no need to check the free disk space
+            overlay = True
+            backup_func = self.overlay_data_file
         else:
-            backup_func = self.copy_data_file
+            if method == "overlay":
+                method = "auto"
+            backup_func = functools.partial(self.copy_data_file, method=method)
 
-        if action == "backup":
+        if action == "backup" and not overlay:
             backup_size = 0
             for src, dst in backup_set:
                 if os.path.isfile(src):
@@ -1116,6 +1206,17 @@ class QemuImg(object):
         image_name = os.path.join(
             backup_dir, "%s.backup" % os.path.basename(self.image_filename)
         )
+        if self.get_backup_method(self.params) == "overlay" and (
+            self.get_overlay_base(self.image_filename) == image_name
+        ):
+            # The backup is the base of the image, merge them back
+            LOG.debug("Committing image file %s to %s", self.image_filename, image_name)
+            process.system(
+                "%s commit %s"
+                % (utils_misc.get_qemu_img_binary(self.params), self.image_filename)
+            )
+            os.rename(image_name, self.image_filename)
+            return
         LOG.debug("Removing image file %s as requested", image_name)
         if os.path.exists(image_name):
             os.unlink(image_name)
@@ -1134,7 +1235,10 @@ class QemuImg(object):
         src = self.image_filename
         if root_dir is None:
             root_dir = os.path.dirname(src)
-        backup_func = self.copy_data_file
+        method = self.get_backup_method(params)
+        if method == "overlay":
+            method = "auto"
+        backup_func = functools.partial(self.copy_data_file, method=method)
         if self.is_remote_image():
             backup_func = self.copy_data_remote
         elif params.get("image_raw_device") == "yes":
@@ -1187,16 +1291,84 @@ class QemuImg(object):
             LOG.info("No source %s, skipping dd...", src)
 
     @staticmethod
-    def copy_data_file(src, dst):
-        """Copy for files."""
+    def copy_data_file(src, dst, method="auto"):
+        """Copy for files, see copy_image_file() for the methods."""
         if os.path.isfile(src):
-            LOG.debug("Copying %s -> %s", src, dst)
+            LOG.debug("Copying %s -> %s (%s)", src, dst, method)
             _dst = dst + ".part"
-            shutil.copy(src, _dst)
+            copy_image_file(src, _dst, method)
             os.rename(_dst, dst)
         else:
             LOG.info("No source file %s, skipping copy...", src)
 
+    def get_backup_method(self, params):
+        """
+        Return how the image is backed up: 'auto', 'reflink', 'copy' or
+        'overlay' (params image_backup_method).
+
+        'overlay' is only used for qcow2 files without encryption nor
+        external data file, 'auto' is used instead otherwise.
+        """
+        method = params.get("image_backup_method", "auto")
+        if method == "overlay" and (
+            self.image_format != "qcow2"
+            or self.encryption_config.key_secret
+            or self.data_file
+        ):
+            LOG.debug("Can not back %s up with an overlay", self.image_filename)
+            method = "auto"
+        return method
+
+    def get_overlay_base(self, filename):
+        """
+        :return: Absolute path of the backing file of a qcow2 image file, None
+                 if it has none or can not be read.
+        """
+        if not os.path.isfile(filename):
+            return None
+        result = process.run(
+            "%s info -U --output=json %s"
+            % (utils_misc.get_qemu_img_binary(self.params), filename),
+            ignore_status=True,
+            verbose=False,
+        )
+        if result.exit_status:
+            return None
+        info = json.loads(result.stdout_text)
+        return info.get("full-backing-filename")
+
+    def overlay_data_file(self, src, dst):
+        """
+        Back a qcow2 file up or restore it, using an overlay.
+
+        Backing up moves the image to the backup and replaces it with a
+        qcow2 overlay on top of the backup, restoring discards the overlay
+        and creates a new one, without copying any data.
+        """
+        qemu_img = utils_misc.get_qemu_img_binary(self.params)
+        if src == self.image_filename:
+            if not os.path.isfile(src):
+                LOG.info("No source file %s, skipping backup...", src)
+                return
+            if self.get_overlay_base(src) == dst:
+                LOG.debug("Committing %s to its base %s", src, dst)
+                process.system("%s commit %s" % (qemu_img, src))
+                return
+            LOG.debug("Moving %s -> %s", src, dst)
+            os.rename(src, dst)
+            base, image = dst, src
+        else:
+            if not os.path.isfile(src):
+                LOG.info("No source file %s, skipping restore...", src)
+                return
+            base, image = src, dst
+        LOG.debug("Creating overlay %s on top of %s", image, base)
+        _image = image + ".part"
+        process.system(
+            "%s create -f qcow2 -b %s -F qcow2 %s" % (qemu_img, base, _image)
+        )
+        os.rename(_image, image)
+
     @staticmethod
     def clone_image(params, vm_name, image_name, root_dir):
         """
@@ -787,7 +787,10 @@ class UnattendedInstallConfig(object):
 
             if self.unattended_server_port is None:
                 self.unattended_server_port = utils_misc.find_free_port(
-                    8000, 8099, self.url_auto_content_ip
+                    8000,
+                    8099,
+                    self.url_auto_content_ip,
+                    reserve=self.params.get("reserve_ports") == "yes",
                 )
 
             start_unattended_server_thread(self.unattended_server_port, self.tmpdir)
@@ -847,7 +850,10 @@ class UnattendedInstallConfig(object):
             elif self.params.get("unattended_delivery_method") == "url":
                 if self.unattended_server_port is None:
                     self.unattended_server_port = utils_misc.find_free_port(
-                        8000, 8099, self.url_auto_content_ip
+                        8000,
+                        8099,
+                        self.url_auto_content_ip,
+                        reserve=self.params.get("reserve_ports") == "yes",
                     )
                 path = os.path.join(os.path.dirname(self.cdrom_unattended), "ks")
                 boot_disk = RemoteInstall(
@@ -1007,7 +1013,10 @@ class UnattendedInstallConfig(object):
                 LOG.debug("starting unattended content web server")
 
                 self.url_auto_content_port = utils_misc.find_free_port(
-                    8100, 8199, self.url_auto_content_ip
+                    8100,
+                    8199,
+                    self.url_auto_content_ip,
+                    reserve=self.params.get("reserve_ports") == "yes",
                 )
 
                 start_auto_content_server_thread(
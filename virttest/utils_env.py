@@ -1,4 +1,5 @@
 import functools
+import io
 import logging
 import os
 import threading
@@ -19,6 +20,25 @@ from virttest import ip_sniffing, virt_vm
 
 ENV_VERSION = 1
 
+# Env files made of separately pickled entries start with this tag
+_ENV_FORMAT = "avocado-vt-env-entries"
+# Values pickled by value in every entry referencing them, the instances of
+# other classes are pickled once and referenced by the other entries
+_NOT_SHARED = (
+    type(None),
+    bool,
+    int,
+    float,
+    complex,
+    str,
+    bytes,
+    tuple,
+    frozenset,
+    list,
+    dict,
+    set,
+)
+
 LOG = logging.getLogger("avocado." + __name__)
 
 
@@ -30,6 +50,141 @@ class EnvSaveError(Exception):
     pass
 
 
+class _NotLoaded(object):
+    """Placeholder of the env entries not unpickled yet."""
+
+    def __repr__(self):
+        return "<not loaded>"
+
+
+_NOT_LOADED = _NotLoaded()
+
+
+def _load_entry(key):
+    """Stands for the env entries referenced by another entry."""
+    raise cPickle.UnpicklingError("Env entry %s referenced out of the env" % key)
+
+
+class _EntryPickler(cPickle.Pickler):
+    """
+    Pickle an env entry, referencing the other entries by their keys so
+    that the objects shared between them (like the address cache of the
+    VMs) are still shared once unpickled.
+    """
+
+    def __init__(self, file, entry, shared):
+        cPickle.Pickler.__init__(self, file, protocol=cPickle.HIGHEST_PROTOCOL)
+        self._entry = entry
+        self._shared = shared
+
+    def reducer_override(self, obj):
+        # Not called for the builtin containers and scalars, unlike
+        # persistent_id(), which would slow the pickling down a lot
+        if obj is not self._entry:
+            key = self._shared.get(id(obj))
+            if key is not None:
+                return _load_entry, (key,)
+        return NotImplemented
+
+
+class _EntryUnpickler(cPickle.Unpickler):
+    """Unpickle an env entry, loading the entries it references."""
+
+    def __init__(self, file, data):
+        cPickle.Unpickler.__init__(self, file)
+        self._data = data
+
+    def find_class(self, module, name):
+        if module == __name__ and name == "_load_entry":
+            return self._data.__getitem__
+        return cPickle.Unpickler.find_class(self, module, name)
+
+
+class _EnvData(dict):
+    """
+    Env data loaded from a file, unpickling every entry on first access.
+
+    The pickled entries not accessed yet are saved back as they were.
+    """
+
+    def __init__(self, pickled):
+        dict.__init__(self, dict.fromkeys(pickled, _NOT_LOADED))
+        self._pickled = pickled
+        self._loading = set()
+        self._lock = threading.RLock()
+
+    def get_pickled(self, key):
+        """Return the entry as it was pickled in the env file."""
+        return self._pickled[key]
+
+    def _load(self, key):
+        with self._lock:
+            value = dict.__getitem__(self, key)
+            if value is not _NOT_LOADED:
+                return value
+            if key in self._loading:
+                raise cPickle.UnpicklingError("Circular reference to %s" % key)
+            self._loading.add(key)
+            try:
+                value = _EntryUnpickler(io.BytesIO(self._pickled[key]), self).load()
+            # Almost any exception can be raised during unpickling, drop the
+            # entry the way a broken env file is dropped
+            except Exception as details:
+                LOG.warning("Exception thrown while loading env entry %s", key)
+                LOG.warning(details)
+                dict.pop(self, key, None)
+                raise KeyError(key)
+            finally:
+                self._loading.discard(key)
+            dict.__setitem__(self, key, value)
+            return value
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if value is _NOT_LOADED:
+            value = self._load(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            dict.__setitem__(self, key, default)
+            return default
+
+    def pop(self, key, *default):
+        try:
+            self[key]
+        except KeyError:
+            pass
+        return dict.pop(self, key, *default)
+
+    def items(self):
+        return [(key, value) for key, value in self._loaded()]
+
+    def values(self):
+        return [value for _, value in self._loaded()]
+
+    def copy(self):
+        return dict(self._loaded())
+
+    def _loaded(self):
+        for key in list(self):
+            try:
+                yield key, self[key]
+            except KeyError:
+                pass
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
 def lock_safe(function):
     """
     Get the environment safe lock, run the function, then release the lock.
@@ -74,6 +229,8 @@ class Env(IterableUserDict):
                 if os.path.isfile(filename):
                     with open(filename, "rb") as f:
                         env = cPickle.load(f)
+                    if isinstance(env, tuple) and env[0] == _ENV_FORMAT:
+                        env = _EnvData(env[1])
                     if env.get("version", 0) >= version:
                         self.data = env
                     else:
@@ -98,27 +255,71 @@ class Env(IterableUserDict):
         """
         Pickle the contents of the Env object into a file.
 
+        Every entry is pickled separately, the entries loaded from the env
+        file and not accessed since are written back as they were.  The file
+        is replaced atomically, so that it is never left half written.
+
         :param filename: Filename to pickle the dict into.  If not supplied,
                 use the filename from which the dict was loaded.
         """
         filename = filename or self._filename
         if filename is None:
             raise EnvSaveError("No filename specified for this env file")
-        with self.save_lock, open(filename, "wb") as f:
-            cPickle.dump(self.data, f, protocol=0)
+        with self.save_lock:
+            entries = self._pickle_entries()
+            temp_filename = "%s.%d.%d.tmp" % (
+                filename,
+                os.getpid(),
+                threading.get_ident(),
+            )
+            try:
+                with open(temp_filename, "wb") as f:
+                    cPickle.dump(
+                        (_ENV_FORMAT, entries), f, protocol=cPickle.HIGHEST_PROTOCOL
+                    )
+                os.rename(temp_filename, filename)
+            except Exception:
+                if os.path.exists(temp_filename):
+                    os.unlink(temp_filename)
+                raise
+
+    def _pickle_entries(self):
+        """
+        Pickle every entry of the Env object.
+
+        :return: dict of the pickled entries by key
+        """
+        loaded = {}
+        entries = {}
+        for key, value in list(dict.items(self.data)):
+            if value is _NOT_LOADED:
+                entries[key] = self.data.get_pickled(key)
+            else:
+                loaded[key] = value
+        shared = dict(
+            (id(value), key)
+            for key, value in loaded.items()
+            if not isinstance(value, _NOT_SHARED)
+        )
+        for key, value in loaded.items():
+            f = io.BytesIO()
+            _EntryPickler(f, value, shared).dump(value)
+            entries[key] = f.getvalue()
+        return entries
 
     def get_all_vms(self):
         """
         Return a list of all VM objects in this Env object.
         """
-        return [v for k, v in self.data.items() if k and k.startswith("vm__")]
+        vms = [self.data.get(k) for k in list(self.data) if k and k.startswith("vm__")]
+        return [vm for vm in vms if vm is not None]
 
     def clean_objects(self):
         """
         Destroy all objects registered in this Env object.
         """
         self.stop_ip_sniffing()
-        for key in self.data:
+        for key in list(self.data):
             try:
                 if key.startswith("vm__"):
                     self.data[key].destroy(gracefully=False)
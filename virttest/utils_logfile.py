@@ -9,6 +9,7 @@ Naive module that keeps tacks of some opened files and somehow manages them.
 """
 
 import logging
+import multiprocessing.util
 import os
 import re
 import threading
@@ -24,11 +25,17 @@ from virttest import data_dir
 LOG = logging.getLogger("avocado." + __name__)
 
 _log_file_dir = data_dir.get_tmp_dir()
+# Protects _open_log_files, every log file has its own lock
 _log_lock = threading.RLock()
 
-# File descriptor dictionary for all open log files
+# _LogFile dictionary for all open log files, by base name
 _open_log_files = {}  # pylint: disable=C0103
 
+# Lines are written at once when 0, see set_flush_policy()
+_flush_interval = 0.0
+_flush_size = 64 * 1024
+_flusher = None
+
 
 def _acquire_lock(lock, timeout=30):
     """
@@ -52,6 +59,121 @@ class LogLockError(Exception):
     pass
 
 
+class _LogFile(object):
+    """
+    An open log file, buffering the lines written to it.
+
+    The buffer is written when it exceeds the flush size, by the flusher
+    thread every flush interval, when the file is flushed or closed, or at
+    once when the flush interval is 0.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = open(path, "a")
+        self.buffer = []
+        self.size = 0
+
+    def write(self, data):
+        """
+        :return: False if the file was closed meanwhile, True otherwise
+        :raise LogLockError: If the lock of the file is unavailable
+        """
+        if not _acquire_lock(self.lock):
+            raise LogLockError("Could not acquire exclusive lock to %s" % self.path)
+        try:
+            if self.fd is None:
+                return False
+            self.buffer.append(data)
+            self.size += len(data)
+            if _flush_interval <= 0 or self.size >= _flush_size:
+                self._flush()
+            return True
+        finally:
+            self.lock.release()
+
+    def _flush(self):
+        if self.buffer:
+            self.fd.write("".join(self.buffer))
+            self.buffer = []
+            self.size = 0
+        self.fd.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.fd is not None:
+                self._flush()
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                try:
+                    self._flush()
+                finally:
+                    self.fd.close()
+                    self.fd = None
+
+
+def _get_log_files(filename):
+    """Return the open log files with the base name of filename, or all."""
+    if not _acquire_lock(_log_lock):
+        raise LogLockError(
+            "Could not acquire exclusive lock to access" " _open_log_files"
+        )
+    try:
+        return [
+            log_file
+            for base_file, log_file in list(_open_log_files.items())
+            if filename == "*" or base_file == os.path.basename(filename)
+        ]
+    finally:
+        _log_lock.release()
+
+
+def _flush_log_files():
+    """Flusher thread body, flush the open log files every flush interval."""
+    while _flush_interval > 0:
+        time.sleep(_flush_interval)
+        try:
+            flush_log_file()
+        except Exception as details:  # pylint: disable=W0703
+            LOG.debug("Could not flush the log files: %s", details)
+
+
+def set_flush_policy(interval, size=64 * 1024):
+    """
+    Set how the lines written by log_line() are flushed to the log files.
+
+    :param interval: Maximum time (in seconds) the lines are buffered before
+                     being written, 0 to write every line at once
+    :param size: Maximum size (in bytes) of the buffered lines of a file
+    """
+    global _flush_interval, _flush_size, _flusher
+    _flush_interval = float(interval)
+    _flush_size = int(size)
+    if _flush_interval > 0:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_log_files, name="LogFileFlusher", daemon=True
+            )
+            _flusher.start()
+    else:
+        flush_log_file()
+
+
+def flush_log_file(filename="*"):
+    """
+    Write the buffered lines of log files with the same base name as
+    filename or all by default.
+
+    :param filename: Log file name
+    :raise: LogLockError if the lock is unavailable
+    """
+    for log_file in _get_log_files(filename):
+        log_file.flush()
+
+
 def log_line(filename, line):
     """
     Write a line to a file.
@@ -63,31 +185,32 @@ def log_line(filename, line):
     """
     global _open_log_files, _log_file_dir, _log_lock
 
-    if not _acquire_lock(_log_lock):
-        raise LogLockError(
-            "Could not acquire exclusive lock to access" " _open_log_files"
-        )
     log_file = get_log_filename(filename)
     base_file = os.path.basename(log_file)
+    timestr = time.strftime("%Y-%m-%d %H:%M:%S")
     try:
-        if base_file not in _open_log_files:
-            # First, let's close the log files opened in old directories
-            close_log_file(base_file)
-            # Then, let's open the new file
-            try:
-                os.makedirs(os.path.dirname(log_file))
-            except OSError:
-                pass
-            _open_log_files[base_file] = open(log_file, "a")
-        timestr = time.strftime("%Y-%m-%d %H:%M:%S")
+        line = string_safe_encode(line)
+    except UnicodeDecodeError:
+        line = line.decode("utf-8", "ignore").encode("utf-8")
+    data = "%s: %s\n" % (timestr, line)
+    while True:
+        if not _acquire_lock(_log_lock):
+            raise LogLockError(
+                "Could not acquire exclusive lock to access" " _open_log_files"
+            )
         try:
-            line = string_safe_encode(line)
-        except UnicodeDecodeError:
-            line = line.decode("utf-8", "ignore").encode("utf-8")
-        _open_log_files[base_file].write("%s: %s\n" % (timestr, line))
-        _open_log_files[base_file].flush()
-    finally:
-        _log_lock.release()
+            if base_file not in _open_log_files:
+                try:
+                    os.makedirs(os.path.dirname(log_file))
+                except OSError:
+                    pass
+                _open_log_files[base_file] = _LogFile(log_file)
+            open_log_file = _open_log_files[base_file]
+        finally:
+            _log_lock.release()
+        # Written out of the global lock, retried if closed meanwhile
+        if open_log_file.write(data):
+            break
 
 
 def get_match_count(file_path, key_message, encoding="ISO-8859-1"):
@@ -100,6 +223,7 @@ def get_match_count(file_path, key_message, encoding="ISO-8859-1"):
     :return count: the count of key message
     """
     count = 0
+    flush_log_file(file_path)
     try:
         with open(file_path, "r", encoding=encoding) as fp:
             for line in fp.readlines():
@@ -161,18 +285,15 @@ def close_log_file(filename="*"):
             "Could not acquire exclusive lock to access" " _open_log_files"
         )
     try:
-        for log_file, log_fd in _open_log_files.items():
+        for log_file in list(_open_log_files.keys()):
             if filename == "*" or os.path.basename(log_file) == os.path.basename(
                 filename
             ):
-                log_fd.close()
-                remove.append(log_file)
-        if remove:
-            for key_to_remove in remove:
-                _open_log_files.pop(key_to_remove)
-
+                remove.append(_open_log_files.pop(log_file))
     finally:
         _log_lock.release()
+    for log_fd in remove:
+        log_fd.close()
 
 
 def close_own_log_file(log_file):
@@ -215,3 +336,19 @@ def clear_log_file(log_file_name, log_dir=None):
             open(log_file, "w").close()
     finally:
         _log_lock.release()
+
+
+def _register_exit_flush(*args):
+    """
+    Flush the buffered lines when the process exits.
+
+    The tests run in multiprocessing children which leave with os._exit(),
+    skipping atexit. Their multiprocessing finalizers still run, but the
+    ones inherited by forked children are dropped, so this is registered
+    again after every fork.
+    """
+    multiprocessing.util.Finalize(None, flush_log_file, exitpriority=0)
+
+
+_register_exit_flush()
+multiprocessing.util.register_after_fork(flush_log_file, _register_exit_flush)
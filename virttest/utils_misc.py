@@ -10,6 +10,7 @@ import ctypes
 import fcntl
 import getpass
 import inspect
+import json
 import logging
 import math
 import os
@@ -67,15 +68,11 @@ from avocado.utils.process import (
 # Symlink avocado implementation of port-related functions
 
 try:
-    from avocado.utils.network.ports import (
-        find_free_port,
-        find_free_ports,
-        is_port_free,
-    )
+    from avocado.utils.network.ports import find_free_ports as _find_free_ports
+    from avocado.utils.network.ports import is_port_free
 except ImportError:
     from avocado.utils.network import is_port_free
-    from avocado.utils.network import find_free_port
-    from avocado.utils.network import find_free_ports
+    from avocado.utils.network import find_free_ports as _find_free_ports
 
 import six
 from six.moves import xrange
@@ -331,6 +328,105 @@ def unlock_file(lockfile):
     lockfile.close()
 
 
+# Seconds a port reserved by find_free_ports() is not handed out to other
+# processes, enough for the caller to bind it (usually by starting qemu)
+PORT_RESERVATION_TIMEOUT = 120
+PORT_RESERVATIONS_FILENAME = os.path.join(data_dir.get_tmp_dir(), "port_reservations")
+
+
+def find_free_ports(
+    start_port,
+    end_port,
+    count,
+    address="localhost",
+    sequent=False,
+    family=socket.AF_INET,
+    protocol=socket.SOCK_STREAM,
+    reserve=False,
+):
+    """
+    Return a number of host free ports in the range [start_port, end_port).
+
+    Same as avocado's find_free_ports(), with reserve the ports are also
+    reserved for PORT_RESERVATION_TIMEOUT seconds: they are not returned
+    to other processes reserving ports, so tests running in parallel don't
+    pick the same port before any of them binds it.
+
+    :param start_port: First port of the range
+    :param end_port: End of the range (not included)
+    :param count: Number of ports to look for
+    :param address: Socket address to bind or connect
+    :param sequent: Find port sequentially, random order if it's False
+    :param family: socket.AF_INET or socket.AF_INET6
+    :param protocol: socket.SOCK_STREAM (TCP) or socket.SOCK_DGRAM (UDP)
+    :param reserve: Whether to skip and make reservations
+    :return: List of free ports, it may be shorter than count
+    """
+    if not reserve:
+        return _find_free_ports(
+            start_port, end_port, count, address, sequent, family, protocol
+        )
+    lock = lock_file(PORT_RESERVATIONS_FILENAME + ".lock")
+    try:
+        try:
+            with open(PORT_RESERVATIONS_FILENAME) as reservations_file:
+                reservations = json.load(reservations_file)
+        except (IOError, ValueError):
+            reservations = {}
+        now = time.time()
+        pid = os.getpid()
+        reservations = {
+            port: (owner, stamp)
+            for port, (owner, stamp) in reservations.items()
+            if now - stamp < PORT_RESERVATION_TIMEOUT and pid_exists(owner)
+        }
+        # Ports reserved by this process can be handed out again
+        taken = set(
+            int(port)
+            for port, (owner, _) in reservations.items()
+            if owner != pid and start_port <= int(port) < end_port
+        )
+        ports = _find_free_ports(
+            start_port,
+            end_port,
+            count + len(taken),
+            address,
+            sequent,
+            family,
+            protocol,
+        )
+        ports = [port for port in ports if port not in taken][:count]
+        for port in ports:
+            reservations[str(port)] = (pid, now)
+        with open(PORT_RESERVATIONS_FILENAME, "w") as reservations_file:
+            json.dump(reservations, reservations_file)
+    finally:
+        unlock_file(lock)
+    return ports
+
+
+def find_free_port(
+    start_port=1024,
+    end_port=65535,
+    address="localhost",
+    sequent=False,
+    family=socket.AF_INET,
+    protocol=socket.SOCK_STREAM,
+    reserve=False,
+):
+    """
+    Return a host free port in the range [start_port, end_port).
+
+    See :func:`find_free_ports`.
+
+    :return: The port or None when there is no free port in the range
+    """
+    ports = find_free_ports(
+        start_port, end_port, 1, address, sequent, family, protocol, reserve
+    )
+    return ports[0] if ports else None
+
+
 # Utility functions for dealing with external processes
 
 
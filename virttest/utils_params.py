@@ -1,3 +1,4 @@
+import itertools
 from threading import Lock
 
 try:
@@ -21,16 +22,91 @@ class Params(IterableUserDict):
     """
 
     lock = Lock()
+    # The data dict is shared with object_params() views (copy on write)
+    _data_shared = False
+    # (data, index) where index maps every '_...' key suffix to its keys
+    _suffix_index = None
 
-    def __getitem__(self, key):
+    def __missing__(self, key):
         """overrides the error messages of missing params[$key]"""
-        try:
-            return IterableUserDict.__getitem__(self, key)
-        except KeyError:
-            raise ParamNotFound(
-                "Mandatory parameter '%s' is missing. "
-                "Check your cfg files for typos/mistakes" % key
-            )
+        raise ParamNotFound(
+            "Mandatory parameter '%s' is missing. "
+            "Check your cfg files for typos/mistakes" % key
+        )
+
+    def __setitem__(self, key, value):
+        self._own_data()
+        if key not in self.data:
+            self._index_suffixes(key, True)
+        IterableUserDict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._own_data()
+        if key in self.data:
+            self._index_suffixes(key, False)
+        IterableUserDict.__delitem__(self, key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_data_shared", None)
+        state.pop("_suffix_index", None)
+        return state
+
+    def _own_data(self):
+        """Stop sharing the data with object_params() views before a change"""
+        if self._data_shared:
+            data = self.data
+            self.data = data.copy()
+            self._data_shared = False
+            # Same keys, the suffix index still applies
+            if self._suffix_index is not None and self._suffix_index[0] is data:
+                self._suffix_index = (self.data, self._suffix_index[1])
+
+    def _index_suffixes(self, key, added):
+        """
+        Update the suffix index of the current data, if any, on a key change.
+
+        :param key: key added to or removed from the data
+        :param added: whether the key is added
+        """
+        if self._suffix_index is None or self._suffix_index[0] is not self.data:
+            return
+        if not isinstance(key, str):
+            self._suffix_index = None
+            return
+        index = self._suffix_index[1]
+        pos = key.find("_")
+        while pos != -1:
+            suffix = key[pos:]
+            if added:
+                index.setdefault(suffix, []).append(key)
+            else:
+                index[suffix].remove(key)
+                if not index[suffix]:
+                    del index[suffix]
+            pos = key.find("_", pos + 1)
+
+    def _get_suffix_index(self):
+        """
+        Return the suffix index of the current data, building it if needed.
+
+        :return: dict mapping every suffix starting with '_' of the keys to
+                 the list of keys having it, in the keys order
+        """
+        data = self.data
+        if self._suffix_index is None or self._suffix_index[0] is not data:
+            index = {}
+            for key in data:
+                pos = key.find("_")
+                while pos != -1:
+                    index.setdefault(key[pos:], []).append(key)
+                    pos = key.find("_", pos + 1)
+            self._suffix_index = (data, index)
+        return self._suffix_index[1]
 
     def get(self, key, default=None):
         """overrides the behavior to catch ParamNotFound error"""
@@ -69,18 +145,25 @@ class Params(IterableUserDict):
         The values of keys with the suffix overwrite the values of their
         suffixless versions.
 
+        The returned object is a view sharing the data of these params, it
+        becomes a copy of its own on the first modification of either side.
+
         :param obj_name: The name of the object (objects are listed by the
                 objects() method).
+        :rtype: ObjectParams
         """
         suffix = "_" + obj_name
         self.lock.acquire()
-        new_dict = self.copy()
-        self.lock.release()
-        for key in list(new_dict.keys()):
-            if key.endswith(suffix):
-                new_key = key.split(suffix)[0]
-                new_dict[new_key] = new_dict[key]
-        return new_dict
+        try:
+            data = self.data
+            keys = self._get_suffix_index().get(suffix, ())
+            self._data_shared = True
+        finally:
+            self.lock.release()
+        overlay = {}
+        for key in keys:
+            overlay[key.split(suffix)[0]] = data[key]
+        return ObjectParams.view(data, overlay)
 
     def object_counts(self, count_key, base_name):
         """
@@ -205,3 +288,79 @@ class Params(IterableUserDict):
         return Params(
             {key: value for key, value in self.items() if not key.startswith("_")}
         )
+
+
+class ObjectParams(Params):
+    """
+    Params of an object, as returned by :py:meth:`Params.object_params`.
+
+    Until it is modified, it is a read-only overlay of the suffixed params
+    of the object on the data of the params it was created from.  The data
+    is materialized in a dict of its own on the first modification.
+    """
+
+    _base = None
+    _overlay = None
+    _data = None
+
+    @classmethod
+    def view(cls, base, overlay):
+        """
+        Create the params of an object without copying the data.
+
+        :param base: dict of the params, it must not be modified anymore
+        :param overlay: dict of the params overriding the base ones
+        """
+        params = cls.__new__(cls)
+        params._base = base
+        params._overlay = overlay
+        return params
+
+    @property
+    def data(self):
+        if self._data is None:
+            data = self._base.copy()
+            data.update(self._overlay)
+            self.data = data
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._base = self._overlay = None
+
+    def __getitem__(self, key):
+        if self._data is None:
+            if key in self._overlay:
+                return self._overlay[key]
+            if key in self._base:
+                return self._base[key]
+            return self.__missing__(key)
+        return Params.__getitem__(self, key)
+
+    def __contains__(self, key):
+        if self._data is None:
+            return key in self._overlay or key in self._base
+        return key in self._data
+
+    def __len__(self):
+        if self._data is None:
+            base = self._base
+            return len(base) + sum(1 for key in self._overlay if key not in base)
+        return len(self._data)
+
+    def __iter__(self):
+        if self._data is None:
+            base = self._base
+            return itertools.chain(
+                base, (key for key in self._overlay if key not in base)
+            )
+        return iter(self._data)
+
+    def __copy__(self):
+        if self._data is None:
+            return self.view(self._base, self._overlay)
+        return self.view(self._data.copy(), {})
+
+    def copy(self):
+        return self.__copy__()
@@ -2,16 +2,32 @@
 QEMU related utility functions.
 """
 
+import glob
+import hashlib
 import json
+import logging
+import os
 import re
+import tempfile
 
 from avocado.utils import process
 
+from virttest import data_dir
+
+LOG = logging.getLogger("avocado." + __name__)
+
 QEMU_VERSION_RE = re.compile(
     r"QEMU (?:PC )?emulator version\s" r"([0-9]+\.[0-9]+\.[0-9]+)" r"(?:\s\((.*?)\))?"
 )
 DEVICE_CATEGORY_RE = re.compile(r"([A-Z]\S+) devices:")
 
+# Bump when the content of the probe cache changes
+PROBE_CACHE_VERSION = 1
+# Dirs the qemu modules (e.g. /usr/lib64/qemu) may be installed in
+QEMU_MODULE_DIRS_PATTERNS = ("/usr/lib*/qemu", "/usr/lib/*-linux-gnu*/qemu")
+# Probe results already loaded by this process, by binary path
+_probe_cache = {}
+
 
 def _get_info(bin_path, options, include_stderr=False):
     """
@@ -31,18 +47,25 @@ def _get_info(bin_path, options, include_stderr=False):
     return output
 
 
-def get_qemu_version(bin_path):
+def get_qemu_version(bin_path, cache=False):
     """
     Return normalized qemu version and package version
 
     :param bin_path: Path to qemu binary
+    :param cache: Whether to use the probe cache, see load_probe_cache()
     :raise OSError: If unable to get that
     :return: A tuple of normalized version and package version
     """
+    if cache:
+        version = load_probe_cache(bin_path, "version")
+        if version:
+            return tuple(version)
     output = _get_info(bin_path, "-version")
     matches = QEMU_VERSION_RE.match(output)
     if matches is None:
         raise OSError("Unable to get the version of qemu")
+    if cache:
+        save_probe_cache(bin_path, matches.groups(), "version")
     return matches.groups()
 
 
@@ -166,3 +189,116 @@ def get_maxcpus_hard_limit(bin_path, machine_type):
             "Could not get the maximum limit CPUs supported by "
             "this machine '%s'" % machine_type
         )
+
+
+def get_qmp_commands_args(schema):
+    """
+    Return the arguments accepted by each QMP command
+
+    :param schema: Output of the query-qmp-schema QMP command, e.g.
+                   '{"return": [...], "id": "..."}'
+    :return: A dict mapping the command names to the sorted list of their
+             arguments, empty if the schema could not be read
+    """
+    try:
+        schema = json.loads(schema)["return"]
+    except (ValueError, KeyError, TypeError):
+        return {}
+    members = {}
+    for entity in schema:
+        if entity.get("meta-type") == "object":
+            members[entity["name"]] = [m["name"] for m in entity.get("members", [])]
+    return {
+        entity["name"]: sorted(members.get(entity.get("arg-type"), []))
+        for entity in schema
+        if entity.get("meta-type") == "command"
+    }
+
+
+def _probe_cache_key(bin_path):
+    """
+    :return: The identity of the binary the probe results are valid for, or
+             None if the binary can not be stat'ed. It includes what else the
+             results depend on: the qemu modules installed (the mtime of
+             their dirs) and the access to /dev/kvm.
+    """
+    try:
+        st = os.stat(bin_path)
+    except OSError:
+        return None
+    key = [PROBE_CACHE_VERSION, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+    module_dirs = [
+        path for pattern in QEMU_MODULE_DIRS_PATTERNS for path in glob.glob(pattern)
+    ]
+    if os.environ.get("QEMU_MODULE_DIR"):
+        module_dirs.append(os.environ["QEMU_MODULE_DIR"])
+    for module_dir in sorted(module_dirs):
+        try:
+            key.append([module_dir, os.stat(module_dir).st_mtime_ns])
+        except OSError:
+            pass
+    key.append(os.access("/dev/kvm", os.R_OK | os.W_OK))
+    return key
+
+
+def _probe_cache_file(bin_path, kind=None):
+    name = hashlib.sha1(os.path.realpath(bin_path).encode()).hexdigest()
+    if kind:
+        name += "." + kind
+    return os.path.join(data_dir.get_cache_dir("qemu_probe"), name + ".json")
+
+
+def load_probe_cache(bin_path, kind=None):
+    """
+    Return the probe results stored by save_probe_cache() for this binary
+
+    The results are only returned while the binary (same inode, size and
+    mtime), the installed qemu modules and the access to /dev/kvm are
+    unchanged, they are shared by all the processes using the same data dir.
+
+    :param bin_path: Path to qemu (or qemu-img) binary
+    :param kind: Name of the probe results, None for the DevContainer ones
+    :return: The probe results, or None if they are not cached
+    """
+    key = _probe_cache_key(bin_path)
+    if key is None:
+        return None
+    cached = _probe_cache.get((bin_path, kind))
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        with open(_probe_cache_file(bin_path, kind)) as cache_file:
+            cached = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    _probe_cache[(bin_path, kind)] = (key, cached["probe"])
+    return cached["probe"]
+
+
+def save_probe_cache(bin_path, probe, kind=None):
+    """
+    Store the probe results of a qemu binary, see load_probe_cache()
+
+    :param bin_path: Path to qemu (or qemu-img) binary
+    :param probe: The probe results, JSON serializable
+    :param kind: Name of the probe results, None for the DevContainer ones
+    """
+    key = _probe_cache_key(bin_path)
+    if key is None:
+        return
+    _probe_cache[(bin_path, kind)] = (key, probe)
+    path = _probe_cache_file(bin_path, kind)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump({"key": key, "binary": bin_path, "probe": probe}, cache_file)
+        # Atomic, readers never see a partially written file
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as details:
+        LOG.debug("Could not store the probe results of %s: %s", bin_path, details)
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
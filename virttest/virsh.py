@@ -22,6 +22,7 @@ for non-existent keys.
 """
 
 import base64
+import contextlib
 import inspect
 import locale
 import logging
@@ -29,6 +30,7 @@ import os
 import re
 import select
 import signal
+import threading
 import time
 import weakref
 from functools import wraps
@@ -38,7 +40,7 @@ from aexpect import remote
 from avocado.utils import path, process
 from six.moves import urllib
 
-from virttest import data_dir, propcan, utils_misc
+from virttest import data_dir, propcan, utils_misc, virsh_api
 
 LOG = logging.getLogger("avocado." + __name__)
 
@@ -55,6 +57,7 @@ NOCLOSE = list(globals().keys()) + [
     "Virsh",
     "VirshPersistent",
     "VirshConnectBack",
+    "VirshPersistentPool",
     "VIRSH_COMMAND_GROUP_CACHE",
     "VIRSH_COMMAND_GROUP_CACHE_NO_DETAIL",
 ]
@@ -119,6 +122,9 @@ class VirshSession(aexpect.ShellSession):
     # Check output against list of known error-status strings
     ERROR_REGEX_LIST = [r"error:\s*.+$", ".*failed.*"]
 
+    # Maximum size of the commands written at once by cmd_batch()
+    BATCH_SIZE = 2048
+
     def __init__(
         self,
         virsh_exec=None,
@@ -265,6 +271,107 @@ class VirshSession(aexpect.ShellSession):
             LOG.debug(result)
         return result
 
+    def cmd_batch(self, cmds, timeout=60, internal_timeout=None):
+        """
+        Send several virsh commands without waiting for the prompt between
+        them and return their exit statuses and outputs.
+
+        Every command is followed by the echo of a unique sentinel, the
+        outputs are split at the sentinels.  At most BATCH_SIZE bytes of
+        commands are written at once, not to fill up the terminal.  The
+        commands must not read from the terminal (like edit).
+
+        :param cmds: virsh commands to send (must not contain newline
+                characters)
+        :param timeout: The duration (in seconds) to wait for the output of
+                every command
+        :param internal_timeout: The timeout to pass to read_nonblocking
+        :return: A list of (status, output) tuples, one per command
+        :raise ShellTimeoutError: Raised if timeout expires
+        :raise ShellProcessTerminatedError: Raised if the shell process
+                terminates while waiting for output
+        """
+        tag = "virsh-batch-%s" % utils_misc.generate_random_string(16)
+        sentinels = ["%s-%d" % (tag, i) for i in range(len(cmds))]
+        # The commands are echoed back by the terminal
+        sent_lines = set(cmds) | set("echo %s" % sentinel for sentinel in sentinels)
+        prompt_regex = re.compile(r"^(%s)+" % self.prompt)
+        results = []
+        lines = []
+        buf = ""
+        self.read_nonblocking(0, timeout)
+        while len(results) < len(cmds):
+            # Write the next commands
+            batch = []
+            size = 0
+            for cmd, sentinel in list(zip(cmds, sentinels))[len(results) :]:
+                if batch and size + len(cmd) > self.BATCH_SIZE:
+                    break
+                batch += [cmd, "echo %s" % sentinel]
+                size += len(cmd)
+            LOG.debug("Sending %d commands in batch", len(batch) // 2)
+            self.sendline("\n".join(batch))
+            end = len(results) + len(batch) // 2
+            # Read their outputs
+            end_time = time.time() + timeout
+            while len(results) < end:
+                if "\n" not in buf:
+                    if time.time() > end_time:
+                        raise aexpect.ShellTimeoutError(
+                            cmds[len(results)], "\n".join(lines)
+                        )
+                    data = self.read_nonblocking(
+                        internal_timeout, max(0, end_time - time.time())
+                    )
+                    if not data and not self.is_alive():
+                        raise aexpect.ShellProcessTerminatedError(
+                            cmds[len(results)], self.get_status(), "\n".join(lines)
+                        )
+                    buf += data
+                    continue
+                line, buf = buf.split("\n", 1)
+                line = re.sub(r"\x1b\[[0-9;?]*[A-Za-z]", "", line.rstrip("\r"))
+                text = prompt_regex.sub("", line)
+                if text.strip() == sentinels[len(results)]:
+                    status = int(
+                        any(
+                            self.match_patterns(out_line, self.ERROR_REGEX_LIST)
+                            is not None
+                            for out_line in lines
+                        )
+                    )
+                    output = "".join("%s\n" % out_line for out_line in lines)
+                    results.append((status, output))
+                    lines = []
+                    end_time = time.time() + timeout
+                elif text.strip() in sent_lines or (text != line and not text.strip()):
+                    continue
+                else:
+                    lines.append(text)
+        return results
+
+    def cmd_results(self, cmds, ignore_status=False, debug=False, timeout=60):
+        """Mimic process.run() for every command of a batch"""
+        results = []
+        for cmd, (exit_status, stdout) in zip(
+            cmds, self.cmd_batch(cmds, timeout=timeout)
+        ):
+            result = process.CmdResult(cmd, stdout, "", exit_status)
+            result.stdout = result.stdout_text
+            result.stderr = result.stderr_text
+            if debug:
+                LOG.debug(result)
+            results.append(result)
+        if not ignore_status:
+            for result in results:
+                if result.exit_status:
+                    raise process.CmdError(
+                        result.command,
+                        result,
+                        "Virsh Command returned non-zero exit status",
+                    )
+        return results
+
     def read_until_output_matches(
         self,
         patterns,
@@ -593,6 +700,121 @@ class VirshPersistent(Virsh):
                 self.new_session()
             # otherwise do nothing
 
+    def cmd_batch(self, cmds, **dargs):
+        """
+        Run several virsh commands in the persistent session at once.
+
+        The commands are written without waiting for the prompt between
+        them, see VirshSession.cmd_batch().  Their error messages are part of
+        their stdout, a virsh shell has a single output.
+
+        :param cmds: virsh commands to run
+        :param dargs: ignore_status, debug and timeout, the ones of the
+                instance by default
+        :return: list of CmdResult objects, one per command
+        :raise: CmdError for the first command failing after all the
+                commands ran, if ignore_status=False
+        """
+        session_id = self.__dict_get__("session_id")
+        session = VirshSession(a_id=session_id)
+        results = session.cmd_results(
+            cmds,
+            ignore_status=dargs.get("ignore_status", self["ignore_status"]),
+            debug=dargs.get("debug", self["debug"]),
+            timeout=dargs.get("timeout", 60),
+        )
+        for result in results:
+            result.from_session_id = session_id
+        return results
+
+
+class VirshPersistentPool(object):
+    """
+    Persistent virsh sessions by URI, shared by several threads.
+
+    Every session is used by a single thread at a time, at most size
+    sessions are opened per URI.
+    """
+
+    def __init__(self, size=4, **dargs):
+        """
+        :param size: Maximum number of sessions per URI
+        :param dargs: VirshPersistent properties of the sessions
+        """
+        self.size = size
+        self.dargs = dargs
+        self._idle = {}
+        self._counts = {}
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def get(self, uri=None):
+        """
+        Get a VirshPersistent instance of the pool, waiting for one to be
+        released if size of them are in use.
+
+        :param uri: URI of the session, None for the default one
+        """
+        virsh_instance = self._acquire(uri)
+        close = False
+        try:
+            yield virsh_instance
+        except (aexpect.ShellProcessTerminatedError, aexpect.ShellTimeoutError):
+            # Do not give a dead or busy session to other threads
+            close = True
+            raise
+        finally:
+            self._release(uri, virsh_instance, close)
+
+    def cmd_batch(self, cmds, uri=None, **dargs):
+        """
+        Run several virsh commands at once in a session of the pool.
+
+        :param cmds: virsh commands to run
+        :param uri: URI of the session, None for the default one
+        :param dargs: See VirshPersistent.cmd_batch()
+        :return: list of CmdResult objects, one per command
+        """
+        with self.get(uri) as virsh_instance:
+            return virsh_instance.cmd_batch(cmds, **dargs)
+
+    def close(self):
+        """
+        Close the sessions not in use.
+        """
+        with self._condition:
+            idle = [inst for insts in self._idle.values() for inst in insts]
+            for uri, insts in self._idle.items():
+                self._counts[uri] -= len(insts)
+            self._idle = {}
+            self._condition.notify_all()
+        for virsh_instance in idle:
+            virsh_instance.close_session()
+
+    def _acquire(self, uri):
+        with self._condition:
+            while not self._idle.get(uri) and self._counts.get(uri, 0) >= self.size:
+                self._condition.wait()
+            if self._idle.get(uri):
+                return self._idle[uri].pop()
+            self._counts[uri] = self._counts.get(uri, 0) + 1
+        try:
+            return VirshPersistent(uri=uri, **self.dargs)
+        except Exception:
+            self._release(uri, None, close=True)
+            raise
+
+    def _release(self, uri, virsh_instance, close=False):
+        with self._condition:
+            if close:
+                self._counts[uri] -= 1
+            else:
+                self._idle.setdefault(uri, []).append(virsh_instance)
+                virsh_instance = None
+            self._condition.notify()
+        if virsh_instance is not None:
+            virsh_instance.close_session()
+
 
 class VirshConnectBack(VirshPersistent):
     """
@@ -1110,6 +1332,7 @@ def maxvcpus(option="", **dargs):
     return command(cmd, **dargs)
 
 
+@virsh_api.backend
 def dom_list(options="", **dargs):
     """
     Return the list of domains.
@@ -1219,6 +1442,7 @@ def driver(**dargs):
     return scheme.split("+", 2)[0]
 
 
+@virsh_api.backend
 def domstate(name, extra="", **dargs):
     """
     Return the state about a running domain.
@@ -1231,6 +1455,7 @@ def domstate(name, extra="", **dargs):
     return command("domstate %s %s" % (name, extra), **dargs)
 
 
+@virsh_api.backend
 def domid(name_or_uuid, **dargs):
     """
     Return VM's ID.
@@ -1242,6 +1467,7 @@ def domid(name_or_uuid, **dargs):
     return command("domid %s" % (name_or_uuid), **dargs)
 
 
+@virsh_api.backend
 def dominfo(name, **dargs):
     """
     Return the VM information.
@@ -1347,6 +1573,7 @@ def domblkthreshold(name, device, threshold, option="", **dargs):
     )
 
 
+@virsh_api.backend
 def dumpxml(name, extra="", to_file="", **dargs):
     """
     Return the domain information as an XML dump.
@@ -1376,6 +1603,7 @@ def domifstat(name, interface, **dargs):
     return command("domifstat %s %s" % (name, interface), **dargs)
 
 
+@virsh_api.backend
 def domjobinfo(name, extra="", **dargs):
     """
     Get domain job information.
@@ -1585,6 +1813,7 @@ def restore(path, options="", **dargs):
     return command("restore %s %s" % (path, options), **dargs)
 
 
+@virsh_api.backend
 def start(name, options="", **dargs):
     """
     True on successful start of (previously defined) inactive domain.
@@ -1619,6 +1848,7 @@ def shutdown(
     return command("shutdown %s %s" % (name, options), **dargs)
 
 
+@virsh_api.backend
 def destroy(name, options="", **dargs):
     """
     True on successful domain destruction
@@ -1631,6 +1861,7 @@ def destroy(name, options="", **dargs):
     return command("destroy %s %s" % (name, options), **dargs)
 
 
+@virsh_api.backend
 def define(xml_path, options=None, **dargs):
     """
     Return cmd result of domain define.
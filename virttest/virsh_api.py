@@ -0,0 +1,589 @@
+"""
+libvirt API backend of the virsh module.
+
+The virsh functions called the most, like the domain state polled while
+waiting for a VM, run a virsh process each time.  This module implements
+them on top of libvirt-python connections kept open per URI, returning the
+same CmdResult as the virsh command would.  The functions of the virsh
+module decorated with :func:`backend` use it when it is enabled, with
+:func:`set_enabled` or the ``libvirt_api`` virsh keyword, and fall back to
+the virsh command for the options not implemented here.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from avocado.utils import process
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+LOG = logging.getLogger("avocado." + __name__)
+
+# The virsh keywords only the virsh command handles
+_VIRSH_ONLY_DARGS = ("session_id", "unprivileged_user", "virsh_opt", "timeout", "quiet")
+
+_enabled = False
+# libvirt connections by (uri, readonly)
+_connections = {}
+_connections_lock = threading.Lock()
+
+DOMAIN_STATES = {
+    0: "no state",
+    1: "running",
+    2: "idle",
+    3: "paused",
+    4: "in shutdown",
+    5: "shut off",
+    6: "crashed",
+    7: "pmsuspended",
+}
+
+JOB_TYPES = ["None", "Bounded", "Unbounded", "Completed", "Failed", "Cancelled"]
+
+JOB_OPERATIONS = [
+    "Unknown",
+    "Start",
+    "Save",
+    "Restore",
+    "Incoming migration",
+    "Outgoing migration",
+    "Snapshot",
+    "Snapshot revert",
+    "Dump",
+    "Backup",
+    "Snapshot delete",
+]
+
+# (stat, label, format) of the domjobinfo lines, in the order of virsh
+JOB_STATS = [
+    ("time_elapsed", "Time elapsed:", "ms"),
+    ("time_elapsed_net", "Time elapsed w/o network:", "ms"),
+    ("time_remaining", "Time remaining:", "ms"),
+    ("data_processed", "Data processed:", "size"),
+    ("data_remaining", "Data remaining:", "size"),
+    ("data_total", "Data total:", "size"),
+    ("memory_processed", "Memory processed:", "size"),
+    ("memory_remaining", "Memory remaining:", "size"),
+    ("memory_total", "Memory total:", "size"),
+    ("memory_bps", "Memory bandwidth:", "rate"),
+    ("memory_dirty_rate", "Dirty rate:", "pages/s"),
+    ("memory_page_size", "Page size:", "bytes"),
+    ("memory_iteration", "Iteration:", ""),
+    ("memory_postcopy_requests", "Postcopy requests:", ""),
+    ("memory_constant", "Constant pages:", ""),
+    ("memory_normal", "Normal pages:", ""),
+    ("memory_normal_bytes", "Normal data:", "size"),
+    ("disk_processed", "File processed:", "size"),
+    ("disk_remaining", "File remaining:", "size"),
+    ("disk_total", "File total:", "size"),
+    ("disk_bps", "File bandwidth:", "rate"),
+    ("downtime", "Expected downtime:", "ms"),
+    ("downtime_net", "Expected downtime w/o network:", "ms"),
+    ("setup_time", "Setup time:", "ms"),
+    ("compression_cache", "Compression cache:", "size"),
+    ("compression_bytes", "Compressed data:", "size"),
+    ("compression_pages", "Compressed pages:", ""),
+    ("compression_cache_misses", "Compression cache misses:", ""),
+    ("compression_overflow", "Compression overflows:", ""),
+    ("auto_converge_throttle", "Auto converge throttle:", ""),
+]
+
+
+def set_enabled(enabled=True):
+    """
+    Use the libvirt API by default in the decorated virsh functions.
+
+    :param enabled: Whether to use the libvirt API
+    """
+    global _enabled
+    if enabled and libvirt is None:
+        LOG.warning("libvirt-python is not installed, virsh commands are run")
+    _enabled = enabled
+
+
+def is_usable(dargs, virsh_exec=None):
+    """
+    Return whether a virsh function called with dargs can use the libvirt API.
+
+    :param dargs: standardized virsh function API keywords
+    :param virsh_exec: default virsh executable, any other one (e.g. virsh
+                       run over ssh) needs the virsh command
+    """
+    if libvirt is None or not dargs.get("libvirt_api", _enabled):
+        return False
+    if dargs.get("virsh_exec", virsh_exec) != virsh_exec:
+        return False
+    return not any(dargs.get(key) for key in _VIRSH_ONLY_DARGS)
+
+
+def get_connection(uri=None, readonly=False):
+    """
+    Return the open libvirt connection to uri, opening it if needed.
+
+    :param uri: libvirt URI, None for the default one
+    :param readonly: Whether to open a read only connection
+    :return: libvirt.virConnect object
+    """
+    key = (uri, bool(readonly))
+    with _connections_lock:
+        conn = _connections.get(key)
+        if conn is None:
+            if readonly:
+                conn = libvirt.openReadOnly(uri)
+            else:
+                conn = libvirt.open(uri)
+            _connections[key] = conn
+        return conn
+
+
+def close_connections():
+    """Close all the open libvirt connections."""
+    with _connections_lock:
+        connections = list(_connections.values())
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except libvirt.libvirtError as details:
+            LOG.debug("Could not close libvirt connection: %s", details)
+
+
+def _drop_connection(uri, readonly, conn):
+    with _connections_lock:
+        if _connections.get((uri, bool(readonly))) is conn:
+            del _connections[(uri, bool(readonly))]
+
+
+def backend(function):
+    """
+    Run a virsh function with the libvirt API when it is enabled.
+
+    The function of this module with the same name is called with the same
+    arguments, the virsh function is called instead if it returns
+    NotImplemented.
+
+    :param function: virsh module function to decorate
+    """
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **dargs):
+        if is_usable(dargs, function.__globals__.get("VIRSH_EXEC")):
+            result = globals()[name](*args, **dargs)
+            if result is not NotImplemented:
+                return result
+        return function(*args, **dargs)
+
+    return wrapper
+
+
+class _Error(Exception):
+    """virsh error messages of a failed call."""
+
+
+def _run(cmd, func, dargs):
+    """
+    Run func on the libvirt connection of dargs, mimic virsh.command().
+
+    :param cmd: Equivalent virsh command, for logging and errors
+    :param func: Function called with the connection, returning the output
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object
+    :raise: CmdError if the call failed and ignore_status=False
+    """
+    uri = dargs.get("uri")
+    readonly = dargs.get("readonly", False)
+    debug = dargs.get("debug", False)
+    ignore_status = dargs.get("ignore_status", True)
+    if debug:
+        LOG.debug("Running virsh command with the libvirt API: %s", cmd)
+    start = time.time()
+    stdout = stderr = ""
+    exit_status = 0
+    for retry in (True, False):
+        conn = None
+        try:
+            conn = get_connection(uri, readonly)
+            stdout = func(conn)
+        except (_Error, libvirt.libvirtError) as details:
+            # The connection is lost if libvirtd was restarted meanwhile
+            if retry and conn is not None and not _is_alive(conn):
+                _drop_connection(uri, readonly, conn)
+                continue
+            if isinstance(details, _Error):
+                messages = details.args
+            else:
+                messages = [details.get_error_message()]
+            stderr = "".join("error: %s\n" % message for message in messages)
+            exit_status = 1
+        break
+    result = process.CmdResult(cmd, stdout, stderr, exit_status, time.time() - start)
+    result.stdout = result.stdout_text
+    result.stderr = result.stderr_text
+    result.from_session_id = None
+    if debug:
+        LOG.debug("status: %s", result.exit_status)
+        LOG.debug("stdout: %s", result.stdout_text.strip())
+        LOG.debug("stderr: %s", result.stderr_text.strip())
+    if not ignore_status and exit_status:
+        raise process.CmdError(
+            cmd, result, "Virsh Command returned non-zero exit status"
+        )
+    return result
+
+
+def _is_alive(conn):
+    try:
+        return conn.isAlive() == 1
+    except libvirt.libvirtError:
+        return False
+
+
+def _lookup(conn, name):
+    """Return the domain by id, uuid or name, like virsh."""
+    name = str(name)
+    try:
+        if name.isdigit():
+            return conn.lookupByID(int(name))
+        if len(name) == 36:
+            return conn.lookupByUUIDString(name)
+    except libvirt.libvirtError:
+        pass
+    try:
+        return conn.lookupByName(name)
+    except libvirt.libvirtError as details:
+        raise _Error("failed to get domain '%s'" % name, details.get_error_message())
+
+
+def _options(options):
+    """Return the set of options if any, None if there are arguments."""
+    options = set(str(options or "").split())
+    if any(not option.startswith("--") for option in options):
+        return None
+    return options
+
+
+def _pretty_capacity(value):
+    """Return value in bytes as a number and a unit, like virsh."""
+    unit = "B"
+    for next_unit in ("KiB", "MiB", "GiB", "TiB", "PiB", "EiB"):
+        if value < 1024:
+            break
+        value /= 1024.0
+        unit = next_unit
+    return value, unit
+
+
+def _format_table(header, rows):
+    """Return a virsh table of rows."""
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = []
+    for row in [header] + rows:
+        cells = [cell.ljust(width) for cell, width in zip(row, widths)]
+        lines.append((" " + "   ".join(cells)).rstrip())
+    separator = "-" * (sum(widths) + 3 * (len(widths) - 1) + 2)
+    return "\n".join(lines[:1] + [separator] + lines[1:]) + "\n\n"
+
+
+def domstate(name, extra="", **dargs):
+    """
+    Return the state of a domain.
+
+    :param name: VM name, id or uuid
+    :param extra: command options, none is supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    if _options(extra) != set():
+        return NotImplemented
+
+    def _domstate(conn):
+        state = _lookup(conn, name).state()[0]
+        return "%s\n\n" % DOMAIN_STATES.get(state, "no state")
+
+    return _run("domstate %s %s" % (name, extra), _domstate, dargs)
+
+
+def domid(name_or_uuid, **dargs):
+    """
+    Return the id of a domain, '-' if it is inactive.
+
+    :param name_or_uuid: VM name or uuid
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object
+    """
+
+    def _domid(conn):
+        dom = _lookup(conn, name_or_uuid)
+        if dom.ID() < 0:
+            return "-\n\n"
+        return "%d\n\n" % dom.ID()
+
+    return _run("domid %s" % name_or_uuid, _domid, dargs)
+
+
+def dominfo(name, **dargs):
+    """
+    Return the information of a domain.
+
+    :param name: VM name, id or uuid
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object
+    """
+
+    def _dominfo(conn):
+        dom = _lookup(conn, name)
+        lines = []
+
+        def add(label, value):
+            lines.append("%-15s %s" % (label, value))
+
+        add("Id:", dom.ID() if dom.ID() >= 0 else "-")
+        add("Name:", dom.name())
+        add("UUID:", dom.UUIDString())
+        add("OS Type:", dom.OSType())
+        state, max_mem, memory, vcpus, cpu_time = dom.info()
+        add("State:", DOMAIN_STATES.get(state, "no state"))
+        add("CPU(s):", vcpus)
+        if cpu_time:
+            add("CPU time:", "%.1fs" % (cpu_time / 1e9))
+        if max_mem != 2**32 - 1:
+            add("Max memory:", "%d KiB" % max_mem)
+        else:
+            add("Max memory:", "no limit")
+        add("Used memory:", "%d KiB" % memory)
+        add("Persistent:", "yes" if dom.isPersistent() else "no")
+        add("Autostart:", "enable" if dom.autostart() else "disable")
+        add("Managed save:", "yes" if dom.hasManagedSaveImage() else "no")
+        try:
+            model, doi = conn.getSecurityModel()
+        except libvirt.libvirtError:
+            model = None
+        if model:
+            add("Security model:", model)
+            add("Security DOI:", doi)
+            try:
+                label, enforcing = dom.securityLabel()
+            except libvirt.libvirtError:
+                label = None
+            if label:
+                add(
+                    "Security label:",
+                    "%s (%s)" % (label, "enforcing" if enforcing else "permissive"),
+                )
+        return "\n".join(lines) + "\n\n"
+
+    return _run("dominfo %s" % name, _dominfo, dargs)
+
+
+def dumpxml(name, extra="", to_file="", **dargs):
+    """
+    Return the XML description of a domain.
+
+    :param name: VM name, id or uuid
+    :param extra: command options, --inactive, --security-info,
+                  --update-cpu and --migratable are supported
+    :param to_file: optional file to write XML output to
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    flag_options = {
+        "--inactive": libvirt.VIR_DOMAIN_XML_INACTIVE,
+        "--security-info": libvirt.VIR_DOMAIN_XML_SECURE,
+        "--update-cpu": libvirt.VIR_DOMAIN_XML_UPDATE_CPU,
+        "--migratable": libvirt.VIR_DOMAIN_XML_MIGRATABLE,
+    }
+    options = _options(extra)
+    if options is None or not options.issubset(flag_options):
+        return NotImplemented
+    flags = 0
+    for option in options:
+        flags |= flag_options[option]
+
+    def _dumpxml(conn):
+        return _lookup(conn, name).XMLDesc(flags) + "\n"
+
+    result = _run("dumpxml %s %s" % (name, extra), _dumpxml, dargs)
+    if to_file:
+        with open(to_file, "w") as result_file:
+            result_file.write(result.stdout_text.strip())
+    return result
+
+
+def define(xml_path, options=None, **dargs):
+    """
+    Define a domain from an XML file.
+
+    :param xml_path: XML file path
+    :param options: options for virsh define, none is supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    if _options(options) != set():
+        return NotImplemented
+
+    def _define(conn):
+        with open(xml_path) as xml_file:
+            xml = xml_file.read()
+        try:
+            dom = conn.defineXML(xml)
+        except libvirt.libvirtError as details:
+            raise _Error(
+                "Failed to define domain from %s" % xml_path,
+                details.get_error_message(),
+            )
+        return "Domain '%s' defined from %s\n\n" % (dom.name(), xml_path)
+
+    LOG.debug("Define VM from %s", xml_path)
+    return _run("define --file %s" % xml_path, _define, dargs)
+
+
+def start(name, options="", **dargs):
+    """
+    Start a defined inactive domain.
+
+    :param name: VM name, id or uuid
+    :param options: options for virsh start, --paused is supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    options = _options(options)
+    if options is None or not options.issubset(["--paused"]):
+        return NotImplemented
+    flags = libvirt.VIR_DOMAIN_START_PAUSED if options else 0
+
+    def _start(conn):
+        dom = _lookup(conn, name)
+        try:
+            dom.createWithFlags(flags)
+        except libvirt.libvirtError as details:
+            raise _Error(
+                "Failed to start domain '%s'" % name, details.get_error_message()
+            )
+        return "Domain '%s' started\n\n" % name
+
+    return _run("start %s %s" % (name, " ".join(options)), _start, dargs)
+
+
+def destroy(name, options="", **dargs):
+    """
+    Destroy a domain.
+
+    :param name: VM name, id or uuid
+    :param options: options for virsh destroy, --graceful is supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    options = _options(options)
+    if options is None or not options.issubset(["--graceful"]):
+        return NotImplemented
+    flags = libvirt.VIR_DOMAIN_DESTROY_GRACEFUL if options else 0
+
+    def _destroy(conn):
+        dom = _lookup(conn, name)
+        try:
+            dom.destroyFlags(flags)
+        except libvirt.libvirtError as details:
+            raise _Error(
+                "Failed to destroy domain '%s'" % name, details.get_error_message()
+            )
+        return "Domain '%s' destroyed\n\n" % name
+
+    return _run("destroy %s %s" % (name, " ".join(options)), _destroy, dargs)
+
+
+def dom_list(options="", **dargs):
+    """
+    Return the list of domains.
+
+    :param options: options to pass to list command, --all, --inactive,
+                    --name and --uuid are supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    options = _options(options)
+    if (
+        options is None
+        or not options.issubset(["--all", "--inactive", "--name", "--uuid"])
+        or {"--name", "--uuid"}.issubset(options)
+    ):
+        return NotImplemented
+    flags = 0
+    if "--all" in options or "--inactive" not in options:
+        flags |= libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE
+    if "--all" in options or "--inactive" in options:
+        flags |= libvirt.VIR_CONNECT_LIST_DOMAINS_INACTIVE
+
+    def _dom_list(conn):
+        doms = sorted(
+            conn.listAllDomains(flags),
+            key=lambda dom: (dom.ID() < 0, dom.ID(), dom.name()),
+        )
+        if "--name" in options:
+            return "".join("%s\n" % dom.name() for dom in doms) + "\n"
+        if "--uuid" in options:
+            return "".join("%s\n" % dom.UUIDString() for dom in doms) + "\n"
+        rows = [
+            [
+                str(dom.ID()) if dom.ID() >= 0 else "-",
+                dom.name(),
+                DOMAIN_STATES.get(dom.state()[0], "no state"),
+            ]
+            for dom in doms
+        ]
+        return _format_table(["Id", "Name", "State"], rows)
+
+    return _run("list %s" % " ".join(sorted(options)), _dom_list, dargs)
+
+
+def domjobinfo(name, extra="", **dargs):
+    """
+    Return the information of the job of a domain.
+
+    :param name: VM name, id or uuid
+    :param extra: extra options, --completed is supported
+    :param dargs: standardized virsh function API keywords
+    :return: CmdResult object, NotImplemented for the unsupported options
+    """
+    options = _options(extra)
+    if options is None or not options.issubset(["--completed"]):
+        return NotImplemented
+    flags = libvirt.VIR_DOMAIN_JOB_STATS_COMPLETED if options else 0
+
+    def _domjobinfo(conn):
+        stats = _lookup(conn, name).jobStats(flags)
+        job_type = stats.get("type", 0)
+        if job_type >= len(JOB_TYPES):
+            job_type = 0
+        lines = ["%-17s %-12s" % ("Job type:", JOB_TYPES[job_type])]
+        if job_type == libvirt.VIR_DOMAIN_JOB_NONE:
+            return "%s\n\n" % lines[0].rstrip()
+        if "operation" in stats:
+            operation = stats["operation"]
+            if operation >= len(JOB_OPERATIONS):
+                operation = 0
+            lines.append("%-17s %-12s" % ("Operation:", JOB_OPERATIONS[operation]))
+        for stat, label, unit in JOB_STATS:
+            if stat not in stats:
+                continue
+            value = stats[stat]
+            if stat == "downtime" and job_type == libvirt.VIR_DOMAIN_JOB_COMPLETED:
+                label = "Total downtime:"
+            if unit == "size":
+                lines.append("%-17s %-.3f %s" % ((label,) + _pretty_capacity(value)))
+            elif unit == "rate":
+                lines.append("%-17s %-.3f %s/s" % ((label,) + _pretty_capacity(value)))
+            elif unit:
+                lines.append("%-17s %-12d %s" % (label, value, unit))
+            else:
+                lines.append("%-17s %-12d" % (label, value))
+        if stats.get("errmsg"):
+            lines.append("%-17s %s" % ("Error message:", stats["errmsg"]))
+        return "\n".join(line.rstrip() for line in lines) + "\n\n"
+
+    return _run("domjobinfo %s %s" % (name, extra), _domjobinfo, dargs)
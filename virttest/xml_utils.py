@@ -172,21 +172,57 @@ class XMLBackup(TempXMLFile):
             shutil.copyfileobj(super(XMLBackup, self), source_file)
 
 
+def _file_attribute(attribute):
+    """
+    Property of the file attributes of XMLTreeFile, creating its files
+    when they are first needed.
+    """
+
+    def getter(self):
+        self.materialize()
+        return self.__dict__.get(attribute, getattr(XMLBackup, attribute, None))
+
+    def setter(self, value):
+        self.__dict__[attribute] = value
+
+    return property(getter, setter)
+
+
 class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
     """
     Combination of ElementTree root and auto-cleaned XML backup file.
+
+    In memory, the XML source and tree are kept without any file until a
+    file name or file operation is needed (e.g. to pass the XML to virsh),
+    the backup files are only created then.
     """
 
     # Closed file object of original source or TempXMLFile
     # self.sourcefilename inherited from parent
-    sourcebackupfile = None
+    sourcebackupfile = _file_attribute("sourcebackupfile")
+    sourcefilename = _file_attribute("sourcefilename")
+    name = _file_attribute("name")
 
-    def __init__(self, xml):
+    def __init__(self, xml, in_memory=False):
         """
         Initialize from a string or filename containing XML source.
 
         param: xml: A filename or string containing XML
-        """
+        param: in_memory: Whether to create the backup files only when
+                          they are needed
+        """
+        self.__dict__["_materialized"] = not in_memory
+        if in_memory:
+            self._source_file = None
+            try:
+                # Test if xml is a valid filename
+                with open(xml, "rb") as source_file:
+                    self._source = source_file.read()
+                self._source_file = xml
+            except (IOError, OSError):
+                self._source = xml.encode()
+            self._parse_source()
+            return
 
         # xml param could be xml string or readable filename
         # If it's a string, use auto-delete TempXMLFile
@@ -211,15 +247,59 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
         self.write()
         self.flush()  # make sure it's on-disk
 
-    def __str__(self):
+    @property
+    def in_memory(self):
+        """Whether the backup files were not created yet."""
+        return not self.__dict__.get("_materialized", True)
+
+    def _parse_source(self):
+        try:
+            ElementTree.ElementTree.__init__(
+                self, element=None, file=io.BytesIO(self._source)
+            )
+        except expat.ExpatError:
+            raise IOError("Error parsing XML: '%s'" % self._source.decode())
+
+    def materialize(self):
+        """Create the backup files of an in memory instance."""
+        if not self.in_memory:
+            return
+        self.__dict__["_materialized"] = True
+        if self._source_file is not None:
+            self.sourcebackupfile = open(self._source_file, "r")
+        else:
+            self.sourcebackupfile = TempXMLFile()
+            self.sourcebackupfile.write(self._source)
+        self.sourcebackupfile.close()
+        XMLBackup.__init__(self, self.sourcebackupfile.name)
         self.write()
         self.flush()
+
+    def __del__(self):
+        # In memory instances have no file to remove
+        if not self.in_memory:
+            super(XMLTreeFile, self).__del__()
+
+    def __str__(self):
+        if not self.in_memory:
+            self.write()
+            self.flush()
         xmlstr = StringIO()
         self.write(xmlstr)
         return xmlstr.getvalue()
 
+    def flush(self):
+        if not self.in_memory:
+            super(XMLTreeFile, self).flush()
+
     def backup(self):
         """Overwrite original source from current tree"""
+        if self.in_memory:
+            self._source = str(self).encode()
+            if self._source_file is not None:
+                with open(self._source_file, "wb") as source_file:
+                    source_file.write(self._source)
+            return
         self.write()
         self.flush()
         # self is the 'original', so backup/restore logic is reversed
@@ -227,6 +307,12 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
 
     def restore(self):
         """Overwrite and reparse current tree from original source"""
+        if self.in_memory:
+            if self._source_file is not None:
+                with open(self._source_file, "rb") as source_file:
+                    self._source = source_file.read()
+            self._parse_source()
+            return
         # self is the 'original', so backup/restore logic is reversed
         super(XMLTreeFile, self).backup()
         try:
@@ -236,6 +322,8 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
 
     def backup_copy(self):
         """Return a copy of instance, including copies of files"""
+        if self.in_memory:
+            return self.__class__(str(self), in_memory=True)
         return self.__class__(self.name)
 
     def reroot(self, xpath):
@@ -341,6 +429,9 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
         """
 
         if filename is None:
+            if self.in_memory:
+                # The tree is written when the file is created
+                return
             filename = self.name
         # Avoid calling file.write() by mistake
         ElementTree.ElementTree.write(self, filename, encoding)